@@ -0,0 +1,178 @@
+import asyncio
+import json
+import random
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from metricas import LLM_REINTENTOS
+
+# Códigos de Azure OpenAI que vale la pena reintentar
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class ClienteSaturadoError(Exception):
+    """Demasiadas consultas esperando turno: se responde 503 en lugar de encolar más"""
+
+
+class AzureOpenAIError(Exception):
+    """La consulta a Azure OpenAI falló después de los reintentos"""
+
+    def __init__(self, mensaje: str, status_code: Optional[int] = None):
+        super().__init__(mensaje)
+        self.status_code = status_code
+
+
+class AzureOpenAIClient:
+    """Cliente asíncrono de Azure OpenAI con pool de conexiones keep-alive.
+
+    Limita las consultas simultáneas con un semáforo y rechaza nuevas consultas
+    cuando la cola de espera está llena. Los 429 y 5xx se reintentan con
+    backoff exponencial con jitter, respetando Retry-After si viene.
+    """
+
+    def __init__(self, endpoint: str, deployment: str, api_version: str, api_key: str,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0,
+                 max_concurrencia: int = 16, max_en_cola: int = 64, max_conexiones: int = 32,
+                 max_reintentos: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.url = (f"{endpoint.rstrip('/')}/openai/deployments/{deployment}/chat/completions"
+                    f"?api-version={api_version}")
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_conexiones)
+        self.max_concurrencia = max_concurrencia
+        self.max_en_cola = max_en_cola
+        self.max_reintentos = max_reintentos
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.en_espera = 0
+        self._semaforo = None
+        self._cliente = None
+
+    def _obtener_cliente(self) -> httpx.AsyncClient:
+        # Se crea dentro del event loop que lo va a usar
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={"Content-Type": "application/json", "api-key": self.api_key},
+            )
+            self._semaforo = asyncio.Semaphore(self.max_concurrencia)
+        return self._cliente
+
+    async def close(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+            self._semaforo = None
+
+    async def chat(self, messages: List[Dict], temperature: float = 0.7) -> Dict:
+        """Enviar una conversación y devolver el JSON de la respuesta"""
+        cliente = self._obtener_cliente()
+        if self.en_espera >= self.max_en_cola:
+            raise ClienteSaturadoError("Demasiadas consultas en espera")
+
+        payload = {"messages": messages, "temperature": temperature, "stream": False}
+        self.en_espera += 1
+        try:
+            await self._semaforo.acquire()
+        finally:
+            self.en_espera -= 1
+        try:
+            return await self._enviar_con_reintentos(cliente, payload)
+        finally:
+            self._semaforo.release()
+
+    def chat_stream(self, messages: List[Dict], temperature: float = 0.7) -> AsyncIterator[str]:
+        """Enviar una conversación con stream=True y devolver un iterador de fragmentos de texto.
+
+        La cola se comprueba al llamar (no al iterar) para poder responder 503
+        antes de empezar la respuesta. Cerrar el iterador antes de tiempo (p. ej.
+        porque el cliente se desconectó) cierra la conexión con Azure, que deja
+        de generar.
+        """
+        cliente = self._obtener_cliente()
+        if self.en_espera >= self.max_en_cola:
+            raise ClienteSaturadoError("Demasiadas consultas en espera")
+        payload = {"messages": messages, "temperature": temperature, "stream": True}
+        return self._recibir_fragmentos(cliente, payload)
+
+    async def _recibir_fragmentos(self, cliente: httpx.AsyncClient, payload: Dict) -> AsyncIterator[str]:
+        self.en_espera += 1
+        try:
+            await self._semaforo.acquire()
+        finally:
+            self.en_espera -= 1
+        try:
+            intento = 0
+            while True:
+                # Solo se reintenta mientras no se haya recibido nada: los fragmentos ya
+                # enviados al cliente no se pueden deshacer
+                iniciado = False
+                try:
+                    async with cliente.stream("POST", self.url, json=payload) as response:
+                        if response.status_code == 200:
+                            iniciado = True
+                            async for linea in response.aiter_lines():
+                                if not linea.startswith("data:"):
+                                    continue
+                                dato = linea[5:].strip()
+                                if dato == "[DONE]":
+                                    return
+                                for opcion in json.loads(dato).get("choices", []):
+                                    texto = (opcion.get("delta") or {}).get("content")
+                                    if texto:
+                                        yield texto
+                            return
+                        status_code = response.status_code
+                        retry_after = response.headers.get("retry-after")
+                except httpx.TransportError as e:
+                    if iniciado:
+                        raise AzureOpenAIError(f"Se cortó la respuesta de Azure OpenAI: {e}") from e
+                    if intento >= self.max_reintentos:
+                        raise AzureOpenAIError(f"Error al conectar con Azure OpenAI: {e}") from e
+                    LLM_REINTENTOS.inc(1, "conexion")
+                    await asyncio.sleep(self._espera(intento))
+                    intento += 1
+                    continue
+
+                if status_code not in CODIGOS_REINTENTABLES or intento >= self.max_reintentos:
+                    raise AzureOpenAIError(f"Error al obtener respuesta: {status_code}", status_code=status_code)
+                LLM_REINTENTOS.inc(1, str(status_code))
+                await asyncio.sleep(self._espera(intento, retry_after))
+                intento += 1
+        finally:
+            self._semaforo.release()
+
+    async def _enviar_con_reintentos(self, cliente: httpx.AsyncClient, payload: Dict) -> Dict:
+        intento = 0
+        while True:
+            try:
+                response = await cliente.post(self.url, json=payload)
+            except httpx.TransportError as e:
+                if intento >= self.max_reintentos:
+                    raise AzureOpenAIError(f"Error al conectar con Azure OpenAI: {e}") from e
+                LLM_REINTENTOS.inc(1, "conexion")
+                await asyncio.sleep(self._espera(intento))
+                intento += 1
+                continue
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code not in CODIGOS_REINTENTABLES or intento >= self.max_reintentos:
+                raise AzureOpenAIError(f"Error al obtener respuesta: {response.status_code}",
+                                       status_code=response.status_code)
+
+            LLM_REINTENTOS.inc(1, str(response.status_code))
+            await asyncio.sleep(self._espera(intento, response.headers.get("retry-after")))
+            intento += 1
+
+    def _espera(self, intento: int, retry_after: Optional[str] = None) -> float:
+        """Backoff exponencial con jitter completo (o el Retry-After del servidor)"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
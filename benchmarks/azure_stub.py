@@ -0,0 +1,102 @@
+"""Servidor local que imita el endpoint de chat completions de Azure OpenAI.
+
+Simula latencia y límites de tasa para probar el cliente sin salir a Azure:
+
+    python -m benchmarks.azure_stub --puerto 9000 --latencia 0.8 --prob-429 0.1
+
+y luego arrancar la API con AZURE_ENDPOINT=http://127.0.0.1:9000.
+
+Con "stream": true responde en SSE como Azure: `latencia` es el tiempo hasta
+el primer token y luego emite `tokens_por_segundo` tokens por segundo. Sin
+streaming espera el mismo tiempo total antes de responder.
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def crear_stub(latencia: float = 0.5, prob_429: float = 0.0, prob_500: float = 0.0,
+               retry_after: float = 0.1, tokens: int = 0, tokens_por_segundo: float = 0.0) -> FastAPI:
+    stub = FastAPI()
+    stub.state.consultas = 0
+    stub.state.rechazadas = 0
+    # Respuestas en streaming terminadas y cortadas porque el cliente cerró la conexión
+    stub.state.streams_completos = 0
+    stub.state.streams_cancelados = 0
+
+    def generar_tokens(pregunta: str):
+        """Texto de la respuesta partido en tokens (palabras), rellenado hasta `tokens` si hace falta"""
+        palabras = f"Respuesta simulada a: {pregunta}".split(" ")
+        palabras.extend(f"palabra{i}" for i in range(len(palabras), tokens))
+        return [palabras[0]] + [f" {palabra}" for palabra in palabras[1:]]
+
+    async def fragmentos(partes, tokens_prompt: int):
+        try:
+            await asyncio.sleep(latencia)
+            for i, parte in enumerate(partes):
+                if i and tokens_por_segundo:
+                    await asyncio.sleep(1 / tokens_por_segundo)
+                fragmento = {"choices": [{"index": 0, "delta": {"content": parte}}]}
+                yield f"data: {json.dumps(fragmento, ensure_ascii=False)}\n\n"
+            final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "usage": {"prompt_tokens": tokens_prompt, "completion_tokens": len(partes),
+                               "total_tokens": tokens_prompt + len(partes)}}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+            stub.state.streams_completos += 1
+        except asyncio.CancelledError:
+            stub.state.streams_cancelados += 1
+            raise
+
+    @stub.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        payload = await request.json()
+        stub.state.consultas += 1
+
+        sorteo = random.random()
+        if sorteo < prob_429:
+            stub.state.rechazadas += 1
+            return JSONResponse(status_code=429, headers={"Retry-After": str(retry_after)},
+                                content={"error": {"code": "429", "message": "Rate limit"}})
+        if sorteo < prob_429 + prob_500:
+            stub.state.rechazadas += 1
+            return JSONResponse(status_code=500, content={"error": {"message": "Error interno"}})
+
+        pregunta = payload["messages"][-1]["content"]
+        tokens_prompt = sum(len(mensaje["content"]) for mensaje in payload["messages"]) // 4
+        partes = generar_tokens(pregunta)
+        if payload.get("stream"):
+            return StreamingResponse(fragmentos(partes, tokens_prompt), media_type="text/event-stream")
+
+        await asyncio.sleep(latencia + (len(partes) - 1) / tokens_por_segundo if tokens_por_segundo else latencia)
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(partes)}}],
+            "usage": {"prompt_tokens": tokens_prompt, "completion_tokens": len(partes),
+                      "total_tokens": tokens_prompt + len(partes)},
+        }
+
+    return stub
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--puerto", type=int, default=9000)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--prob-500", type=float, default=0.0)
+    parser.add_argument("--tokens", type=int, default=0, help="largo mínimo de la respuesta, en tokens")
+    parser.add_argument("--tokens-por-segundo", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(crear_stub(args.latencia, args.prob_429, args.prob_500, tokens=args.tokens,
+                           tokens_por_segundo=args.tokens_por_segundo),
+                host="127.0.0.1", port=args.puerto)
+
+
+if __name__ == "__main__":
+    main()
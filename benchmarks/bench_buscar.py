@@ -0,0 +1,103 @@
+"""Latencia de la búsqueda aproximada de nombres (GET /buscar): índice de trigramas contra recorrido lineal.
+
+Uso: python -m benchmarks.bench_buscar [--tamanos 1000,10000,100000] [--consultas 100] [--limite 10]
+
+Las consultas imitan lo que escribe una familia: nombres con errores de
+tipeo, sin acentos, incompletos ("José Montilla" por "José Manuel Montilla")
+o solo nombre y primer apellido. El recorrido lineal puntúa todos los
+nombres con la misma fórmula (con sus trigramas ya calculados) y sirve además
+para comprobar que el índice devuelve exactamente los mismos resultados.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.sintetico import generar_datos, percentil
+from busqueda import PUNTAJE_MINIMO, normalizar_nombre, puntaje, trigramas
+from data_manager import DataManager
+from storage import JsonStorage
+
+
+def consultas_familias(nombres, cantidad: int, semilla: int = 3):
+    aleatorio = random.Random(semilla)
+    consultas = []
+    for _ in range(cantidad):
+        palabras = aleatorio.choice(nombres).split()
+        tipo = aleatorio.random()
+        if tipo < 0.3:
+            # Nombre y primer apellido
+            consulta = " ".join(palabras[:1] + palabras[-2:-1])
+        elif tipo < 0.5:
+            # Sin una de las palabras del medio
+            del palabras[aleatorio.randrange(1, len(palabras) - 1)]
+            consulta = " ".join(palabras)
+        else:
+            # Errores de tipeo
+            letras = list(" ".join(palabras))
+            for _ in range(aleatorio.randint(1, 2)):
+                i = aleatorio.randrange(len(letras))
+                letras[i] = aleatorio.choice("abcdefghijlmnoprstuvz")
+            consulta = "".join(letras)
+        consultas.append(normalizar_nombre(consulta))
+    return consultas
+
+
+def buscar_lineal(nombres_grams, consulta: str, limite: int):
+    grams = trigramas(consulta)
+    resultados = []
+    for clave, grams_clave in nombres_grams:
+        valor = puntaje(len(grams & grams_clave), len(grams), len(grams_clave))
+        if valor >= PUNTAJE_MINIMO:
+            resultados.append((clave, valor))
+    resultados.sort(key=lambda resultado: (-resultado[1], resultado[0]))
+    return resultados[:limite]
+
+
+def medir(total: int, cantidad: int, limite: int):
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        storage = JsonStorage(data_file)
+        storage.save(generar_datos(total))
+        inicio = time.perf_counter()
+        manager = DataManager(data_file, storage=storage)
+        carga = time.perf_counter() - inicio
+
+        claves = list(manager.indice)
+        consultas = consultas_familias(claves, cantidad)
+        nombres_grams = [(clave, trigramas(clave)) for clave in claves]
+
+        indice, lineal, distintos = [], [], 0
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            manager.buscar_parecidos(consulta, limite)
+            indice.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            esperado = buscar_lineal(nombres_grams, consulta, limite)
+            lineal.append(time.perf_counter() - inicio)
+            if manager.trigramas.buscar(consulta, limite=limite) != esperado:
+                distintos += 1
+        manager.close()
+        return carga, indice, lineal, distintos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="1000,10000,100000")
+    parser.add_argument("--consultas", type=int, default=100)
+    parser.add_argument("--limite", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.consultas} consultas, hasta {args.limite} resultados")
+    print(f"{'víctimas':>9} {'carga s':>8} {'índice p50':>11} {'índice p99':>11} {'lineal p50':>11} "
+          f"{'lineal p99':>11} {'distintos':>10}")
+    for total in (int(valor) for valor in args.tamanos.split(",")):
+        carga, indice, lineal, distintos = medir(total, args.consultas, args.limite)
+        print(f"{total:>9} {carga:>8.2f} {percentil(indice, 50) * 1000:>9.3f}ms {percentil(indice, 99) * 1000:>9.3f}ms "
+              f"{percentil(lineal, 50) * 1000:>9.1f}ms {percentil(lineal, 99) * 1000:>9.1f}ms {distintos:>10}")
+
+
+if __name__ == "__main__":
+    main()
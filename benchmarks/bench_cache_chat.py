@@ -0,0 +1,124 @@
+"""Llamadas al modelo y latencia de /chat con y sin la caché de respuestas.
+
+Uso: python -m benchmarks.bench_cache_chat [--consultas 2000] [--preguntas 50] [--concurrencia 32]
+                                           [--latencia 0.5] [--escrituras-por-segundo 5]
+
+Levanta el stub de Azure y la API en hilos locales y lanza consultas a /chat
+repartidas según una ley de Zipf sobre un conjunto de preguntas (unas pocas
+muy repetidas, como durante una emergencia), mientras se registran pacientes
+nuevos que invalidan parte de la caché. Compara tres modos: sin caché (cada
+consulta va al modelo), solo agrupando preguntas iguales en vuelo, y la caché
+completa.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.azure_stub import crear_stub
+from benchmarks.servidor import servidor_en_hilo
+from benchmarks.sintetico import generar_nombres, percentil
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+def preguntas_zipf(cantidad: int, consultas: int, semilla: int = 7):
+    aleatorio = random.Random(semilla)
+    nombres = generar_nombres(cantidad, semilla=semilla)
+    preguntas = ["lista de fallecidos"] + [f"¿Dónde está {nombre}?" for nombre in nombres[1:]]
+    pesos = [1 / (rango + 1) for rango in range(len(preguntas))]
+    return aleatorio.choices(preguntas, weights=pesos, k=consultas), nombres
+
+
+async def cargar(url: str, secuencia, nombres, concurrencia: int, escrituras_por_segundo: float, ronda: int):
+    latencias = []
+    pendientes = iter(secuencia)
+    terminado = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=120,
+                                 limits=httpx.Limits(max_connections=concurrencia + 1)) as cliente:
+        async def trabajador():
+            for pregunta in pendientes:
+                inicio = time.perf_counter()
+                await cliente.post("/chat", json={"message": pregunta})
+                latencias.append(time.perf_counter() - inicio)
+
+        async def escritor():
+            aleatorio = random.Random(11)
+            i = 0
+            while not terminado.is_set() and escrituras_por_segundo > 0:
+                # Algunas altas se parecen a nombres preguntados (mismo nombre con otro apellido):
+                # invalidan su respuesta. El resto no afecta a ninguna pregunta con nombre
+                if aleatorio.random() < 0.3:
+                    nombre = f"{aleatorio.choice(nombres)} Ronda{ronda} {i}"
+                else:
+                    nombre = f"Paciente Nuevo R{ronda} {i}"
+                await cliente.post("/pacientes/registrar", json={"nombre": nombre, "hospital": "Hospital Carga"})
+                i += 1
+                await asyncio.sleep(1 / escrituras_por_segundo)
+
+        inicio = time.perf_counter()
+        tarea_escritor = asyncio.create_task(escritor())
+        await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+        terminado.set()
+        await tarea_escritor
+    return latencias, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=2000)
+    parser.add_argument("--preguntas", type=int, default=50)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--latencia", type=float, default=0.5)
+    parser.add_argument("--escrituras-por-segundo", type=float, default=5)
+    args = parser.parse_args()
+
+    secuencia, nombres = preguntas_zipf(args.preguntas, args.consultas)
+    stub = crear_stub(latencia=args.latencia)
+
+    with tempfile.TemporaryDirectory() as directorio, servidor_en_hilo(stub) as url_stub:
+        os.environ["DATA_FILE"] = os.path.join(directorio, "datos.json")
+        os.environ["AZURE_ENDPOINT"] = url_stub + "/"
+        os.environ["AZURE_MAX_CONCURRENCIA"] = str(args.concurrencia)
+        main_api = importlib.import_module("main")
+        con_cache = main_api.generate_azure_response
+
+        async def sin_cache(prompt: str) -> str:
+            return (await main_api._responder(prompt))[0]
+
+        modos = [
+            ("sin caché", sin_cache, 0),
+            ("solo single-flight", con_cache, 0),
+            ("caché completa", con_cache, main_api.cache_respuestas.max_bytes),
+        ]
+
+        print(f"{args.consultas} consultas sobre {args.preguntas} preguntas (Zipf), concurrencia {args.concurrencia}, "
+              f"modelo {args.latencia}s, {args.escrituras_por_segundo:g} altas/s")
+        print(f"{'modo':<20} {'llamadas':>9} {'consultas/s':>12} {'p50':>8} {'p99':>8}")
+        with servidor_en_hilo(main_api.app) as url:
+            for ronda, (etiqueta, responder, max_bytes) in enumerate(modos):
+                main_api.generate_azure_response = responder
+                main_api.cache_respuestas.max_bytes = max_bytes
+                main_api.cache_respuestas.limpiar()
+                antes = stub.state.consultas
+                latencias, duracion = asyncio.run(
+                    cargar(url, secuencia, nombres, args.concurrencia, args.escrituras_por_segundo, ronda))
+                print(f"{etiqueta:<20} {stub.state.consultas - antes:>9} {len(latencias) / duracion:>12.1f} "
+                      f"{percentil(latencias, 50) * 1000:>6.0f}ms {percentil(latencias, 99) * 1000:>6.0f}ms")
+            main_api.generate_azure_response = con_cache
+
+        metricas = main_api.cache_respuestas.metricas()
+        print(f"caché: {metricas['aciertos']} aciertos, {metricas['coalescidas']} agrupadas, "
+              f"{metricas['fallos']} fallos, {metricas['invalidadas']} invalidadas, "
+              f"{metricas['expulsadas']} expulsadas")
+
+
+if __name__ == "__main__":
+    main()
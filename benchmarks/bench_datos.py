@@ -0,0 +1,100 @@
+"""Peticiones por segundo de GET /datos con y sin la respuesta precodificada.
+
+Uso: python -m benchmarks.bench_datos [--victimas 10000] [--segundos 5] [--concurrencia 16]
+
+Arranca la API con uvicorn en un subproceso (con un endpoint extra
+/datos-sin-cache que devuelve el dict como antes) y la carga con un cliente
+httpx asíncrono desde este proceso.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.servidor import puerto_libre
+from benchmarks.sintetico import generar_datos
+from storage import JsonStorage
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+def crear_app():
+    """Fábrica para uvicorn: la API normal más el camino anterior de /datos"""
+    import main
+
+    @main.app.get("/datos-sin-cache")
+    async def datos_sin_cache():
+        return main.data_manager.get_all_data()
+
+    return main.app
+
+
+async def cargar(url: str, ruta: str, cabeceras: dict, segundos: float, concurrencia: int):
+    fin = time.perf_counter() + segundos
+    completadas = 0
+    bytes_recibidos = 0
+
+    async def trabajador(cliente):
+        nonlocal completadas, bytes_recibidos
+        while time.perf_counter() < fin:
+            respuesta = await cliente.get(ruta, headers=cabeceras)
+            bytes_recibidos += respuesta.num_bytes_downloaded
+            completadas += 1
+
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=60) as cliente:
+        etag = (await cliente.get("/datos")).headers["etag"]
+        cabeceras = {clave: valor.replace("{etag}", etag) for clave, valor in cabeceras.items()}
+        await asyncio.gather(*(trabajador(cliente) for _ in range(concurrencia)))
+    return completadas / segundos, bytes_recibidos / max(1, completadas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--victimas", type=int, default=10000)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    args = parser.parse_args()
+
+    escenarios = [
+        ("sin caché (dict)", "/datos-sin-cache", {"Accept-Encoding": "identity"}),
+        ("caché, identity", "/datos", {"Accept-Encoding": "identity"}),
+        ("caché, gzip", "/datos", {"Accept-Encoding": "gzip"}),
+        ("caché, 304", "/datos", {"Accept-Encoding": "gzip", "If-None-Match": "{etag}"}),
+    ]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        JsonStorage(data_file).save(generar_datos(args.victimas))
+        puerto = puerto_libre()
+        entorno = dict(os.environ, DATA_FILE=data_file)
+        proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.bench_datos:crear_app",
+             "--port", str(puerto), "--log-level", "warning"],
+            env=entorno,
+        )
+        url = f"http://127.0.0.1:{puerto}"
+        try:
+            for _ in range(200):
+                try:
+                    httpx.get(url + "/", headers=CABECERAS)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+
+            print(f"{args.victimas} víctimas, concurrencia {args.concurrencia}, {args.segundos:.0f}s por escenario")
+            print(f"{'escenario':<18} {'req/s':>9} {'bytes/resp':>11}")
+            for etiqueta, ruta, cabeceras in escenarios:
+                por_segundo, tamano = asyncio.run(cargar(url, ruta, cabeceras, args.segundos, args.concurrencia))
+                print(f"{etiqueta:<18} {por_segundo:>9.1f} {tamano:>11.0f}")
+        finally:
+            proceso.terminate()
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Latencia de reparto de cambios a miles de suscriptores de /eventos.
+
+Uso: python -m benchmarks.bench_difusion [--suscriptores 5000] [--eventos 50] [--http 200]
+
+1) En proceso: N suscriptores del CentroDifusion alimentado por las altas de
+   DataManager; mide, por evento, el tiempo hasta que lo recibe cada suscriptor
+   y hasta que lo recibió el último.
+2) HTTP (opcional): --http clientes SSE reales contra la API servida por uvicorn.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.servidor import servidor_en_hilo
+from benchmarks.sintetico import percentil
+from data_manager import DataManager
+from difusion import RESYNC, CentroDifusion
+from storage import JournalStorage
+
+
+async def en_proceso(suscriptores: int, eventos: int, intervalo: float):
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        manager = DataManager(data_file, storage=JournalStorage(data_file, intervalo_compactacion=0))
+        centro = CentroDifusion(max_cola=eventos + 1)
+        centro.iniciar(asyncio.get_running_loop())
+        manager.oyentes.append(centro.publicar)
+
+        publicados = {}
+        recepciones = []
+        ultimas = {}
+
+        async def consumir(suscriptor):
+            for _ in range(eventos):
+                cambio = await suscriptor.cola.get()
+                if cambio is RESYNC:
+                    return
+                demora = time.perf_counter() - publicados[cambio["seq"]]
+                recepciones.append(demora)
+                ultimas[cambio["seq"]] = max(demora, ultimas.get(cambio["seq"], 0.0))
+
+        tareas = [asyncio.create_task(consumir(centro.suscribir())) for _ in range(suscriptores)]
+        await asyncio.sleep(0)
+        for i in range(eventos):
+            publicados[manager.version + 1] = time.perf_counter()
+            manager.add_paciente(f"Paciente Difusión {i}", "Hospital Darío Contreras", 30)
+            await asyncio.sleep(intervalo)
+        await asyncio.gather(*tareas)
+        manager.close()
+
+    por_evento = [demora * 1000 for demora in ultimas.values()]
+    por_recepcion = [demora * 1000 for demora in recepciones]
+    print(f"En proceso: {suscriptores} suscriptores x {eventos} eventos ({len(recepciones)} entregas, "
+          f"{centro.descartados} descartados)")
+    print(f"  por entrega:            p50={percentil(por_recepcion, 50):.2f} ms "
+          f"p99={percentil(por_recepcion, 99):.2f} ms")
+    print(f"  hasta el último cliente: p50={percentil(por_evento, 50):.2f} ms p99={percentil(por_evento, 99):.2f} ms")
+
+
+async def por_http(url: str, clientes: int, eventos: int, intervalo: float):
+    cabeceras = {"X-API-Key": "1901"}
+    publicados = {}
+    recepciones = []
+    conectados = asyncio.Semaphore(0)
+
+    async def escuchar(cliente):
+        recibidos = 0
+        async with cliente.stream("GET", "/eventos", headers=cabeceras) as respuesta:
+            async for linea in respuesta.aiter_lines():
+                if linea.startswith("event: conectado"):
+                    conectados.release()
+                elif linea.startswith("data: ") and '"seq"' in linea:
+                    cambio = json.loads(linea[6:])
+                    if cambio["tipo"] == "paciente_registrado":
+                        recepciones.append(time.perf_counter() - publicados[cambio["nombre"]])
+                        recibidos += 1
+                        if recibidos == eventos:
+                            return
+
+    limites = httpx.Limits(max_connections=clientes + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limites) as cliente:
+        tareas = [asyncio.create_task(escuchar(cliente)) for _ in range(clientes)]
+        for _ in range(clientes):
+            await conectados.acquire()
+        for i in range(eventos):
+            nombre = f"Paciente HTTP {i}"
+            publicados[nombre] = time.perf_counter()
+            await cliente.post("/pacientes/registrar", headers=cabeceras,
+                               json={"nombre": nombre, "hospital": "Hospital Darío Contreras"})
+            await asyncio.sleep(intervalo)
+        await asyncio.wait_for(asyncio.gather(*tareas), timeout=60)
+
+    tiempos = [demora * 1000 for demora in recepciones]
+    print(f"HTTP: {clientes} clientes SSE x {eventos} eventos ({len(tiempos)} entregas)")
+    print(f"  por entrega (desde el POST): p50={percentil(tiempos, 50):.2f} ms p99={percentil(tiempos, 99):.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suscriptores", type=int, default=5000)
+    parser.add_argument("--eventos", type=int, default=50)
+    parser.add_argument("--intervalo", type=float, default=0.02)
+    parser.add_argument("--http", type=int, default=200, help="clientes SSE reales (0 para omitir)")
+    args = parser.parse_args()
+
+    asyncio.run(en_proceso(args.suscriptores, args.eventos, args.intervalo))
+
+    if args.http:
+        with tempfile.TemporaryDirectory() as directorio:
+            os.environ["DATA_FILE"] = os.path.join(directorio, "datos.json")
+            main_app = importlib.import_module("main")
+            with servidor_en_hilo(main_app.app) as url:
+                asyncio.run(por_http(url, args.http, min(args.eventos, 20), args.intervalo * 5))
+
+
+if __name__ == "__main__":
+    main()
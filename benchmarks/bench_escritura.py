@@ -0,0 +1,61 @@
+"""Latencia por escritura de DataManager según el backend de almacenamiento.
+
+Uso: python -m benchmarks.bench_escritura [--tamanos 100,1000,10000,100000] [--escrituras 200]
+
+Con el backend "json" cada alta reescribe el archivo completo, por lo que la
+latencia crece con el número de víctimas; con "journal" cada alta es una línea
+añadida a la bitácora y la latencia se mantiene plana.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.sintetico import generar_datos, generar_nombres, percentil
+from data_manager import DataManager
+from storage import JournalStorage, JsonStorage
+
+
+def medir(modo: str, total: int, escrituras: int) -> list:
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        if modo == "json":
+            storage = JsonStorage(data_file)
+        else:
+            # Sin compactación periódica para medir solo el camino de escritura
+            storage = JournalStorage(data_file, intervalo_compactacion=0)
+        storage.save(generar_datos(total))
+        manager = DataManager(data_file, storage=storage)
+
+        nuevos = generar_nombres(total + escrituras, semilla=7)
+        nuevos = [nombre for nombre in nuevos if manager.buscar(nombre) is None][:escrituras]
+        tiempos = []
+        for i, nombre in enumerate(nuevos):
+            inicio = time.perf_counter()
+            if i % 2:
+                manager.add_fallecido(nombre)
+            else:
+                manager.add_paciente(nombre, "Hospital Darío Contreras", 30)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        manager.close()
+        return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="100,1000,10000,100000")
+    parser.add_argument("--escrituras", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'modo':<8} {'víctimas':>9} {'media ms':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for total in (int(valor) for valor in args.tamanos.split(",")):
+        for modo in ("json", "journal"):
+            # Reescribir 100k víctimas por alta es lento: limitar las muestras del modo json
+            escrituras = args.escrituras if modo == "journal" else min(args.escrituras, max(10, 2000000 // total))
+            tiempos = medir(modo, total, escrituras)
+            print(f"{modo:<8} {total:>9} {sum(tiempos) / len(tiempos):>9.3f} "
+                  f"{percentil(tiempos, 50):>8.3f} {percentil(tiempos, 99):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
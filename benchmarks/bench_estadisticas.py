@@ -0,0 +1,66 @@
+"""Costo de /estadisticas con contadores incrementales contra recalcular recorriendo el registro.
+
+Uso: python -m benchmarks.bench_estadisticas [--tamanos 10000,100000,500000] [--repeticiones 20]
+
+Para cada tamaño mide el resumen a partir de los contadores (tras una
+escritura, que es cuando se recalcula), el mismo resumen recorriendo todos
+los pacientes como haría un cliente con /datos, y lo que cuesta mantener los
+contadores en cada alta.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.sintetico import HOSPITALES, generar_datos, generar_nombres, percentil
+from data_manager import DataManager
+from estadisticas import Estadisticas
+from storage import JournalStorage
+
+
+def medir(total: int, repeticiones: int):
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        storage = JournalStorage(data_file, intervalo_compactacion=0)
+        storage.save(generar_datos(total))
+        manager = DataManager(data_file, storage=storage)
+        nuevos = [nombre for nombre in generar_nombres(total + repeticiones, semilla=9)
+                  if manager.buscar(nombre) is None][:repeticiones]
+
+        incremental, recorrido, mantener = [], [], []
+        contadores = Estadisticas()
+        contadores.agregar_paciente(HOSPITALES[0], 30)
+        for i, nombre in enumerate(nuevos):
+            manager.add_paciente(nombre, HOSPITALES[i % len(HOSPITALES)], 20 + i)
+
+            inicio = time.perf_counter()
+            manager.get_estadisticas()
+            incremental.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            instantanea = manager.instantanea()
+            Estadisticas().reconstruir(instantanea.fallecidos, instantanea.pacientes_hospitales)
+            recorrido.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            contadores.agregar_paciente(HOSPITALES[0], 30)
+            mantener.append(time.perf_counter() - inicio)
+        manager.close()
+        return incremental, recorrido, mantener
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="10000,100000,500000")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'víctimas':>9} {'contadores p50':>15} {'recorrido p50':>14} {'por alta':>10}")
+    for total in (int(valor) for valor in args.tamanos.split(",")):
+        incremental, recorrido, mantener = medir(total, args.repeticiones)
+        print(f"{total:>9} {percentil(incremental, 50) * 1000:>13.3f}ms {percentil(recorrido, 50) * 1000:>12.1f}ms "
+              f"{percentil(mantener, 50) * 1e6:>8.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Memoria pico y latencia de exportar todo el registro: GET /datos contra /fallecidos y /pacientes en NDJSON.
+
+Uso: python -m benchmarks.bench_listados [--victimas 500000] [--pagina 1000]
+
+Arranca la API con uvicorn en un subproceso y, para cada escenario, mide
+desde este proceso el tiempo hasta el primer byte, el tiempo total y los
+bytes recibidos (leyendo el cuerpo en streaming y descartándolo), y en el
+servidor el pico de memoria residente por encima de la que tenía antes de la
+petición (VmHWM de /proc, que se reinicia antes de cada escenario).
+
+/datos en frío codifica el registro completo en memoria (y lo guarda para las
+siguientes peticiones); la exportación NDJSON genera una línea por fila desde
+la instantánea vigente, en fragmentos, sin construir el listado entero.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.servidor import puerto_libre
+from benchmarks.sintetico import generar_datos
+from storage import JsonStorage
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+def memoria(pid: int) -> dict:
+    """VmRSS y VmHWM del proceso, en MiB"""
+    valores = {}
+    with open(f"/proc/{pid}/status") as archivo:
+        for linea in archivo:
+            clave, _, valor = linea.partition(":")
+            if clave in ("VmRSS", "VmHWM"):
+                valores[clave] = int(valor.split()[0]) / 1024
+    return valores
+
+
+def reiniciar_pico(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as archivo:
+            archivo.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def descargar(cliente: httpx.Client, ruta: str, parametros: dict):
+    inicio = time.perf_counter()
+    primero = None
+    total = 0
+    with cliente.stream("GET", ruta, params=parametros) as respuesta:
+        for fragmento in respuesta.iter_raw():
+            if primero is None:
+                primero = time.perf_counter() - inicio
+            total += len(fragmento)
+    return primero or 0.0, time.perf_counter() - inicio, total
+
+
+def paginar(cliente: httpx.Client, ruta: str, limite: int):
+    """Recorrer un listado completo página a página; devuelve (páginas, bytes)"""
+    paginas, total, cursor = 0, 0, None
+    while True:
+        parametros = {"limite": limite}
+        if cursor:
+            parametros["cursor"] = cursor
+        respuesta = cliente.get(ruta, params=parametros)
+        paginas += 1
+        total += len(respuesta.content)
+        cursor = respuesta.json()["siguiente"]
+        if not cursor:
+            return paginas, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--victimas", type=int, default=500000)
+    parser.add_argument("--pagina", type=int, default=1000, help="filas por página en el recorrido paginado")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        JsonStorage(data_file).save(generar_datos(args.victimas))
+        puerto = puerto_libre()
+        proceso = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+            env=dict(os.environ, DATA_FILE=data_file, LISTADO_MAX=str(max(1000, args.pagina))),
+        )
+        url = f"http://127.0.0.1:{puerto}"
+        try:
+            inicio = time.perf_counter()
+            while True:
+                try:
+                    httpx.get(url + "/", headers=CABECERAS)
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() - inicio > 600:
+                        raise RuntimeError("la API no arrancó")
+                    time.sleep(0.2)
+
+            print(f"{args.victimas} víctimas, arranque {time.perf_counter() - inicio:.1f}s, "
+                  f"RSS del servidor {memoria(proceso.pid)['VmRSS']:.0f} MiB")
+            print(f"{'escenario':<32} {'TTFB':>9} {'total':>9} {'MiB':>8} {'pico +MiB':>10}")
+            escenarios = [
+                ("NDJSON /fallecidos + /pacientes", [("/fallecidos", {"formato": "ndjson"}),
+                                                     ("/pacientes", {"formato": "ndjson"})]),
+                ("/datos en frío", [("/datos", {})]),
+                ("/datos precodificado", [("/datos", {})]),
+            ]
+            with httpx.Client(base_url=url, headers={**CABECERAS, "Accept-Encoding": "identity"},
+                              timeout=600) as cliente:
+                for etiqueta, rutas in escenarios:
+                    reiniciado = reiniciar_pico(proceso.pid)
+                    base = memoria(proceso.pid)["VmRSS"]
+                    primero, total, recibidos = None, 0.0, 0
+                    for ruta, parametros in rutas:
+                        ttfb, duracion, cantidad = descargar(cliente, ruta, parametros)
+                        primero = ttfb if primero is None else primero
+                        total += duracion
+                        recibidos += cantidad
+                    pico = memoria(proceso.pid)["VmHWM"] - base if reiniciado else float("nan")
+                    print(f"{etiqueta:<32} {primero * 1000:>7.0f}ms {total:>8.2f}s {recibidos / 2 ** 20:>8.1f} "
+                          f"{pico:>10.1f}")
+
+                inicio = time.perf_counter()
+                paginas, recibidos = 0, 0
+                for ruta in ("/fallecidos", "/pacientes"):
+                    cantidad_paginas, cantidad = paginar(cliente, ruta, args.pagina)
+                    paginas += cantidad_paginas
+                    recibidos += cantidad
+                print(f"{'paginado (' + str(paginas) + ' páginas)':<32} {'':>9} "
+                      f"{time.perf_counter() - inicio:>8.2f}s {recibidos / 2 ** 20:>8.1f}")
+        finally:
+            proceso.terminate()
+            proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
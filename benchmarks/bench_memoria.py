@@ -0,0 +1,101 @@
+"""Memoria residente y tiempo de arranque de DataManager: snapshot JSON contra snapshot binario.
+
+Uso: python -m benchmarks.bench_memoria [--tamanos 10000,100000,1000000] [--consultas 50]
+
+Para cada tamaño escribe el registro en JSON, lo convierte al formato binario
+(arrancando una vez con STORAGE_MODE=binario) y mide, cada caso en un proceso
+nuevo:
+
+- json: DataManager leyendo el JSON (normaliza nombres y arma el índice de
+  trigramas);
+- binario: DataManager leyendo el snapshot mapeado en memoria (claves e
+  índice ya calculados; las listas de cada trigrama se decodifican al usarse).
+
+Informa el tiempo de arranque, la memoria residente que agregan los datos, el
+tamaño del archivo, lo que tarda la primera búsqueda aproximada (en binario
+incluye decodificar sus trigramas), el p50 de las siguientes y lo que tarda
+escribir un snapshot (la compactación).
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.sintetico import generar_datos, percentil
+from benchmarks.suite import en_proceso_nuevo, memoria
+from storage import JsonStorage
+
+
+def medir(data_file: str, modo: str, consultas: int) -> dict:
+    from data_manager import DataManager
+    from storage import BinarioStorage, JournalStorage
+
+    base = memoria()["VmRSS"]
+    inicio = time.perf_counter()
+    if modo == "binario":
+        storage = BinarioStorage(data_file, intervalo_compactacion=0)
+    else:
+        storage = JournalStorage(data_file, intervalo_compactacion=0)
+    manager = DataManager(data_file, storage=storage)
+    arranque = time.perf_counter() - inicio
+    rss = memoria()["VmRSS"] - base
+
+    aleatorio = random.Random(5)
+    nombres = aleatorio.sample(list(manager.instantanea().fallecidos), consultas)
+    # Una errata en cada consulta, para que la búsqueda no sea exacta
+    consultas = [nombre[:len(nombre) // 2] + nombre[len(nombre) // 2 + 1:] for nombre in nombres]
+    inicio = time.perf_counter()
+    manager.buscar_parecidos(consultas[0], 5)
+    primera = time.perf_counter() - inicio
+    tiempos = []
+    for consulta in consultas[1:]:
+        inicio = time.perf_counter()
+        manager.buscar_parecidos(consulta, 5)
+        tiempos.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    storage.save(manager._copiar_datos())
+    snapshot = time.perf_counter() - inicio
+    archivo = storage.snapshot_file if modo == "binario" else data_file
+    return {
+        "arranque": arranque,
+        "rss": rss,
+        "rss_busquedas": memoria()["VmRSS"] - base,
+        "archivo": os.path.getsize(archivo) / 2 ** 20,
+        "primera": primera,
+        "p50": percentil(tiempos, 50),
+        "snapshot": snapshot,
+    }
+
+
+def convertir(data_file: str):
+    """Escribir el snapshot binario a partir del JSON (como al pasar a STORAGE_MODE=binario)"""
+    from data_manager import DataManager
+    from storage import BinarioStorage
+
+    DataManager(data_file, storage=BinarioStorage(data_file, intervalo_compactacion=0)).close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="10000,100000,1000000")
+    parser.add_argument("--consultas", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'víctimas':>9} {'modo':<8} {'arranque':>9} {'RSS MiB':>8} {'tras buscar':>12} {'archivo MiB':>12} "
+          f"{'1ª búsqueda':>12} {'p50':>9} {'snapshot':>9}")
+    for total in (int(valor) for valor in args.tamanos.split(",")):
+        with tempfile.TemporaryDirectory() as directorio:
+            data_file = os.path.join(directorio, "datos.json")
+            JsonStorage(data_file).save(generar_datos(total))
+            en_proceso_nuevo(convertir, data_file)
+            for modo in ("json", "binario"):
+                r = en_proceso_nuevo(medir, data_file, modo, args.consultas)
+                print(f"{total:>9} {modo:<8} {r['arranque']:>8.2f}s {r['rss']:>8.0f} {r['rss_busquedas']:>12.0f} "
+                      f"{r['archivo']:>12.1f} {r['primera'] * 1000:>10.1f}ms {r['p50'] * 1000:>7.2f}ms "
+                      f"{r['snapshot']:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Costo de las métricas (/metrics): la misma carga con la medición activada y desactivada.
+
+Uso: python -m benchmarks.bench_metricas [--victimas 10000] [--peticiones 2000] [--rondas 7]
+
+Llama a la aplicación ASGI directamente (sin red ni cliente HTTP, que
+diluirían la diferencia) con una mezcla de lecturas baratas (/datos con
+ETag -> 304, /estadisticas, /pacientes paginado, /buscar) y altas con la
+bitácora como almacenamiento. Alterna rondas con REGISTRO.activo en False y
+en True y compara la mediana de cada modo. Al final mide lo que tarda un
+scrape de /metrics.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.sintetico import generar_datos, generar_nombres
+from storage import JsonStorage
+
+
+async def llamar(app, metodo: str, ruta: str, query: str = "", cuerpo: bytes = b"", cabeceras=()) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": metodo, "scheme": "http",
+        "path": ruta, "raw_path": ruta.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"x-api-key", b"1901"), (b"content-type", b"application/json"), *cabeceras],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 80),
+    }
+    enviado = False
+    estado = 0
+
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {"type": "http.request", "body": cuerpo, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(mensaje):
+        nonlocal estado
+        if mensaje["type"] == "http.response.start":
+            estado = mensaje["status"]
+
+    await app(scope, receive, send)
+    return estado
+
+
+async def ronda(main_api, peticiones: int, nombres, etag: bytes) -> float:
+    app = main_api.app
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        tipo = i % 10
+        if tipo < 4:
+            await llamar(app, "GET", "/datos", cabeceras=[(b"if-none-match", etag)])
+        elif tipo < 6:
+            await llamar(app, "GET", "/estadisticas")
+        elif tipo < 8:
+            await llamar(app, "GET", "/pacientes", "limite=20")
+        elif tipo == 8:
+            await llamar(app, "GET", "/buscar", "q=jose%20perez&limite=5")
+        else:
+            cuerpo = json.dumps({"nombre": next(nombres), "hospital": "Hospital Carga", "edad": 30}).encode()
+            await llamar(app, "POST", "/pacientes/registrar", cuerpo=cuerpo)
+    return time.perf_counter() - inicio
+
+
+async def medir(main_api, args):
+    nombres = iter(generar_nombres(args.victimas + args.peticiones * args.rondas * 2, semilla=5)[args.victimas:])
+    tiempos = {False: [], True: []}
+    async with main_api.lifespan(main_api.app):
+        # Calentar (cachés de /datos, /estadisticas y de la búsqueda)
+        await ronda(main_api, 200, nombres, b'""')
+        for numero in range(args.rondas):
+            # Alternar el orden para no favorecer a ningún modo
+            for activo in ((False, True) if numero % 2 == 0 else (True, False)):
+                main_api.REGISTRO.activo = activo
+                etag = (await main_api._datos_codificados())["etag"].encode()
+                tiempos[activo].append(await ronda(main_api, args.peticiones, nombres, etag))
+        main_api.REGISTRO.activo = True
+
+        inicio = time.perf_counter()
+        texto = main_api.REGISTRO.exportar()
+        scrape = time.perf_counter() - inicio
+    return tiempos, scrape, len(texto)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--victimas", type=int, default=10000)
+    parser.add_argument("--peticiones", type=int, default=2000, help="peticiones por ronda")
+    parser.add_argument("--rondas", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        JsonStorage(data_file).save(generar_datos(args.victimas))
+        os.environ["DATA_FILE"] = data_file
+        os.environ["STORAGE_MODE"] = "journal"
+        os.environ["LOG_FILE"] = os.path.join(directorio, "search_assistant.log")
+        main_api = importlib.import_module("main")
+        tiempos, scrape, tamano = asyncio.run(medir(main_api, args))
+
+    sin = statistics.median(tiempos[False])
+    con = statistics.median(tiempos[True])
+    print(f"{args.victimas} víctimas, {args.rondas} rondas de {args.peticiones} peticiones "
+          f"(40% /datos 304, 20% /estadisticas, 20% /pacientes, 10% /buscar, 10% altas)")
+    print(f"{'modo':<16} {'mediana':>9} {'por petición':>13}")
+    print(f"{'sin métricas':<16} {sin:>8.3f}s {sin / args.peticiones * 1e6:>11.1f}µs")
+    print(f"{'con métricas':<16} {con:>8.3f}s {con / args.peticiones * 1e6:>11.1f}µs")
+    print(f"sobrecosto: {(con - sin) / sin:+.2%} ({(con - sin) / args.peticiones * 1e6:+.1f}µs por petición)")
+    print(f"scrape de /metrics: {scrape * 1000:.2f}ms, {tamano} bytes")
+
+
+if __name__ == "__main__":
+    main()
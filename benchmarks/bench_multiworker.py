@@ -0,0 +1,188 @@
+"""Throughput de la API con 1..N workers de uvicorn sobre la misma base SQLite.
+
+Uso: python -m benchmarks.bench_multiworker [--workers 1,2,4] [--victimas 10000] [--segundos 10]
+                                            [--clientes 4] [--concurrencia 16] [--escrituras 0.1]
+
+Para cada número de workers arranca `uvicorn main:app --workers N` con
+STORAGE_MODE=sqlite sobre una copia de la misma base y la carga desde varios
+procesos cliente con una mezcla de GET /datos (revalidación con ETag, como un
+panel que refresca) y POST /pacientes/registrar o /fallecidos/registrar. Al
+final comprueba que todos los workers sirven el mismo ETag, es decir, que
+ninguno se quedó con una copia divergente.
+
+Antes, en el mismo proceso, arranca dos DataManager sobre una base vacía
+(sin migrar: el primero guarda los datos iniciales) y comprueba que tras
+escribir desde ambos terminan con los mismos datos y la misma versión.
+
+El escalado depende de los núcleos libres: con un solo núcleo, más workers no
+pueden dar más throughput (el número de núcleos se muestra en la cabecera).
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.servidor import puerto_libre
+from benchmarks.sintetico import generar_datos, generar_nombres, percentil
+from data_manager import DataManager
+from storage import SQLiteStorage
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+async def _cargar(url: str, segundos: float, concurrencia: int, proporcion_escrituras: float, semilla: int):
+    aleatorio = random.Random(semilla)
+    nombres = generar_nombres(20000, semilla=semilla)
+    latencias = {"lectura": [], "escritura": []}
+    errores = 0
+    fin = time.perf_counter() + segundos
+
+    async def trabajador(cliente, etag):
+        nonlocal errores
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            if aleatorio.random() < proporcion_escrituras:
+                tipo = "escritura"
+                nombre = aleatorio.choice(nombres)
+                if aleatorio.random() < 0.5:
+                    respuesta = await cliente.post("/pacientes/registrar",
+                                                   json={"nombre": nombre, "hospital": "Hospital Carga", "edad": 30})
+                else:
+                    respuesta = await cliente.post("/fallecidos/registrar", json={"nombre": nombre})
+            else:
+                tipo = "lectura"
+                respuesta = await cliente.get("/datos", headers={"If-None-Match": etag})
+                if respuesta.status_code == 200:
+                    etag = respuesta.headers["etag"]
+            latencias[tipo].append(time.perf_counter() - inicio)
+            if respuesta.status_code >= 500:
+                errores += 1
+
+    limites = httpx.Limits(max_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=60, limits=limites) as cliente:
+        etag = (await cliente.get("/datos")).headers["etag"]
+        await asyncio.gather(*(trabajador(cliente, etag) for _ in range(concurrencia)))
+    return latencias, errores
+
+
+def _proceso_cliente(argumentos):
+    return asyncio.run(_cargar(*argumentos))
+
+
+def _esperar(url: str):
+    for _ in range(600):
+        try:
+            httpx.get(url + "/", headers=CABECERAS)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError("la API no arrancó")
+
+
+def _etags(url: str, intentos: int) -> set:
+    """ETag de /datos visto desde varias conexiones nuevas (cada una puede caer en otro worker)"""
+    etags = set()
+    for _ in range(intentos):
+        with httpx.Client(base_url=url, headers=CABECERAS, timeout=60) as cliente:
+            etags.add(cliente.get("/datos").headers["etag"])
+    return etags
+
+
+def verificar_base_nueva(directorio: str) -> bool:
+    """Dos DataManager sobre una base SQLite nueva, como dos workers de un despliegue sin migrar"""
+    sqlite_file = os.path.join(directorio, "nueva.sqlite3")
+    data_file = os.path.join(directorio, "no_usado.json")
+    primero = DataManager(data_file, storage=SQLiteStorage(sqlite_file))
+    segundo = DataManager(data_file, storage=SQLiteStorage(sqlite_file))
+    try:
+        primero.add_fallecido("Persona Nueva Primero")
+        segundo.add_fallecido("Persona Nueva Segundo")
+        primero.add_paciente("Paciente Nuevo Primero", "Hospital Carga", 30)
+        primero.sincronizar()
+        segundo.sincronizar()
+        return (primero.get_all_data() == segundo.get_all_data()
+                and primero.instantanea().version == segundo.instantanea().version)
+    finally:
+        primero.close()
+        segundo.close()
+
+
+def medir(workers: int, base: str, directorio: str, args):
+    sqlite_file = os.path.join(directorio, f"carga_{workers}.sqlite3")
+    shutil.copy(base, sqlite_file)
+    puerto = puerto_libre()
+    entorno = dict(os.environ, STORAGE_MODE="sqlite", SQLITE_FILE=sqlite_file,
+                   DATA_FILE=os.path.join(directorio, "no_usado.json"))
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=entorno,
+    )
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        _esperar(url)
+        trabajos = [(url, args.segundos, args.concurrencia, args.escrituras, 1000 * workers + i)
+                    for i in range(args.clientes)]
+        with multiprocessing.Pool(args.clientes) as pool:
+            resultados = pool.map(_proceso_cliente, trabajos)
+
+        # Dar tiempo al sincronizador de cada worker y comprobar que todos coinciden
+        time.sleep(1)
+        coherente = len(_etags(url, 4 * workers)) == 1
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    lecturas = [latencia for latencias, _ in resultados for latencia in latencias["lectura"]]
+    escrituras = [latencia for latencias, _ in resultados for latencia in latencias["escritura"]]
+    errores = sum(errores for _, errores in resultados)
+    return {
+        "rps": (len(lecturas) + len(escrituras)) / args.segundos,
+        "lectura_p50": percentil(lecturas, 50) * 1000,
+        "lectura_p99": percentil(lecturas, 99) * 1000,
+        "escritura_p50": percentil(escrituras, 50) * 1000,
+        "escritura_p99": percentil(escrituras, 99) * 1000,
+        "errores": errores,
+        "coherente": coherente,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--victimas", type=int, default=10000)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=4, help="procesos generadores de carga")
+    parser.add_argument("--concurrencia", type=int, default=16, help="peticiones en vuelo por proceso cliente")
+    parser.add_argument("--escrituras", type=float, default=0.1, help="fracción de peticiones que registran")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        base = os.path.join(directorio, "base.sqlite3")
+        storage = SQLiteStorage(base)
+        storage.save(generar_datos(args.victimas))
+        storage.close()
+
+        coherente = verificar_base_nueva(directorio)
+        print(f"arranque de dos procesos en una base vacía: {'coherente' if coherente else 'DIVERGENTE'}")
+        print(f"{args.victimas} víctimas, {args.clientes}x{args.concurrencia} peticiones en vuelo, "
+              f"{args.escrituras:.0%} escrituras, {args.segundos:.0f}s por escenario, {os.cpu_count()} núcleos")
+        print(f"{'workers':>7} {'req/s':>9} {'lect p50':>9} {'lect p99':>9} {'escr p50':>9} {'escr p99':>9} "
+              f"{'5xx':>5}  coherente")
+        for workers in [int(valor) for valor in args.workers.split(",")]:
+            r = medir(workers, base, directorio, args)
+            print(f"{workers:>7} {r['rps']:>9.1f} {r['lectura_p50']:>7.1f}ms {r['lectura_p99']:>7.1f}ms "
+                  f"{r['escritura_p50']:>7.1f}ms {r['escritura_p99']:>7.1f}ms {r['errores']:>5}  "
+                  f"{'sí' if r['coherente'] else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
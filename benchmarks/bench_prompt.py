@@ -0,0 +1,139 @@
+"""Tamaño del prompt y costo de construirlo: lista completa vs recuperación por nombre.
+
+Uso: python -m benchmarks.bench_prompt [--victimas 50000]
+
+Compara el contexto que recibía el modelo antes (get_data_for_model con todo
+el registro) con el contexto compacto de recuperacion.py para consultas por
+nombre (exactas, incompletas, con errores y sin acentos).
+
+Antes comprueba, sobre el registro inicial, qué contexto recibe cada una de
+unas consultas reales (respuesta directa, candidatos, hospital mencionado o
+registro completo) y termina con código 1 si alguna no recibe el esperado.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.sintetico import generar_datos, percentil
+from data_manager import DataManager
+from recuperacion import contexto_candidatos, necesita_registro_completo, recuperar
+from storage import JsonStorage
+
+
+# Consultas reales y el contexto que deben recibir sobre el registro inicial
+CONSULTAS_REALES = [
+    ("¿Quiénes murieron?", "completo"),
+    ("lista de fallecidos", "completo"),
+    ("¿Cuántas víctimas hay en total?", "completo"),
+    ("¿Quiénes están en el Hospital Ney Arias Lora?", "hospital"),
+    ("¿Cuántos pacientes hay en el Moscoso Puello?", "hospital"),
+    ("Pedro Espinal, tiene 30 años", "directa"),
+    ("¿Dónde está José Manuel Montilla?", "directa"),
+    ("busco a jose montilla", "candidatos"),
+    ("sabes algo de Ruth D'Laneas de la Cruz", "candidatos"),
+    ("¿Está Elsa Espinal Arias en el Ney Arias Lora?", "hospital"),
+    ("¿Está Juan Inexistente Pérez?", "candidatos"),
+]
+
+
+def modo_contexto(recuperacion: dict) -> str:
+    """Qué recibe el modelo para una consulta (como main._preparar_consulta)"""
+    if recuperacion["exacto"] is not None:
+        return "directa"
+    if necesita_registro_completo(recuperacion):
+        return "completo"
+    return "hospital" if recuperacion["hospitales"] else "candidatos"
+
+
+def verificar_consultas_reales(directorio: str) -> list:
+    data_file = os.path.join(directorio, "inicial.json")
+    manager = DataManager(data_file, storage=JsonStorage(data_file))
+    errores = []
+    for consulta, esperado in CONSULTAS_REALES:
+        recuperacion = recuperar(manager, consulta)
+        obtenido = modo_contexto(recuperacion)
+        marca = "ok" if obtenido == esperado else f"ESPERABA {esperado}"
+        print(f"  {consulta:<50} {obtenido:<11} {marca}  nombres={recuperacion['nombres']}")
+        if obtenido != esperado:
+            errores.append(consulta)
+    return errores
+
+
+def consultas_de_prueba(manager: DataManager, cantidad: int = 200):
+    aleatorio = random.Random(3)
+    nombres = manager.fallecidos + [paciente["nombre"] for pacientes in manager.pacientes_hospitales.values()
+                                    for paciente in pacientes]
+    consultas = []
+    for nombre in aleatorio.sample(nombres, cantidad):
+        partes = nombre.split()
+        variante = aleatorio.randrange(3)
+        if variante == 0:
+            consultas.append(f"¿Dónde está {nombre}?")
+        elif variante == 1:
+            consultas.append(f"Busco a {partes[0]} {partes[-1]}")
+        else:
+            # Error de tipeo: duplicar una letra del apellido
+            apellido = partes[-1]
+            posicion = aleatorio.randrange(len(apellido))
+            errata = apellido[:posicion] + apellido[posicion] + apellido[posicion:]
+            consultas.append(f"sabes algo de {partes[0]} {errata}")
+    return consultas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--victimas", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        print("Consultas reales sobre el registro inicial:")
+        errores = verificar_consultas_reales(directorio)
+        print()
+
+        data_file = os.path.join(directorio, "datos.json")
+        storage = JsonStorage(data_file)
+        storage.save(generar_datos(args.victimas))
+        manager = DataManager(data_file, storage=storage)
+        consultas = consultas_de_prueba(manager)
+
+        tiempos_antes, tamanos_antes = [], []
+        for _ in consultas[:20]:
+            inicio = time.perf_counter()
+            texto = manager.get_data_for_model()
+            tiempos_antes.append((time.perf_counter() - inicio) * 1000)
+            tamanos_antes.append(len(texto))
+
+        tiempos_despues, tamanos_despues, directas = [], [], 0
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            recuperacion = recuperar(manager, consulta)
+            if recuperacion["exacto"]:
+                texto = ""
+            elif necesita_registro_completo(recuperacion):
+                texto = manager.get_data_for_model()
+            else:
+                texto = contexto_candidatos(manager, recuperacion)
+            tiempos_despues.append((time.perf_counter() - inicio) * 1000)
+            if recuperacion["exacto"]:
+                directas += 1
+            else:
+                tamanos_despues.append(len(texto))
+
+    print(f"{args.victimas} víctimas, {len(consultas)} consultas por nombre")
+    print(f"{'':<14} {'caracteres':>11} {'~tokens':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for etiqueta, tamanos, tiempos in (("lista completa", tamanos_antes, tiempos_antes),
+                                       ("recuperación", tamanos_despues, tiempos_despues)):
+        media = sum(tamanos) / max(1, len(tamanos))
+        print(f"{etiqueta:<14} {media:>11.0f} {media / 4:>9.0f} "
+              f"{percentil(tiempos, 50):>8.3f} {percentil(tiempos, 99):>8.3f}")
+    print(f"Respondidas sin llamar al modelo (coincidencia exacta): {directas}/{len(consultas)}")
+    if errores:
+        print(f"FALLÓ: {len(errores)} consultas reales no recibieron el contexto esperado")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
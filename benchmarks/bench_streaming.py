@@ -0,0 +1,98 @@
+"""Tiempo hasta el primer byte de /chat con y sin streaming, contra un stub que emite tokens a ritmo fijo.
+
+Uso: python -m benchmarks.bench_streaming [--consultas 50] [--concurrencia 10] [--latencia 0.4]
+                                          [--tokens 150] [--tokens-por-segundo 60]
+
+Levanta el stub de Azure y la API en hilos locales. Sin streaming, el primer
+byte llega cuando el modelo terminó; con streaming, cuando llega el primer
+token. Al final abre una respuesta en streaming, la corta tras unos tokens y
+comprueba que el stub vio la cancelación.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.azure_stub import crear_stub
+from benchmarks.servidor import servidor_en_hilo
+from benchmarks.sintetico import percentil
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+async def consultar(cliente: httpx.AsyncClient, pregunta: str, stream: bool):
+    """(segundos hasta el primer byte del cuerpo, segundos hasta el final)"""
+    inicio = time.perf_counter()
+    primero = None
+    async with cliente.stream("POST", "/chat", json={"message": pregunta, "stream": stream}) as respuesta:
+        async for _ in respuesta.aiter_raw():
+            if primero is None:
+                primero = time.perf_counter() - inicio
+    return primero, time.perf_counter() - inicio
+
+
+async def medir(url: str, consultas: int, concurrencia: int, stream: bool, ronda: int):
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(cliente, i):
+        async with semaforo:
+            # Preguntas distintas y sin nombres registrados: todas llegan al modelo
+            return await consultar(cliente, f"pregunta {ronda} numero {i}", stream)
+
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=120) as cliente:
+        return await asyncio.gather(*(una(cliente, i) for i in range(consultas)))
+
+
+async def cortar(url: str, tokens: int) -> None:
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=120) as cliente:
+        async with cliente.stream("POST", "/chat", json={"message": "pregunta que se corta", "stream": True}) as r:
+            recibidos = 0
+            async for linea in r.aiter_lines():
+                if linea.startswith("event: token"):
+                    recibidos += 1
+                    if recibidos == tokens:
+                        break
+    await asyncio.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=50)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    parser.add_argument("--latencia", type=float, default=0.4, help="segundos hasta el primer token")
+    parser.add_argument("--tokens", type=int, default=150)
+    parser.add_argument("--tokens-por-segundo", type=float, default=60)
+    args = parser.parse_args()
+
+    stub = crear_stub(latencia=args.latencia, tokens=args.tokens, tokens_por_segundo=args.tokens_por_segundo)
+    with tempfile.TemporaryDirectory() as directorio, servidor_en_hilo(stub) as url_stub:
+        os.environ["DATA_FILE"] = os.path.join(directorio, "datos.json")
+        os.environ["AZURE_ENDPOINT"] = url_stub + "/"
+        os.environ["CACHE_CHAT_MAX_BYTES"] = "0"
+        main_api = importlib.import_module("main")
+
+        print(f"{args.consultas} consultas, concurrencia {args.concurrencia}, primer token a {args.latencia}s, "
+              f"{args.tokens} tokens a {args.tokens_por_segundo:g}/s")
+        print(f"{'modo':<14} {'TTFB p50':>9} {'TTFB p99':>9} {'total p50':>10} {'total p99':>10}")
+        with servidor_en_hilo(main_api.app) as url:
+            for ronda, (etiqueta, stream) in enumerate([("sin streaming", False), ("streaming", True)]):
+                resultados = asyncio.run(medir(url, args.consultas, args.concurrencia, stream, ronda))
+                primeros = [primero for primero, _ in resultados]
+                totales = [total for _, total in resultados]
+                print(f"{etiqueta:<14} {percentil(primeros, 50) * 1000:>7.0f}ms "
+                      f"{percentil(primeros, 99) * 1000:>7.0f}ms {percentil(totales, 50) * 1000:>8.0f}ms "
+                      f"{percentil(totales, 99) * 1000:>8.0f}ms")
+
+            antes = stub.state.streams_cancelados
+            asyncio.run(cortar(url, 5))
+            cancelado = stub.state.streams_cancelados > antes
+            resultado = "el stub dejó de generar" if cancelado else "el stub NO vio la cancelación"
+            print(f"cliente que corta tras 5 tokens: {resultado}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Prueba de carga: /datos y los registros deben seguir respondiendo con chats en curso.
+
+Uso: python -m benchmarks.carga_chat [--chats 100] [--latencia 2.0] [--prob-429 0.1]
+
+Levanta el stub de Azure y la API en hilos locales, lanza N consultas a /chat
+a la vez y, mientras están en vuelo, mide la latencia de GET /datos y de
+POST /pacientes/registrar.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.azure_stub import crear_stub
+from benchmarks.servidor import servidor_en_hilo
+from benchmarks.sintetico import percentil
+
+CABECERAS = {"X-API-Key": "1901"}
+
+
+async def medir(url: str, chats: int, duracion_minima: float):
+    async with httpx.AsyncClient(base_url=url, headers=CABECERAS, timeout=120) as cliente:
+        inicio_chats = time.perf_counter()
+        tareas = [asyncio.create_task(cliente.post("/chat", json={"message": f"¿Dónde está la persona {i}?"}))
+                  for i in range(chats)]
+
+        lecturas, escrituras = [], []
+        i = 0
+        while not all(tarea.done() for tarea in tareas) or time.perf_counter() - inicio_chats < duracion_minima:
+            inicio = time.perf_counter()
+            await cliente.get("/datos")
+            lecturas.append((time.perf_counter() - inicio) * 1000)
+
+            inicio = time.perf_counter()
+            await cliente.post("/pacientes/registrar",
+                               json={"nombre": f"Paciente Carga {i}", "hospital": "Hospital Darío Contreras"})
+            escrituras.append((time.perf_counter() - inicio) * 1000)
+            i += 1
+
+        respuestas = await asyncio.gather(*tareas)
+        total_chats = time.perf_counter() - inicio_chats
+
+    codigos = {}
+    for respuesta in respuestas:
+        codigos[respuesta.status_code] = codigos.get(respuesta.status_code, 0) + 1
+    return lecturas, escrituras, codigos, total_chats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--latencia", type=float, default=2.0)
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio, \
+            servidor_en_hilo(crear_stub(latencia=args.latencia, prob_429=args.prob_429)) as url_stub:
+        os.environ["DATA_FILE"] = os.path.join(directorio, "datos.json")
+        os.environ["AZURE_ENDPOINT"] = url_stub
+        os.environ.setdefault("AZURE_MAX_EN_COLA", str(args.chats * 2))
+        main_app = importlib.import_module("main")
+
+        with servidor_en_hilo(main_app.app) as url_api:
+            lecturas, escrituras, codigos, total_chats = asyncio.run(medir(url_api, args.chats, args.latencia))
+
+    print(f"{args.chats} chats (latencia upstream {args.latencia}s) completados en {total_chats:.2f}s: {codigos}")
+    for etiqueta, tiempos in (("GET /datos", lecturas), ("POST /pacientes/registrar", escrituras)):
+        print(f"{etiqueta:<26} n={len(tiempos):<5} p50={percentil(tiempos, 50):.2f} ms "
+              f"p99={percentil(tiempos, 99):.2f} ms max={max(tiempos):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""Prueba de estrés de DataManager con hilos escritores y lectores simultáneos.
+
+Uso: python -m benchmarks.estres_concurrencia [--escritores 8] [--lectores 8] [--operaciones 2000]
+                                              [--storage journal|binario]
+
+Los escritores registran nombres que se solapan entre hilos (mismo nombre con
+otra grafía, pacientes que luego pasan a fallecidos y lotes). Los lectores
+consultan instantáneas, el contexto del modelo, personas y cambios. Al final se
+verifican los invariantes y el proceso termina con código 1 si alguno falla.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.sintetico import generar_datos, generar_nombres
+from data_manager import DataManager, normalizar_nombre
+from storage import BinarioStorage, JournalStorage
+
+
+def variante(nombre: str, aleatorio: random.Random) -> str:
+    """Otra grafía del mismo nombre (mayúsculas o sin acentos), que debe contar como duplicado"""
+    return nombre.upper() if aleatorio.random() < 0.5 else normalizar_nombre(nombre)
+
+
+def escritor(manager: DataManager, nombres, operaciones: int, semilla: int, exitos: list, errores: list):
+    aleatorio = random.Random(semilla)
+    try:
+        for _ in range(operaciones):
+            nombre = aleatorio.choice(nombres)
+            if aleatorio.random() < 0.5:
+                nombre = variante(nombre, aleatorio)
+            accion = aleatorio.random()
+            if accion < 0.45:
+                hospital = f"Hospital {aleatorio.randrange(5)}"
+                if manager.add_paciente(nombre, hospital, aleatorio.randint(1, 90))["success"]:
+                    exitos.append(("paciente", normalizar_nombre(nombre)))
+            elif accion < 0.9:
+                if manager.add_fallecido(nombre):
+                    exitos.append(("fallecido", normalizar_nombre(nombre)))
+            else:
+                lote = [aleatorio.choice(nombres) for _ in range(5)]
+                for resultado in manager.add_fallecidos(lote):
+                    if resultado["success"]:
+                        exitos.append(("fallecido", normalizar_nombre(resultado["nombre"])))
+    except Exception as e:
+        errores.append(f"escritor: {e!r}")
+
+
+def lector(manager: DataManager, nombres, detener: threading.Event, lecturas: list, errores: list):
+    aleatorio = random.Random()
+    realizadas = 0
+    try:
+        while not detener.is_set():
+            instantanea = manager.instantanea()
+            if realizadas % 20 == 0:
+                # Una instantánea nunca puede mostrar a alguien en dos sitios a la vez
+                claves = [normalizar_nombre(nombre) for nombre in instantanea.fallecidos]
+                for pacientes in instantanea.pacientes_hospitales.values():
+                    claves.extend(normalizar_nombre(paciente["nombre"]) for paciente in pacientes)
+                if len(claves) != len(set(claves)):
+                    errores.append(f"instantánea {instantanea.version} con nombres duplicados")
+
+            manager.get_data_for_model()
+
+            clave = normalizar_nombre(aleatorio.choice(nombres))
+            persona = manager.obtener_persona(clave)
+            if persona is not None and normalizar_nombre(persona["nombre"]) != clave:
+                errores.append(f"obtener_persona({clave!r}) devolvió {persona['nombre']!r}")
+
+            cambios = manager.get_cambios(manager.version - 5)
+            secuencias = [cambio["seq"] for cambio in cambios["cambios"]]
+            if secuencias != sorted(secuencias):
+                errores.append("cambios fuera de orden")
+            realizadas += 1
+            # Sin pausa, los lectores en bucle acaparan el GIL y los escritores (que lo sueltan
+            # en cada fsync) apenas avanzan; una petición real siempre tiene alguna pausa
+            time.sleep(0.001)
+    except Exception as e:
+        errores.append(f"lector: {e!r}")
+    lecturas.append(realizadas)
+
+
+def verificar(manager: DataManager, exitos: list) -> list:
+    errores = []
+    instantanea = manager.instantanea()
+    claves_fallecidos = [normalizar_nombre(nombre) for nombre in instantanea.fallecidos]
+    claves_pacientes = [normalizar_nombre(paciente["nombre"])
+                        for pacientes in instantanea.pacientes_hospitales.values() for paciente in pacientes]
+    todas = claves_fallecidos + claves_pacientes
+    if len(todas) != len(set(todas)):
+        errores.append("una persona aparece más de una vez en el registro")
+    if len(todas) != len(manager.indice):
+        errores.append(f"el índice tiene {len(manager.indice)} entradas para {len(todas)} personas")
+
+    def ubicacion(clave):
+        entrada = manager.indice.get(clave)
+        return None if entrada is None else (entrada.estado, entrada.hospital, manager.posicion(entrada))
+
+    for hospital, pacientes in instantanea.pacientes_hospitales.items():
+        for posicion, paciente in enumerate(pacientes):
+            if ubicacion(normalizar_nombre(paciente["nombre"])) != ("paciente", hospital, posicion):
+                errores.append(f"índice desalineado para {paciente['nombre']}: "
+                               f"{ubicacion(normalizar_nombre(paciente['nombre']))}")
+    for posicion, nombre in enumerate(instantanea.fallecidos):
+        if ubicacion(normalizar_nombre(nombre)) != ("fallecido", None, posicion):
+            errores.append(f"índice desalineado para {nombre}")
+
+    # Las claves que acompañan a la instantánea (para el snapshot binario) corresponden a sus registros
+    if manager.storage.con_indice:
+        if list(instantanea.claves_fallecidos) != claves_fallecidos:
+            errores.append("las claves de fallecidos de la instantánea no corresponden a sus nombres")
+        claves_hospitales = [clave for claves in instantanea.claves_hospitales.values() for clave in claves]
+        if claves_hospitales != claves_pacientes:
+            errores.append("las claves de pacientes de la instantánea no corresponden a sus nombres")
+
+    # Cada nombre se registra como fallecido a lo sumo una vez, y como paciente a lo sumo una vez
+    fallecidos_registrados = [clave for tipo, clave in exitos if tipo == "fallecido"]
+    pacientes_registrados = [clave for tipo, clave in exitos if tipo == "paciente"]
+    if len(fallecidos_registrados) != len(set(fallecidos_registrados)):
+        errores.append("un mismo fallecido se registró dos veces")
+    if len(pacientes_registrados) != len(set(pacientes_registrados)):
+        errores.append("un mismo paciente se registró dos veces")
+
+    if instantanea.version != manager.version:
+        errores.append("la instantánea final no corresponde a la última versión")
+    if manager.get_data_for_model().count("\n- ") != len(todas):
+        errores.append("el contexto del modelo no tiene una línea por persona")
+    return errores
+
+
+def verificar_indice_recargado(data_file: str) -> list:
+    """Recargar dos veces un snapshot binario cuyo índice trae nombres que no están en los datos.
+
+    Es lo que deja el compactador cuando exporta el índice después de tomar la
+    instantánea: al cargar se quitan esos nombres, y el snapshot siguiente los
+    guarda como quitados (al menos dos, para que se repitan sus claves vacías).
+    """
+    errores = []
+    esperado = None
+    for ronda in range(3):
+        manager = DataManager(data_file, storage=BinarioStorage(data_file, intervalo_compactacion=0))
+        if esperado is None:
+            esperado = manager.get_all_data()
+        elif manager.get_all_data() != esperado:
+            errores.append(f"recarga {ronda} del snapshot binario: los datos no coinciden")
+        if sorted(manager.trigramas.claves()) != sorted(manager.indice):
+            errores.append(f"recarga {ronda} del snapshot binario: el índice de trigramas no coincide")
+        datos = manager._copiar_datos()
+        manager.trigramas.agregar(f"posterior uno {ronda}")
+        manager.trigramas.agregar(f"posterior dos {ronda}")
+        datos["trigramas"] = manager.trigramas.exportar()
+        manager.storage.save(datos)
+        manager.close()
+    return errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritores", type=int, default=8)
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--operaciones", type=int, default=2000)
+    parser.add_argument("--victimas", type=int, default=2000)
+    parser.add_argument("--storage", choices=("journal", "binario"), default="journal")
+    args = parser.parse_args()
+    clase_storage = BinarioStorage if args.storage == "binario" else JournalStorage
+
+    with tempfile.TemporaryDirectory() as directorio:
+        data_file = os.path.join(directorio, "datos.json")
+        JournalStorage(data_file).save(generar_datos(args.victimas))
+        manager = DataManager(data_file, storage=clase_storage(data_file, intervalo_compactacion=0.05),
+                              max_cambios=1000)
+        nombres = generar_nombres(args.victimas + 500, semilla=42)
+
+        exitos, errores, lecturas = [], [], []
+        detener = threading.Event()
+        lectores = [threading.Thread(target=lector, args=(manager, nombres, detener, lecturas, errores))
+                    for _ in range(args.lectores)]
+        escritores = [threading.Thread(target=escritor, args=(manager, nombres, args.operaciones, i, exitos, errores))
+                      for i in range(args.escritores)]
+
+        inicio = time.perf_counter()
+        for hilo in lectores + escritores:
+            hilo.start()
+        for hilo in escritores:
+            hilo.join()
+        detener.set()
+        for hilo in lectores:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        errores.extend(verificar(manager, exitos))
+        manager.close()
+
+        # Lo persistido (snapshot + bitácora) debe reconstruir exactamente el mismo estado
+        recargado = DataManager(data_file, storage=clase_storage(data_file, intervalo_compactacion=0))
+        if recargado.get_all_data() != manager.get_all_data():
+            errores.append("los datos recargados del disco no coinciden con los de memoria")
+        recargado.close()
+        if args.storage == "binario":
+            errores.extend(verificar_indice_recargado(data_file))
+
+    print(f"{args.escritores} escritores x {args.operaciones} operaciones, {args.lectores} lectores: "
+          f"{len(exitos)} registros, {sum(lecturas)} lecturas en {duracion:.2f}s")
+    if errores:
+        print(f"FALLÓ ({len(errores)} errores):")
+        for error in errores[:20]:
+            print(f"  - {error}")
+        sys.exit(1)
+    print("OK: invariantes verificados")
+
+
+if __name__ == "__main__":
+    main()
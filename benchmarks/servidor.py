@@ -0,0 +1,30 @@
+"""Arranque de aplicaciones ASGI con uvicorn en un hilo, para pruebas de carga locales"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import uvicorn
+
+
+def puerto_libre() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def servidor_en_hilo(app, puerto: int = 0):
+    """Servir `app` en 127.0.0.1 mientras dure el bloque; devuelve la URL base"""
+    puerto = puerto or puerto_libre()
+    config = uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning", lifespan="on")
+    servidor = uvicorn.Server(config)
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{puerto}"
+    finally:
+        servidor.should_exit = True
+        hilo.join(timeout=10)
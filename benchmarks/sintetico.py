@@ -0,0 +1,73 @@
+"""Generación de registros sintéticos de víctimas para los benchmarks"""
+import random
+from typing import Dict, List
+
+from data_manager import normalizar_nombre
+
+NOMBRES = [
+    "José", "María", "Juan", "Ana", "Luis", "Carmen", "Pedro", "Rosa", "Miguel", "Isabel",
+    "Ramón", "Altagracia", "Héctor", "Lucía", "Andrés", "Mercedes", "Víctor", "Milagros",
+    "Félix", "Yolanda", "Julio", "Nelsy", "Rubén", "Dolores", "Martín", "Belkis", "Jesús",
+    "Inés", "Ángel", "Yadira", "Sebastián", "Raquel", "Tomás", "Fátima", "Joaquín", "Noemí",
+    "Rafael", "Gisela", "Óscar", "Mariela", "Esteban", "Begoña", "Nicolás", "Sofía", "Iván",
+    "Débora", "Germán", "Zoila", "Aníbal", "Maité",
+]
+
+APELLIDOS = [
+    "Pérez", "Rodríguez", "Gómez", "Fernández", "Martínez", "Sánchez", "Ramírez", "Núñez",
+    "Peña", "Jiménez", "Vásquez", "Méndez", "Guzmán", "Castaños", "Encarnación", "Benítez",
+    "Velázquez", "Suárez", "Henríquez", "Liranzo", "Almánzar", "Santana", "de la Cruz",
+    "de la Rosa", "D’Oleo", "Montás", "Cabrera", "Polanco", "Espaillat", "Taveras", "Féliz",
+    "Ortiz", "Herrera", "Díaz", "Valdez", "Rosario", "Batista", "Marte", "Tejeda", "Brito",
+    "Acosta", "Mejía", "Durán", "Báez", "Lluberes", "Céspedes", "Guillén", "Muñoz", "Soto",
+    "Urbáez",
+]
+
+HOSPITALES = [
+    "Hospital Darío Contreras", "Hospital Marcelino Vélez Santana", "Hospital Vinicio Calventi",
+    "Hospital Ney Arias Lora", "Hospital Moscoso Puello", "Hospital Salvador B. Gautier",
+    "Hospital Luis E. Aybar", "Hospital Francisco Moscoso", "Hospital Robert Reid Cabral",
+    "Hospital Juan Bosch",
+]
+
+
+def generar_nombres(cantidad: int, semilla: int = 42) -> List[str]:
+    """Generar `cantidad` nombres distintos (también tras normalizarlos)"""
+    aleatorio = random.Random(semilla)
+    nombres = []
+    vistos = set()
+    while len(nombres) < cantidad:
+        partes = [aleatorio.choice(NOMBRES)]
+        if aleatorio.random() < 0.6:
+            partes.append(aleatorio.choice(NOMBRES))
+        partes.append(aleatorio.choice(APELLIDOS))
+        partes.append(aleatorio.choice(APELLIDOS))
+        nombre = " ".join(partes)
+        clave = normalizar_nombre(nombre)
+        if clave not in vistos:
+            vistos.add(clave)
+            nombres.append(nombre)
+    return nombres
+
+
+def generar_datos(total: int, proporcion_fallecidos: float = 0.4, semilla: int = 42) -> Dict:
+    """Generar un conjunto de datos con el mismo formato que disaster_data.json"""
+    aleatorio = random.Random(semilla)
+    nombres = generar_nombres(total, semilla)
+    corte = int(total * proporcion_fallecidos)
+    pacientes_hospitales = {}
+    for nombre in nombres[corte:]:
+        paciente = {"nombre": nombre}
+        if aleatorio.random() < 0.8:
+            paciente["edad"] = aleatorio.randint(16, 80)
+        pacientes_hospitales.setdefault(aleatorio.choice(HOSPITALES), []).append(paciente)
+    return {"fallecidos": nombres[:corte], "pacientes_hospitales": pacientes_hospitales}
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil p (0-100) por rango más cercano"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
@@ -0,0 +1,414 @@
+"""Suite de rendimiento reproducible: DataManager método por método, arranque, memoria y carga mixta sobre la API.
+
+Uso: python -m benchmarks.suite [--tamanos 1000,10000,100000] [--victimas-carga 10000]
+                                [--peticiones 3000] [--clientes 16] [--guardar] [--tolerancia 0.3]
+
+Para cada tamaño genera un registro sintético (nombres con tildes, eñes y
+apellidos compuestos, ver benchmarks.sintetico) y, en un proceso nuevo para
+que la memoria de un tamaño no contamine la del siguiente:
+
+- mide el arranque (DataManager leyendo el snapshot) y la memoria residente;
+- mide cada método público de DataManager (p50/p99 por llamada). Los que
+  guardan resultados por versión (estadísticas, contexto del modelo) se
+  miden justo después de una escritura, que es su caso caro; las altas se
+  miden con su fsync en la bitácora.
+
+Luego lanza la API en proceso (httpx con ASGITransport, sin red) contra el
+stub de Azure y reparte `--peticiones` entre `--clientes` clientes
+concurrentes: 70% lecturas (/datos con ETag, /buscar, /pacientes,
+/estadisticas, /cambios), 20% altas y 10% /chat. Informa p50/p99 por tipo,
+peticiones por segundo y memoria.
+
+Los resultados se comparan con la línea base guardada (--linea-base, por
+defecto benchmarks/linea_base.json) y se marcan las métricas que empeoran
+más de --tolerancia (p50, peticiones por segundo, arranque y memoria; el p99
+solo con --con-p99); en ese caso el proceso termina con código 1. --guardar
+reemplaza la línea base con esta ejecución. Las líneas base solo son
+comparables en la misma máquina.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.sintetico import HOSPITALES, generar_datos, generar_nombres, percentil
+from data_manager import normalizar_nombre
+from storage import JsonStorage
+
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base.json")
+
+CABECERAS = {"X-API-Key": "1901"}
+
+# Tamaño de los lotes en add_fallecidos / add_pacientes
+TAMANO_LOTE = 100
+
+# Diferencias absolutas por debajo de las cuales no se marca una regresión (ruido de medición)
+PISOS = {"ms": 0.05, "mib": 5.0, "s": 0.05, "rps": 0.0}
+
+
+def memoria() -> Dict[str, float]:
+    """VmRSS y VmHWM de este proceso, en MiB"""
+    valores = {}
+    with open("/proc/self/status") as archivo:
+        for linea in archivo:
+            clave, _, valor = linea.partition(":")
+            if clave in ("VmRSS", "VmHWM"):
+                valores[clave] = int(valor.split()[0]) / 1024
+    return valores
+
+
+def _resumen(tiempos: List[float]) -> Dict:
+    return {"n": len(tiempos), "p50_ms": percentil(tiempos, 50) * 1000, "p99_ms": percentil(tiempos, 99) * 1000}
+
+
+# --- Métodos de DataManager -------------------------------------------------------------------------------
+
+
+class _Datos:
+    """Nombres para las consultas y las altas de un tamaño, elegidos de antemano"""
+
+    def __init__(self, manager, total: int):
+        instantanea = manager.instantanea()
+        aleatorio = random.Random(7)
+        self.fallecidos = aleatorio.sample(list(instantanea.fallecidos), min(1000, len(instantanea.fallecidos)))
+        pacientes = [(paciente["nombre"], hospital) for hospital, lista in instantanea.pacientes_hospitales.items()
+                     for paciente in lista]
+        self.pacientes = aleatorio.sample(pacientes, min(1000, len(pacientes)))
+        self.claves = [normalizar_nombre(nombre) for nombre, _ in self.pacientes]
+        # Consultas aproximadas: nombres existentes sin tildes, con un apellido de menos o con una errata
+        self.parecidos = []
+        for nombre, _ in self.pacientes[:200]:
+            partes = nombre.split(" ")
+            variante = aleatorio.randrange(3)
+            if variante == 0:
+                self.parecidos.append(nombre.lower().replace("á", "a").replace("é", "e").replace("í", "i"))
+            elif variante == 1 and len(partes) > 2:
+                self.parecidos.append(" ".join(partes[:-1]))
+            else:
+                posicion = aleatorio.randrange(len(nombre))
+                self.parecidos.append(nombre[:posicion] + nombre[posicion + 1:])
+        self._nuevos = iter(generar_nombres(total + 200000, semilla=11)[total:])
+        self._pacientes_restantes = iter(self.pacientes)
+
+    def nuevo(self) -> str:
+        return next(self._nuevos)
+
+    def paciente_sin_usar(self) -> str:
+        """Un paciente existente que ningún caso anterior pasó a fallecidos"""
+        return next(self._pacientes_restantes)[0]
+
+
+def _casos(manager, datos: _Datos) -> List[Tuple[str, Optional[Callable], Callable, int]]:
+    """(nombre, preparación sin medir, llamada medida, repeticiones máximas)"""
+    def elegir(lista, i):
+        return lista[i % len(lista)]
+
+    def escribir(i):
+        manager.add_paciente(datos.nuevo(), HOSPITALES[i % len(HOSPITALES)], 30)
+
+    return [
+        ("buscar", None, lambda i: manager.buscar(elegir(datos.fallecidos, i)), 2000),
+        ("buscar (ausente)", None, lambda i: manager.buscar(f"Nadie Registrado {i}"), 2000),
+        ("obtener_persona", None, lambda i: manager.obtener_persona(elegir(datos.claves, i)), 2000),
+        ("buscar_parecidos", None, lambda i: manager.buscar_parecidos(elegir(datos.parecidos, i), 5), 200),
+        ("check_fallecido_exists", None,
+         lambda i: manager.check_fallecido_exists(elegir(datos.fallecidos, i)), 2000),
+        ("check_paciente_exists", None,
+         lambda i: manager.check_paciente_exists(elegir(datos.pacientes, i)[0]), 2000),
+        ("add_fallecido", None, lambda i: manager.add_fallecido(datos.nuevo()), 200),
+        ("add_paciente", None,
+         lambda i: manager.add_paciente(datos.nuevo(), HOSPITALES[i % len(HOSPITALES)], 20 + i % 60), 200),
+        ("add_paciente (duplicado)", None,
+         lambda i: manager.add_paciente(elegir(datos.pacientes, i)[0], HOSPITALES[0]), 2000),
+        # Quita al paciente de su hospital y reubica a los que estaban detrás en el índice
+        ("add_fallecido (era paciente)", None, lambda i: manager.add_fallecido(datos.paciente_sin_usar()), 200),
+        (f"add_fallecidos x{TAMANO_LOTE}", None,
+         lambda i: manager.add_fallecidos([datos.nuevo() for _ in range(TAMANO_LOTE)]), 30),
+        (f"add_pacientes x{TAMANO_LOTE}", None,
+         lambda i: manager.add_pacientes([{"nombre": datos.nuevo(), "hospital": HOSPITALES[j % len(HOSPITALES)]}
+                                          for j in range(TAMANO_LOTE)]), 30),
+        ("get_cambios (50)", None, lambda i: manager.get_cambios(manager.version - 50), 2000),
+        ("instantanea", None, lambda i: manager.instantanea(), 2000),
+        ("sincronizar", None, lambda i: manager.sincronizar(), 2000),
+        ("get_all_data", None, lambda i: manager.get_all_data(), 2000),
+        ("get_estadisticas tras alta", escribir, lambda i: manager.get_estadisticas(), 200),
+        ("get_data_for_model tras alta", escribir, lambda i: manager.get_data_for_model(), 50),
+        ("save_data", None, lambda i: manager.save_data(), 10),
+    ]
+
+
+def _medir_caso(preparar: Optional[Callable], llamada: Callable, repeticiones: int, presupuesto: float) -> List[float]:
+    """Repetir la llamada hasta `repeticiones` veces o hasta gastar `presupuesto` segundos (mínimo 5)"""
+    tiempos = []
+    limite = time.perf_counter() + presupuesto
+    for i in range(repeticiones):
+        if preparar is not None:
+            preparar(i)
+        inicio = time.perf_counter()
+        llamada(i)
+        tiempos.append(time.perf_counter() - inicio)
+        if len(tiempos) >= 5 and time.perf_counter() > limite:
+            break
+    return tiempos
+
+
+def medir_data_manager(data_file: str, total: int, presupuesto: float) -> Dict:
+    """Arranque, memoria y métodos de DataManager sobre `data_file` (se ejecuta en un proceso aparte)"""
+    from data_manager import DataManager
+    from storage import JournalStorage
+
+    base = memoria()["VmRSS"]
+    inicio = time.perf_counter()
+    manager = DataManager(data_file, storage=JournalStorage(data_file, intervalo_compactacion=0,
+                                                            max_registros=10 ** 9))
+    arranque = time.perf_counter() - inicio
+    cargado = memoria()
+
+    datos = _Datos(manager, total)
+    metodos = {}
+    for nombre, preparar, llamada, repeticiones in _casos(manager, datos):
+        metodos[nombre] = _resumen(_medir_caso(preparar, llamada, repeticiones, presupuesto))
+    manager.close()
+    return {
+        "arranque_s": arranque,
+        "rss_mib": cargado["VmRSS"],
+        "rss_datos_mib": cargado["VmRSS"] - base,
+        "metodos": metodos,
+    }
+
+
+# --- Carga mixta sobre la API -----------------------------------------------------------------------------
+
+
+async def _cliente(cliente, datos: Dict, peticiones: int, semilla: int, tiempos: Dict[str, List[float]],
+                   estados: Dict[int, int]):
+    aleatorio = random.Random(semilla)
+    etag = '""'
+    for i in range(peticiones):
+        sorteo = aleatorio.random()
+        if sorteo < 0.25:
+            tipo, peticion = "GET /datos", cliente.get("/datos", headers={"If-None-Match": etag})
+        elif sorteo < 0.40:
+            consulta = aleatorio.choice(datos["nombres"]).lower()
+            tipo, peticion = "GET /buscar", cliente.get("/buscar", params={"q": consulta, "limite": 5})
+        elif sorteo < 0.50:
+            tipo, peticion = "GET /pacientes", cliente.get("/pacientes", params={"limite": 20})
+        elif sorteo < 0.60:
+            tipo, peticion = "GET /estadisticas", cliente.get("/estadisticas")
+        elif sorteo < 0.70:
+            tipo, peticion = "GET /cambios", cliente.get("/cambios", params={"desde": datos["version"]})
+        elif sorteo < 0.80:
+            tipo = "POST /pacientes/registrar"
+            peticion = cliente.post("/pacientes/registrar", json={
+                "nombre": f"{aleatorio.choice(datos['nombres'])} {semilla}-{i}",
+                "hospital": aleatorio.choice(HOSPITALES), "edad": aleatorio.randint(1, 90)})
+        elif sorteo < 0.90:
+            tipo = "POST /fallecidos/registrar"
+            peticion = cliente.post("/fallecidos/registrar",
+                                    json={"nombre": f"{aleatorio.choice(datos['nombres'])} F{semilla}-{i}"})
+        else:
+            tipo = "POST /chat"
+            peticion = cliente.post("/chat", json={"message": f"¿Dónde está {aleatorio.choice(datos['nombres'])}?"})
+
+        inicio = time.perf_counter()
+        respuesta = await peticion
+        tiempos.setdefault(tipo, []).append(time.perf_counter() - inicio)
+        estados[respuesta.status_code] = estados.get(respuesta.status_code, 0) + 1
+        if tipo == "GET /datos" and respuesta.status_code == 200:
+            etag = respuesta.headers.get("etag", etag)
+
+
+async def _carga(main_api, nombres: List[str], peticiones: int, clientes: int) -> Dict:
+    import httpx
+
+    tiempos, estados = {}, {}
+    async with main_api.lifespan(main_api.app):
+        transporte = httpx.ASGITransport(app=main_api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://api", headers=CABECERAS,
+                                     timeout=120) as cliente:
+            datos = {"nombres": nombres, "version": main_api.data_manager.version}
+            inicio = time.perf_counter()
+            await asyncio.gather(*(_cliente(cliente, datos, peticiones // clientes, semilla, tiempos, estados)
+                                   for semilla in range(clientes)))
+            duracion = time.perf_counter() - inicio
+    completadas = sum(len(lista) for lista in tiempos.values())
+    return {
+        "peticiones": completadas,
+        "duracion_s": duracion,
+        "por_segundo_rps": completadas / duracion,
+        "estados": {str(estado): cantidad for estado, cantidad in sorted(estados.items())},
+        "tipos": {tipo: _resumen(lista) for tipo, lista in sorted(tiempos.items())},
+    }
+
+
+def medir_carga(data_file: str, peticiones: int, clientes: int, latencia_llm: float) -> Dict:
+    """Carga mixta sobre la API en proceso contra el stub de Azure (se ejecuta en un proceso aparte)"""
+    from benchmarks.azure_stub import crear_stub
+    from benchmarks.servidor import servidor_en_hilo
+
+    with open(data_file, encoding="utf-8") as archivo:
+        datos = json.load(archivo)
+    nombres = datos["fallecidos"][:500] + [paciente["nombre"] for pacientes in datos["pacientes_hospitales"].values()
+                                           for paciente in pacientes[:50]]
+    del datos
+
+    with servidor_en_hilo(crear_stub(latencia=latencia_llm)) as url_stub:
+        os.environ["DATA_FILE"] = data_file
+        os.environ["STORAGE_MODE"] = "journal"
+        os.environ["AZURE_ENDPOINT"] = url_stub
+        os.environ["LOG_FILE"] = os.path.join(os.path.dirname(data_file), "search_assistant.log")
+        main_api = importlib.import_module("main")
+        resultado = asyncio.run(_carga(main_api, nombres, peticiones, clientes))
+    valores = memoria()
+    resultado["rss_mib"] = valores["VmRSS"]
+    resultado["rss_pico_mib"] = valores["VmHWM"]
+    return resultado
+
+
+def en_proceso_nuevo(funcion, *args):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ejecutor:
+        return ejecutor.submit(funcion, *args).result()
+
+
+# --- Línea base -------------------------------------------------------------------------------------------
+
+
+def aplanar(resultados: Dict) -> Dict[str, float]:
+    """Métricas comparables como {clave: valor}; el sufijo de la clave indica la unidad"""
+    metricas = {}
+    for total, medicion in resultados["data_manager"].items():
+        for clave in ("arranque_s", "rss_mib", "rss_datos_mib"):
+            metricas[f"data_manager.{total}.{clave}"] = medicion[clave]
+        for metodo, resumen in medicion["metodos"].items():
+            metricas[f"data_manager.{total}.{metodo}.p50_ms"] = resumen["p50_ms"]
+            metricas[f"data_manager.{total}.{metodo}.p99_ms"] = resumen["p99_ms"]
+    carga = resultados.get("carga")
+    if carga:
+        for clave in ("por_segundo_rps", "rss_mib", "rss_pico_mib"):
+            metricas[f"carga.{clave}"] = carga[clave]
+        for tipo, resumen in carga["tipos"].items():
+            metricas[f"carga.{tipo}.p50_ms"] = resumen["p50_ms"]
+            metricas[f"carga.{tipo}.p99_ms"] = resumen["p99_ms"]
+    return metricas
+
+
+def comparar(actuales: Dict[str, float], base: Dict[str, float], tolerancia: float,
+             con_p99: bool = False) -> List[Tuple[str, float, float]]:
+    """Métricas que empeoraron más de `tolerancia` (relativa) y más que el piso de su unidad.
+
+    El p99 de pocas muestras varía demasiado entre ejecuciones (fsync, planificador)
+    para decidir con él, así que solo se compara si `con_p99`.
+    """
+    regresiones = []
+    for clave, valor in actuales.items():
+        anterior = base.get(clave)
+        if anterior is None or (clave.endswith(".p99_ms") and not con_p99):
+            continue
+        unidad = clave.rsplit("_", 1)[-1]
+        if unidad == "rps":
+            # Más es mejor
+            empeora = valor < anterior * (1 - tolerancia)
+        else:
+            empeora = valor > anterior * (1 + tolerancia) and valor - anterior > PISOS.get(unidad, 0.0)
+        if empeora:
+            regresiones.append((clave, anterior, valor))
+    return regresiones
+
+
+def entorno() -> Dict:
+    return {"python": platform.python_version(), "maquina": platform.machine(), "cpus": os.cpu_count(),
+            "sistema": platform.platform()}
+
+
+# --- Informe ----------------------------------------------------------------------------------------------
+
+
+def imprimir_data_manager(total: int, medicion: Dict):
+    print(f"\nDataManager con {total} víctimas: arranque {medicion['arranque_s']:.2f}s, "
+          f"RSS {medicion['rss_mib']:.0f} MiB ({medicion['rss_datos_mib']:+.0f} MiB al cargar)")
+    print(f"  {'método':<32} {'n':>5} {'p50':>10} {'p99':>10}")
+    for metodo, resumen in medicion["metodos"].items():
+        print(f"  {metodo:<32} {resumen['n']:>5} {resumen['p50_ms']:>8.3f}ms {resumen['p99_ms']:>8.3f}ms")
+
+
+def imprimir_carga(args, carga: Dict):
+    print(f"\nCarga mixta: {carga['peticiones']} peticiones, {args.clientes} clientes, "
+          f"{args.victimas_carga} víctimas, latencia del stub {args.latencia_llm}s")
+    print(f"  {carga['por_segundo_rps']:.0f} peticiones/s, estados {carga['estados']}, "
+          f"RSS {carga['rss_mib']:.0f} MiB (pico {carga['rss_pico_mib']:.0f} MiB)")
+    print(f"  {'petición':<32} {'n':>5} {'p50':>10} {'p99':>10}")
+    for tipo, resumen in carga["tipos"].items():
+        print(f"  {tipo:<32} {resumen['n']:>5} {resumen['p50_ms']:>8.2f}ms {resumen['p99_ms']:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", default="1000,10000,100000",
+                        help="víctimas por conjunto de datos, separadas por comas (hasta 1000000)")
+    parser.add_argument("--presupuesto", type=float, default=2.0, help="segundos máximos por método y tamaño")
+    parser.add_argument("--victimas-carga", type=int, default=10000)
+    parser.add_argument("--peticiones", type=int, default=3000)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--latencia-llm", type=float, default=0.05, help="latencia simulada de Azure, en segundos")
+    parser.add_argument("--sin-carga", action="store_true", help="medir solo DataManager")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--tolerancia", type=float, default=0.3, help="empeoramiento relativo que se marca")
+    parser.add_argument("--con-p99", action="store_true", help="marcar también regresiones de p99")
+    parser.add_argument("--guardar", action="store_true", help="guardar esta ejecución como línea base")
+    args = parser.parse_args()
+
+    resultados = {"entorno": entorno(), "data_manager": {}}
+    with tempfile.TemporaryDirectory() as directorio:
+        for total in (int(valor) for valor in args.tamanos.split(",")):
+            data_file = os.path.join(directorio, f"datos_{total}.json")
+            JsonStorage(data_file).save(generar_datos(total))
+            medicion = en_proceso_nuevo(medir_data_manager, data_file, total, args.presupuesto)
+            resultados["data_manager"][str(total)] = medicion
+            imprimir_data_manager(total, medicion)
+
+        if not args.sin_carga:
+            data_file = os.path.join(directorio, "datos_carga.json")
+            JsonStorage(data_file).save(generar_datos(args.victimas_carga, semilla=3))
+            resultados["carga"] = en_proceso_nuevo(medir_carga, data_file, args.peticiones, args.clientes,
+                                                    args.latencia_llm)
+            imprimir_carga(args, resultados["carga"])
+
+    metricas = aplanar(resultados)
+    regresiones = []
+    if os.path.exists(args.linea_base):
+        with open(args.linea_base, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        if base.get("entorno") != resultados["entorno"]:
+            print(f"\nAviso: la línea base se tomó en otro entorno ({base.get('entorno')})")
+        regresiones = comparar(metricas, base.get("metricas", {}), args.tolerancia, args.con_p99)
+        comunes = sum(1 for clave in metricas if clave in base.get("metricas", {}))
+        print(f"\nComparación con {args.linea_base}: {comunes} métricas comunes, "
+              f"{len(regresiones)} empeoran más de {args.tolerancia:.0%}")
+        for clave, anterior, valor in regresiones:
+            print(f"  REGRESIÓN {clave}: {anterior:.3f} -> {valor:.3f}")
+    else:
+        print(f"\nNo hay línea base en {args.linea_base} (usar --guardar para crearla)")
+
+    if args.guardar:
+        with open(args.linea_base, "w", encoding="utf-8") as archivo:
+            argumentos = {clave: valor for clave, valor in vars(args).items()
+                          if clave not in ("linea_base", "guardar", "con_p99")}
+            json.dump({"entorno": resultados["entorno"], "argumentos": argumentos,
+                       "metricas": metricas, "resultados": resultados}, archivo, ensure_ascii=False, indent=1)
+        print(f"Línea base guardada en {args.linea_base}")
+
+    if regresiones and not args.guardar:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Puntaje mínimo para considerar que un nombre se parece a la consulta
+PUNTAJE_MINIMO = 0.35
+
+# Comillas y apóstrofes que se eliminan al normalizar (D’Oleo == D'Oleo == DOleo)
+_COMILLAS = str.maketrans("", "", "'\u2018\u2019\u201a\u201b\u201c\u201d\u201e\u00b4`\"")
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Normalizar un nombre para búsquedas: minúsculas, sin acentos ni comillas y con espacios colapsados"""
+    texto = unicodedata.normalize("NFKD", nombre.casefold().translate(_COMILLAS))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+def trigramas(clave: str) -> Set[str]:
+    """Trigramas de caracteres de un nombre ya normalizado (con relleno en los bordes)"""
+    texto = f"  {clave} "
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def puntaje(compartidos: int, total_consulta: int, total_clave: int) -> float:
+    """Parecido de un nombre con la consulta: Dice más la fracción de la consulta presente en el nombre"""
+    dice = 2 * compartidos / (total_consulta + total_clave)
+    return (dice + compartidos / total_consulta) / 2
+
+
+class IndiceTrigramas:
+    """Índice invertido trigrama -> nombres normalizados, para búsquedas aproximadas.
+
+    Cada nombre recibe un número (en orden de llegada) y las listas de cada
+    trigrama guardan números en orden creciente en arreglos de 4 bytes por
+    entrada, en lugar de conjuntos de cadenas (unas 15 veces menos memoria).
+    Cada lista está partida por el número de trigramas del nombre: con la
+    consulta fija, el puntaje de un nombre solo depende de cuántos trigramas
+    comparte y de su tamaño, así que la búsqueda puede descartar tamaños
+    enteros sin leerlos.
+
+    Un índice cargado de un snapshot binario (desde_snapshot) lee sus listas
+    directamente del archivo mapeado en memoria, y cada trigrama se decodifica
+    la primera vez que se consulta; una lista se copia a un arreglo propio solo
+    cuando se modifica.
+
+    Tiene su propio lock (corto) para que una búsqueda no recorra una lista
+    mientras un escritor la modifica.
+    """
+
+    def __init__(self):
+        # Número -> clave (None si se quitó; los números no se reutilizan para que las listas sigan ordenadas)
+        self._claves: List[Optional[str]] = []
+        self._numeros: Dict[str, int] = {}
+        # Número -> cantidad de trigramas de la clave (32 bits: los nombres no tienen límite de largo aquí)
+        self._tamanos = array("I")
+        # Trigrama -> tamaño -> números (array("I"), o memoryview del snapshot mientras no se modifique)
+        self._postings: Dict[str, Dict[int, Sequence[int]]] = {}
+        # Trigramas del snapshot aún sin decodificar -> (primera partición, fin) en la tabla de particiones
+        self._diferidos: Dict[str, Tuple[int, int]] = {}
+        self._particiones_snapshot: Sequence[int] = ()
+        self._numeros_snapshot: Sequence[int] = ()
+        # Cantidad de nombres por número de trigramas
+        self._por_tamano: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._numeros)
+
+    @classmethod
+    def desde_snapshot(cls, claves: List[str], quitados: Iterable[int], tamanos: Sequence[int],
+                       grams: Dict[str, Tuple[int, int]], particiones: Sequence[int],
+                       numeros: Sequence[int]) -> "IndiceTrigramas":
+        """Índice a partir de lo que guardó exportar(), sin decodificar ninguna lista.
+
+        `particiones` son ternas (tamaño, inicio, fin) sobre `numeros`; `grams`
+        da el rango de particiones de cada trigrama.
+        """
+        indice = cls()
+        indice._claves = claves
+        tamanos = memoryview(tamanos)
+        if tamanos.format == indice._tamanos.typecode:
+            indice._tamanos.frombytes(tamanos.cast("B"))
+        else:
+            # Snapshot de un formato anterior, con otro ancho
+            indice._tamanos.extend(tamanos)
+        indice._por_tamano.update(Counter(indice._tamanos))
+        # Las claves quitadas se guardan vacías (todas iguales): se anulan antes de armar el mapa clave -> número
+        for numero in quitados:
+            claves[numero] = None
+            indice._por_tamano[indice._tamanos[numero]] -= 1
+        indice._numeros = {clave: numero for numero, clave in enumerate(claves) if clave is not None}
+        for tamano in [tamano for tamano, cantidad in indice._por_tamano.items() if not cantidad]:
+            del indice._por_tamano[tamano]
+        indice._diferidos = grams
+        indice._particiones_snapshot = particiones
+        indice._numeros_snapshot = numeros
+        return indice
+
+    def exportar(self) -> Dict:
+        """Estado completo del índice para escribirlo en un snapshot (ver desde_snapshot)"""
+        with self._lock:
+            # Los trigramas que siguen en el snapshot se copian tal cual, sin guardarlos decodificados
+            particiones = chain(self._postings.items(),
+                                ((gram, self._leer_diferido(rango)) for gram, rango in self._diferidos.items()))
+            grams = [(gram, [(tamano, lista.tobytes() if isinstance(lista, array) else lista.cast("B"))
+                             for tamano, lista in por_tamano.items()])
+                     for gram, por_tamano in particiones]
+            return {
+                "claves": list(self._claves),
+                "tamanos": self._tamanos.tobytes(),
+                "grams": grams,
+            }
+
+    def _particion(self, gram: str, crear: bool = False) -> Optional[Dict[int, Sequence[int]]]:
+        """Listas de un trigrama por tamaño (decodificándolas del snapshot si hace falta)"""
+        por_tamano = self._postings.get(gram)
+        if por_tamano is None:
+            rango = self._diferidos.pop(gram, None)
+            if rango is not None:
+                por_tamano = self._postings[gram] = self._leer_diferido(rango)
+            elif crear:
+                por_tamano = self._postings[gram] = {}
+        return por_tamano
+
+    def _leer_diferido(self, rango: Tuple[int, int]) -> Dict[int, Sequence[int]]:
+        """Listas de un trigrama del snapshot, como vistas del archivo (sin copiarlas)"""
+        por_tamano = {}
+        particiones, numeros = self._particiones_snapshot, self._numeros_snapshot
+        for i in range(*rango):
+            tamano, inicio, fin = particiones[3 * i:3 * i + 3]
+            por_tamano[tamano] = numeros[inicio:fin]
+        return por_tamano
+
+    def claves(self) -> List[str]:
+        with self._lock:
+            return list(self._numeros)
+
+    def agregar(self, clave: str, grams: Optional[Set[str]] = None):
+        """Indexar una clave; `grams` son sus trigramas si quien llama ya los calculó"""
+        if clave in self._numeros:
+            return
+        if grams is None:
+            grams = trigramas(clave)
+        tamano = len(grams)
+        with self._lock:
+            if clave in self._numeros:
+                return
+            numero = len(self._claves)
+            # Primero el tamaño: si fallara, las listas paralelas siguen alineadas
+            self._tamanos.append(tamano)
+            self._claves.append(clave)
+            self._numeros[clave] = numero
+            for gram in grams:
+                por_tamano = self._particion(gram, crear=True)
+                numeros = por_tamano.get(tamano)
+                if numeros is None:
+                    por_tamano[tamano] = array("I", (numero,))
+                else:
+                    if not isinstance(numeros, array):
+                        numeros = por_tamano[tamano] = array("I", numeros.cast("B"))
+                    numeros.append(numero)
+            self._por_tamano[tamano] += 1
+
+    def quitar(self, clave: str):
+        with self._lock:
+            numero = self._numeros.pop(clave, None)
+            if numero is None:
+                return
+            self._claves[numero] = None
+            tamano = self._tamanos[numero]
+            self._por_tamano[tamano] -= 1
+            if not self._por_tamano[tamano]:
+                del self._por_tamano[tamano]
+            for gram in trigramas(clave):
+                por_tamano = self._particion(gram)
+                numeros = por_tamano.get(tamano) if por_tamano is not None else None
+                if numeros is None:
+                    continue
+                posicion = bisect_left(numeros, numero)
+                if posicion == len(numeros) or numeros[posicion] != numero:
+                    continue
+                if len(numeros) == 1:
+                    del por_tamano[tamano]
+                    if not por_tamano:
+                        del self._postings[gram]
+                    continue
+                if not isinstance(numeros, array):
+                    numeros = por_tamano[tamano] = array("I", numeros.cast("B"))
+                del numeros[posicion]
+
+    def buscar(self, consulta: str, limite: int = 5, minimo: float = PUNTAJE_MINIMO) -> List[Tuple[str, float]]:
+        """Devolver hasta `limite` nombres (clave, puntaje) parecidos a la consulta normalizada.
+
+        El puntaje combina el coeficiente de Dice con la fracción de trigramas de
+        la consulta presentes en el nombre, para que un nombre incompleto
+        ("jose montilla") encuentre al completo ("jose manuel montilla").
+
+        Los tamaños de nombre se recorren de mayor a menor puntaje posible. Con
+        los `limite` mejores puntajes como umbral, se termina en cuanto ningún
+        tamaño restante puede alcanzarlo, y dentro de un tamaño solo se cuentan
+        los nombres que aparecen en suficientes listas para llegar al umbral.
+        """
+        grams = trigramas(consulta)
+        if not grams:
+            return []
+
+        with self._lock:
+            particiones = [particion for particion in map(self._particion, grams) if particion is not None]
+            return self._mejores(particiones, len(grams), limite, minimo)
+
+    def _mejores(self, particiones: List[Dict[int, Sequence[int]]], total: int, limite: int,
+                 umbral: float) -> List[Tuple[str, float]]:
+        """Hasta `limite` nombres con puntaje >= umbral, recorriendo los tamaños de mayor a menor puntaje posible"""
+        mejores: List[Tuple[str, float]] = []
+        presentes = len(particiones)
+        # Puntaje máximo de un nombre de cada tamaño: compartir todos los trigramas posibles
+        cotas = sorted(((puntaje(min(presentes, tamano), total, tamano), tamano) for tamano in self._por_tamano),
+                       reverse=True)
+        for cota, tamano in cotas:
+            if cota < umbral:
+                break
+            factor = 1 / (total + tamano) + 1 / (2 * total)
+            necesarios = max(1, int(umbral / factor) - 1)
+            while puntaje(necesarios, total, tamano) < umbral:
+                necesarios += 1
+
+            listas = [particion[tamano] for particion in particiones if tamano in particion]
+            if len(listas) < necesarios:
+                continue
+            listas.sort(key=len)
+            # Quien llega a `necesarios` listas está en alguna de las primeras len - necesarios + 1
+            corte = len(listas) - necesarios + 1
+            compartidos = Counter()
+            for lista in listas[:corte]:
+                compartidos.update(lista)
+            if corte < len(listas):
+                candidatos = set(compartidos)
+                for lista in listas[corte:]:
+                    compartidos.update(_presentes(candidatos, lista))
+            for numero, cantidad in compartidos.items():
+                if cantidad >= necesarios:
+                    mejores.append((self._claves[numero], puntaje(cantidad, total, tamano)))
+
+            if len(mejores) >= limite:
+                mejores.sort(key=lambda resultado: (-resultado[1], resultado[0]))
+                del mejores[limite:]
+                umbral = max(umbral, mejores[-1][1])
+
+        mejores.sort(key=lambda resultado: (-resultado[1], resultado[0]))
+        return mejores[:limite]
+
+    def comunes(self, grams: Set[str]) -> Dict[str, Tuple[int, int]]:
+        """Por cada clave con algún trigrama en `grams`: (trigramas compartidos, trigramas de la clave)"""
+        comunes = Counter()
+        with self._lock:
+            for gram in grams:
+                for numeros in (self._particion(gram) or {}).values():
+                    comunes.update(numeros)
+            return {self._claves[numero]: (compartidos, self._tamanos[numero])
+                    for numero, compartidos in comunes.items()}
+
+
+def _presentes(candidatos: Set[int], numeros: Sequence[int]) -> Iterable[int]:
+    """Candidatos que están en la lista ordenada `numeros`"""
+    # Con pocos candidatos frente a una lista larga conviene buscarlos de a uno
+    if len(candidatos) * 16 >= len(numeros):
+        return candidatos.intersection(numeros)
+    encontrados = []
+    for numero in candidatos:
+        posicion = bisect_left(numeros, numero)
+        if posicion < len(numeros) and numeros[posicion] == numero:
+            encontrados.append(numero)
+    return encontrados
@@ -0,0 +1,225 @@
+import asyncio
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from busqueda import PUNTAJE_MINIMO, IndiceTrigramas, normalizar_nombre, puntaje, trigramas
+from data_manager import DataManager
+from recuperacion import extraer_hospitales, extraer_nombres
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Con más nombres cambiados que esto en una sola revisión, es más barato vaciar la caché
+MAX_NOMBRES_INVALIDACION = 500
+
+
+def clave_pregunta(pregunta: str) -> str:
+    """Pregunta normalizada: sin mayúsculas, acentos, signos ni espacios repetidos"""
+    return " ".join(_TOKEN.findall(normalizar_nombre(pregunta)))
+
+
+class _Entrada:
+    __slots__ = ("respuesta", "nombres", "expira", "tamano")
+
+    def __init__(self, respuesta: str, nombres: Tuple[str, ...], expira: float, tamano: int):
+        self.respuesta = respuesta
+        self.nombres = nombres
+        self.expira = expira
+        self.tamano = tamano
+
+
+class CacheRespuestas:
+    """Caché LRU/TTL de respuestas de /chat, con invalidación por cambios en los datos.
+
+    La clave es la pregunta normalizada. Una pregunta que menciona nombres solo
+    depende de las personas que la recuperación podría devolver para esos
+    nombres: la entrada se invalida cuando cambia alguien cuyo nombre se parece
+    a uno de ellos (con el mismo puntaje mínimo que usa la búsqueda). Una
+    pregunta general (sin nombres, o que menciona un hospital) depende de todo
+    el registro y solo vale para la versión de los datos con la que se
+    respondió.
+
+    Los cambios se leen de `DataManager.get_cambios` al consultar la caché, así
+    los escritores no pagan nada. Preguntas iguales que llegan mientras la
+    primera espera al modelo comparten esa misma llamada (single-flight).
+    Pensada para usarse desde el event loop (sin locks).
+    """
+
+    def __init__(self, data_manager: DataManager, max_bytes: int = 32 * 1024 * 1024, ttl: float = 300.0):
+        self.data_manager = data_manager
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()
+        self._bytes = 0
+        # Nombre consultado -> claves de las entradas que lo mencionan
+        self._por_nombre: Dict[str, Set[str]] = {}
+        self._nombres = IndiceTrigramas()
+        self._generales: Set[str] = set()
+        self._en_vuelo: Dict[str, asyncio.Task] = {}
+        self._version = data_manager.version
+        self.aciertos = 0
+        self.fallos = 0
+        self.coalescidas = 0
+        self.expulsadas = 0
+        self.expiradas = 0
+        self.invalidadas = 0
+
+    async def obtener(self, pregunta: str, calcular: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        """Respuesta guardada para la pregunta, o la de `calcular()` (que devuelve (respuesta, guardable))"""
+        clave = clave_pregunta(pregunta)
+        respuesta = self._leer(clave)
+        if respuesta is not None:
+            return respuesta
+
+        tarea = self._en_vuelo.get(clave)
+        if tarea is None:
+            self.fallos += 1
+            tarea = asyncio.ensure_future(self._calcular(pregunta, calcular))
+            self._en_vuelo[clave] = tarea
+
+            def terminar(_):
+                if self._en_vuelo.get(clave) is tarea:
+                    del self._en_vuelo[clave]
+
+            tarea.add_done_callback(terminar)
+        else:
+            self.coalescidas += 1
+        # shield: si el cliente que la inició se desconecta, la llamada sigue para los demás
+        return await asyncio.shield(tarea)
+
+    def consultar(self, pregunta: str) -> Optional[str]:
+        """Respuesta guardada para la pregunta, sin calcularla si no está (p. ej. para /chat en streaming)"""
+        respuesta = self._leer(clave_pregunta(pregunta))
+        if respuesta is None:
+            self.fallos += 1
+        return respuesta
+
+    def guardar(self, pregunta: str, respuesta: str, version: int):
+        """Guardar una respuesta calculada con los datos de `version`, si no cambiaron desde entonces"""
+        if self.max_bytes <= 0:
+            return
+        clave = clave_pregunta(pregunta)
+        if extraer_hospitales(pregunta, self.data_manager.instantanea().pacientes_hospitales):
+            # La respuesta depende de todos los pacientes del hospital, no solo de nombres parecidos
+            nombres = ()
+        else:
+            nombres = tuple(extraer_nombres(pregunta))
+        if not self._cambio_desde(version, nombres):
+            self._guardar(clave, _Entrada(respuesta, nombres, time.monotonic() + self.ttl,
+                                          sys.getsizeof(respuesta) + sys.getsizeof(clave) + 200))
+
+    def _leer(self, clave: str) -> Optional[str]:
+        self._revisar_cambios()
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if entrada.expira <= time.monotonic():
+            self._quitar(clave)
+            self.expiradas += 1
+            return None
+        self._entradas.move_to_end(clave)
+        self.aciertos += 1
+        return entrada.respuesta
+
+    async def _calcular(self, pregunta: str, calcular: Callable[[], Awaitable[Tuple[str, bool]]]) -> str:
+        # Versión tomada antes de leer los datos: todo cambio posterior se revisa al guardar
+        version = self.data_manager.version
+        respuesta, guardable = await calcular()
+        if guardable:
+            self.guardar(pregunta, respuesta, version)
+        return respuesta
+
+    def _cambio_desde(self, version: int, nombres: Tuple[str, ...]) -> bool:
+        """Indicar si algún cambio posterior a `version` afecta a una respuesta con estos nombres"""
+        if self.data_manager.version == version:
+            return False
+        cambios = self.data_manager.get_cambios(version)
+        if cambios["resync"] or not nombres:
+            return True
+        grams = [(nombre, trigramas(nombre)) for nombre in nombres]
+        for cambio in cambios["cambios"]:
+            cambiado = trigramas(normalizar_nombre(cambio["nombre"]))
+            for nombre, grams_nombre in grams:
+                if puntaje(len(grams_nombre & cambiado), len(grams_nombre), len(cambiado)) >= PUNTAJE_MINIMO:
+                    return True
+        return False
+
+    def _guardar(self, clave: str, entrada: _Entrada):
+        if clave in self._entradas:
+            self._quitar(clave)
+        self._entradas[clave] = entrada
+        self._bytes += entrada.tamano
+        if entrada.nombres:
+            for nombre in entrada.nombres:
+                if nombre not in self._por_nombre:
+                    self._por_nombre[nombre] = set()
+                    self._nombres.agregar(nombre)
+                self._por_nombre[nombre].add(clave)
+        else:
+            self._generales.add(clave)
+
+        while self._bytes > self.max_bytes and self._entradas:
+            self._quitar(next(iter(self._entradas)))
+            self.expulsadas += 1
+
+    def _quitar(self, clave: str):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        self._bytes -= entrada.tamano
+        self._generales.discard(clave)
+        for nombre in entrada.nombres:
+            claves = self._por_nombre.get(nombre)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_nombre[nombre]
+                    self._nombres.quitar(nombre)
+
+    def _invalidar(self, claves):
+        for clave in list(claves):
+            if clave in self._entradas:
+                self._quitar(clave)
+                self.invalidadas += 1
+
+    def _revisar_cambios(self):
+        """Invalidar las entradas afectadas por los cambios ocurridos desde la última revisión"""
+        if self.data_manager.version == self._version:
+            return
+        cambios = self.data_manager.get_cambios(self._version)
+        self._version = cambios["version"]
+        nombres = {normalizar_nombre(cambio["nombre"]) for cambio in cambios["cambios"]}
+        if cambios["resync"] or len(nombres) > MAX_NOMBRES_INVALIDACION:
+            self._invalidar(self._entradas)
+            return
+
+        self._invalidar(self._generales)
+        for cambiado in nombres:
+            grams = trigramas(cambiado)
+            # El puntaje se calcula como en la búsqueda: el nombre consultado es la consulta
+            for nombre, (compartidos, tamano) in self._nombres.comunes(grams).items():
+                if puntaje(compartidos, tamano, len(grams)) >= PUNTAJE_MINIMO:
+                    self._invalidar(self._por_nombre.get(nombre, ()))
+
+    def limpiar(self):
+        """Vaciar la caché"""
+        self._invalidar(self._entradas)
+
+    def metricas(self) -> Dict:
+        consultas = self.aciertos + self.fallos + self.coalescidas
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "coalescidas": self.coalescidas,
+            "tasa_aciertos": (self.aciertos + self.coalescidas) / consultas if consultas else 0.0,
+            "expulsadas": self.expulsadas,
+            "expiradas": self.expiradas,
+            "invalidadas": self.invalidadas,
+            "en_vuelo": len(self._en_vuelo),
+        }
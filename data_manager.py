@@ -1,23 +1,119 @@
-import json
-import os
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from itertools import islice
 from typing import Dict, List, Optional
 
+from busqueda import IndiceTrigramas, normalizar_nombre, trigramas
+from estadisticas import Estadisticas
+from metricas import logger
+from storage import JsonStorage, Storage
+
+
+class Instantanea:
+    """Vista inmutable de los datos en una versión.
+
+    Los escritores publican una nueva instantánea al terminar cada escritura y
+    los lectores toman la referencia vigente sin bloquear. Las tuplas de cada
+    hospital sin cambios se comparten entre instantáneas consecutivas; los
+    diccionarios de pacientes nunca se modifican después de crearse.
+    """
+    __slots__ = ("version", "ultima_modificacion", "fallecidos", "pacientes_hospitales", "claves_fallecidos",
+                 "claves_hospitales")
+
+    def __init__(self, version: int, ultima_modificacion: float, fallecidos: tuple, pacientes_hospitales: Dict,
+                 claves_fallecidos: tuple = (), claves_hospitales: Optional[Dict] = None):
+        self.version = version
+        self.ultima_modificacion = ultima_modificacion
+        self.fallecidos = fallecidos
+        self.pacientes_hospitales = pacientes_hospitales
+        # Nombre normalizado de cada registro, en el mismo orden (solo si el almacenamiento guarda el índice)
+        self.claves_fallecidos = claves_fallecidos
+        self.claves_hospitales = claves_hospitales if claves_hospitales is not None else {}
+
+    def como_dict(self) -> Dict:
+        return {"fallecidos": self.fallecidos, "pacientes_hospitales": self.pacientes_hospitales}
+
+
+class Entrada:
+    """Dónde está una persona: estado ("fallecido" o "paciente"), hospital y orden de llegada a su lista.
+
+    Los fallecidos nunca se quitan, así que su orden es su posición. Un paciente
+    conserva su orden aunque se quiten pacientes anteriores del mismo hospital;
+    su posición actual la da DataManager.posicion.
+    """
+    __slots__ = ("estado", "hospital", "orden")
+
+    def __init__(self, estado: str, hospital: Optional[str], orden: int):
+        self.estado = estado
+        self.hospital = hospital
+        self.orden = orden
+
 
 class DataManager:
-    def __init__(self, data_file="disaster_data.json"):
+    def __init__(self, data_file="disaster_data.json", storage: Optional[Storage] = None, max_cambios: int = 10000,
+                 intervalo_sincronizacion: float = 0.25):
         self.data_file = data_file
+        self.storage = storage or JsonStorage(data_file)
+        # Todas las escrituras (individuales o por lote) pasan por este lock; las lecturas
+        # de conjunto usan la instantánea publicada y no lo toman
+        self.lock = threading.RLock()
+        self._instantanea = Instantanea(0, time.time(), (), {})
+        self._fallecidos_sucios = True
+        self._hospitales_sucios = set()
+        self._cambios_sin_avisar = []
         self.fallecidos = []
         self.pacientes_hospitales = {}
+        # Nombre normalizado de cada registro, en paralelo a las listas anteriores
+        self._claves_fallecidos = []
+        self._claves_hospitales = {}
+        # Hospital -> órdenes (ordenados) de los pacientes que ya se quitaron de su lista
+        self._quitados_hospitales: Dict[str, List[int]] = {}
+        # Índice nombre normalizado -> Entrada
+        self.indice: Dict[str, Entrada] = {}
+        self.trigramas = IndiceTrigramas()
+        # Contadores por hospital y edades para /estadisticas (se actualizan en cada mutación)
+        self.estadisticas = Estadisticas()
+        self._resumen_estadisticas = (-1, None)
+        # Versión de los datos: aumenta con cada mutación y es el número de secuencia del último cambio
+        self.version = 0
+        self.ultima_modificacion = time.time()
+        # Últimos cambios (anillo acotado) para que los clientes pidan solo las diferencias
+        self.cambios = deque(maxlen=max_cambios)
+        self._lock_cambios = threading.Lock()
+        # Funciones a las que se avisa de cada cambio (p. ej. el centro de difusión de /eventos)
+        self.oyentes = []
+        # Contexto para el modelo: líneas de fallecidos (solo se añaden) y un fragmento de
+        # texto por hospital, válido mientras la tupla de pacientes sea la misma
+        self._lineas_fallecidos = []
+        self._fragmentos_hospital = {}
+        self._contexto_modelo = (-1, "")
         self.load_data()
+        self.storage.start(self._copiar_datos)
+
+        # Con un almacenamiento compartido, un hilo aplica las escrituras de otros procesos
+        self._detener = threading.Event()
+        self._sincronizador = None
+        if self.storage.compartido and intervalo_sincronizacion > 0:
+            self._sincronizador = threading.Thread(target=self._sincronizar_periodicamente,
+                                                   args=(intervalo_sincronizacion,), name="sincronizador",
+                                                   daemon=True)
+            self._sincronizador.start()
 
     def load_data(self):
-        """Cargar datos desde el archivo JSON si existe"""
+        """Cargar datos desde el almacenamiento si existen"""
+        registros = []
+        precalculado = None
+        guardar_semilla = False
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    self.fallecidos = data.get("fallecidos", [])
-                    self.pacientes_hospitales = data.get("pacientes_hospitales", {})
+            data, registros = self.storage.load()
+            if data is not None:
+                self.fallecidos = data.get("fallecidos", [])
+                self.pacientes_hospitales = data.get("pacientes_hospitales", {})
+                if "trigramas" in data:
+                    precalculado = data
             else:
                 # Datos iniciales si no existe el archivo
                 self.fallecidos = [
@@ -190,95 +286,453 @@ class DataManager:
                         {"nombre": "Bartolo Reyes", "edad": 55}
                     ]
                 }
-                self.save_data()
-        except Exception as e:
-            print(f"Error al cargar datos: {e}")
+                guardar_semilla = True
+        except Exception:
+            logger.exception("Error al cargar datos")
+
+        self._reconstruir_indice(precalculado)
+
+        # Reaplicar las mutaciones registradas después del último snapshot
+        for registro in registros:
+            self._aplicar(registro)
+
+        # Las secuencias de una carga nueva arrancan por encima de las de cualquier proceso
+        # anterior (milisegundos desde epoch), así un cliente con una secuencia vieja pide resync.
+        # Un almacenamiento compartido guarda la versión, común a todos los procesos
+        version_guardada = self.storage.version_guardada()
+        if version_guardada is not None:
+            self.version = version_guardada
+        else:
+            self.version = max(self.version + 1, time.time_ns() // 1_000_000)
+        self.cambios.clear()
+        self._fallecidos_sucios = True
+        self._hospitales_sucios = set(self.pacientes_hospitales)
+        self._cambios_sin_avisar = []
+        self._publicar()
+        # Después de publicar: save_data guarda la instantánea vigente
+        if guardar_semilla:
+            self.save_data()
+
+    def _aplicar(self, registro: Dict) -> bool:
+        """Aplicar en memoria una mutación registrada (sin persistirla)"""
+        if registro["op"] == "fallecido":
+            return self._agregar_fallecido(registro["nombre"])
+        if registro["op"] == "paciente":
+            return self._agregar_paciente(registro["nombre"], registro["hospital"], registro.get("edad"))
+        return False
+
+    def _persistir(self, registros: List[Dict]):
+        """Enviar mutaciones ya aplicadas al backend de almacenamiento"""
+        self.storage.record(registros, self._copiar_datos, self.version)
+
+    def sincronizar(self) -> bool:
+        """Aplicar las escrituras que otros procesos dejaron en un almacenamiento compartido"""
+        if not self.storage.hay_cambios():
+            return False
+        with self.lock:
+            self._aplicar_pendientes(self.storage.pendientes())
+        return True
+
+    def _aplicar_pendientes(self, pendientes: Optional[List]):
+        """Aplicar (con el lock de escritura tomado) mutaciones de otros procesos"""
+        if pendientes is None:
+            # Se perdió el hilo de cambios: recargar todo (los clientes de /cambios harán resync)
+            self.load_data()
+            return
+        if not pendientes:
+            return
+        for version, registros in pendientes:
+            for registro in registros:
+                self._aplicar(registro)
+            # Los mismos registros sobre los mismos datos dan la misma versión en todos los procesos
+            self.version = version
+        self._publicar()
+
+    def _sincronizar_periodicamente(self, intervalo: float):
+        while not self._detener.wait(intervalo):
+            try:
+                self.sincronizar()
+            except Exception:
+                logger.exception("Error al sincronizar datos")
+
+    def _copiar_datos(self) -> Dict:
+        """Datos que pueden serializarse fuera del hilo que los modifica"""
+        instantanea = self._instantanea
+        datos = instantanea.como_dict()
+        if self.storage.con_indice:
+            # El índice se exporta después de tomar la instantánea: tiene todos sus nombres y quizá
+            # alguno posterior, que se descarta al cargar (y vuelve con la bitácora)
+            datos["claves_fallecidos"] = instantanea.claves_fallecidos
+            datos["claves_hospitales"] = instantanea.claves_hospitales
+            datos["trigramas"] = self.trigramas.exportar()
+        return datos
+
+    def _publicar(self):
+        """Publicar una instantánea nueva (con el lock de escritura tomado) y avisar a los oyentes"""
+        anterior = self._instantanea
+        # Las claves solo viajan en la instantánea si el almacenamiento las guarda (copiarlas cuesta en cada alta)
+        con_claves = self.storage.con_indice
+        if self._fallecidos_sucios:
+            fallecidos = tuple(self.fallecidos)
+            claves_fallecidos = tuple(self._claves_fallecidos) if con_claves else ()
+        else:
+            fallecidos, claves_fallecidos = anterior.fallecidos, anterior.claves_fallecidos
+        pacientes_hospitales, claves_hospitales = {}, {}
+        for hospital, pacientes in self.pacientes_hospitales.items():
+            if hospital in self._hospitales_sucios:
+                pacientes_hospitales[hospital] = tuple(pacientes)
+                claves_hospitales[hospital] = tuple(self._claves_hospitales[hospital]) if con_claves else ()
+            else:
+                pacientes_hospitales[hospital] = anterior.pacientes_hospitales.get(hospital, ())
+                claves_hospitales[hospital] = anterior.claves_hospitales.get(hospital, ())
+        self._instantanea = Instantanea(self.version, self.ultima_modificacion, fallecidos, pacientes_hospitales,
+                                        claves_fallecidos, claves_hospitales)
+        self._fallecidos_sucios = False
+        self._hospitales_sucios = set()
+
+        # Avisar después de publicar: quien reciba el cambio ya lo ve en la instantánea
+        cambios, self._cambios_sin_avisar = self._cambios_sin_avisar, []
+        for cambio in cambios:
+            for oyente in self.oyentes:
+                oyente(cambio)
+
+    def instantanea(self) -> Instantanea:
+        """Instantánea vigente de los datos (lectura sin bloqueo)"""
+        return self._instantanea
+
+    def _reconstruir_indice(self, precalculado: Optional[Dict] = None):
+        """Reconstruir el índice de nombres a partir de las listas en memoria.
+
+        Con `precalculado` (lo que carga un snapshot binario) se usan las claves
+        normalizadas y el índice de trigramas guardados en lugar de recalcularlos.
+        """
+        if precalculado is None:
+            self._claves_fallecidos = [normalizar_nombre(fallecido) for fallecido in self.fallecidos]
+            self._claves_hospitales = {hospital: [normalizar_nombre(paciente["nombre"]) for paciente in pacientes]
+                                       for hospital, pacientes in self.pacientes_hospitales.items()}
+        else:
+            self._claves_fallecidos = precalculado["claves_fallecidos"]
+            self._claves_hospitales = precalculado["claves_hospitales"]
+
+        self.indice = {}
+        self._quitados_hospitales = {}
+        for hospital, claves in self._claves_hospitales.items():
+            for i, clave in enumerate(claves):
+                if clave not in self.indice:
+                    self.indice[clave] = Entrada("paciente", hospital, i)
+
+        # Un fallecido tiene prioridad sobre cualquier registro hospitalario
+        for i, clave in enumerate(self._claves_fallecidos):
+            self.indice[clave] = Entrada("fallecido", None, i)
+
+        if precalculado is None:
+            self.trigramas = IndiceTrigramas()
+        else:
+            self.trigramas = precalculado["trigramas"]
+            # El snapshot pudo exportar nombres posteriores a sus datos: quitarlos
+            for clave in [clave for clave in self.trigramas.claves() if clave not in self.indice]:
+                self.trigramas.quitar(clave)
+        if len(self.trigramas) != len(self.indice):
+            for clave in self.indice:
+                self.trigramas.agregar(clave)
+        self.estadisticas.reconstruir(self.fallecidos, self.pacientes_hospitales)
+
+        self._lineas_fallecidos = [f"- {fallecido}\n" for fallecido in self.fallecidos]
+        self.version += 1
+        self.ultima_modificacion = time.time()
+
+    def _registrar_cambio(self, tipo: str, nombre: str, hospital: Optional[str] = None,
+                          edad: Optional[int] = None):
+        """Registrar una mutación: nueva versión, entrada en el anillo de cambios e invalidaciones"""
+        self.version += 1
+        self.ultima_modificacion = time.time()
+        cambio = {"seq": self.version, "tipo": tipo, "nombre": nombre}
+        if hospital is not None:
+            cambio["hospital"] = hospital
+            self._hospitales_sucios.add(hospital)
+        else:
+            self._fallecidos_sucios = True
+        if edad is not None:
+            cambio["edad"] = edad
+        with self._lock_cambios:
+            self.cambios.append(cambio)
+        self._cambios_sin_avisar.append(cambio)
+
+    def get_cambios(self, desde: int) -> Dict:
+        """Cambios con secuencia mayor que `desde`, o aviso de resync si ya no están en el anillo"""
+        with self._lock_cambios:
+            version = self.cambios[-1]["seq"] if self.cambios else self.version
+            base = self.cambios[0]["seq"] - 1 if self.cambios else self.version
+            if desde < base or desde > version:
+                return {"version": version, "resync": True, "cambios": []}
+            return {"version": version, "resync": False, "cambios": list(islice(self.cambios, desde - base, None))}
+
+    def buscar(self, nombre: str) -> Optional[Dict]:
+        """Buscar una persona en el índice por su nombre normalizado"""
+        return self.indice.get(normalizar_nombre(nombre))
+
+    def buscar_parecidos(self, consulta: str, limite: int = 10) -> List[Dict]:
+        """Personas cuyo nombre se parece a la consulta, de la más a la menos parecida, con su puntaje"""
+        resultados = []
+        for clave, puntaje in self.trigramas.buscar(normalizar_nombre(consulta), limite=limite):
+            persona = self.obtener_persona(clave)
+            if persona is not None:
+                persona["puntaje"] = round(puntaje, 3)
+                resultados.append(persona)
+        return resultados
+
+    def obtener_persona(self, clave: str) -> Optional[Dict]:
+        """Datos de una persona a partir de su nombre normalizado"""
+        # Lectura optimista sin lock; si una escritura la cruzó, se repite con el lock tomado
+        try:
+            persona = self._leer_persona(clave)
+            if persona is None or normalizar_nombre(persona["nombre"]) == clave:
+                return persona
+        except (IndexError, KeyError):
+            pass
+        with self.lock:
+            return self._leer_persona(clave)
+
+    def _leer_persona(self, clave: str) -> Optional[Dict]:
+        entrada = self.indice.get(clave)
+        if entrada is None:
+            return None
+        if entrada.estado == "fallecido":
+            return {"nombre": self.fallecidos[entrada.orden], "estado": "fallecido"}
+
+        paciente = self.pacientes_hospitales[entrada.hospital][self.posicion(entrada)]
+        persona = {"nombre": paciente["nombre"], "estado": "paciente", "hospital": entrada.hospital}
+        if "edad" in paciente:
+            persona["edad"] = paciente["edad"]
+        return persona
+
+    def posicion(self, entrada: Entrada) -> int:
+        """Posición actual de una entrada en su lista: su orden menos los pacientes anteriores ya quitados"""
+        if entrada.estado == "fallecido":
+            return entrada.orden
+        return entrada.orden - bisect_left(self._quitados_hospitales.get(entrada.hospital, ()), entrada.orden)
+
+    def _remover_paciente(self, entrada: Entrada) -> Dict:
+        """Quitar un paciente de su hospital manteniendo el índice al día.
+
+        Las entradas de los pacientes posteriores no se tocan: conservan su orden
+        y la posición se corrige con la lista de quitados del hospital.
+        """
+        hospital = entrada.hospital
+        posicion = self.posicion(entrada)
+        paciente = self.pacientes_hospitales[hospital].pop(posicion)
+        del self._claves_hospitales[hospital][posicion]
+        insort(self._quitados_hospitales.setdefault(hospital, []), entrada.orden)
+        self.estadisticas.quitar_paciente(hospital, paciente.get("edad"))
+        return paciente
 
     def save_data(self):
-        """Guardar datos en archivo JSON"""
-        data = {
-            "fallecidos": self.fallecidos,
-            "pacientes_hospitales": self.pacientes_hospitales
-        }
-        with open(self.data_file, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=2)
+        """Guardar una copia completa de los datos"""
+        self.storage.save(self._copiar_datos(), self.version)
+
+    def close(self):
+        """Cerrar el almacenamiento (compacta la bitácora si la hay)"""
+        self._detener.set()
+        if self._sincronizador is not None:
+            self._sincronizador.join()
+            self._sincronizador = None
+        self.storage.close()
 
     def check_fallecido_exists(self, nombre: str) -> bool:
         """Verificar si un fallecido ya existe en la lista"""
-        return nombre in self.fallecidos
+        entrada = self.buscar(nombre)
+        return entrada is not None and entrada.estado == "fallecido"
 
     def add_fallecido(self, nombre: str) -> bool:
         """Añadir un nuevo fallecido a la lista"""
-        if self.check_fallecido_exists(nombre):
+        with self.lock, self.storage.transaccion() as pendientes:
+            self._aplicar_pendientes(pendientes)
+            if not self._agregar_fallecido(nombre):
+                return False
+
+            self._publicar()
+            self._persistir([{"op": "fallecido", "nombre": nombre}])
+        return True
+
+    def add_fallecidos(self, nombres: List[str]) -> List[Dict]:
+        """Añadir varios fallecidos con una sola escritura; devuelve un resultado por nombre"""
+        resultados, registros = [], []
+        with self.lock, self.storage.transaccion() as pendientes:
+            self._aplicar_pendientes(pendientes)
+            for nombre in nombres:
+                # Los duplicados dentro del mismo lote los detecta el índice al aplicar el anterior
+                if self._agregar_fallecido(nombre):
+                    registros.append({"op": "fallecido", "nombre": nombre})
+                    resultados.append({"nombre": nombre, "success": True})
+                else:
+                    resultados.append({"nombre": nombre, "success": False,
+                                       "message": f"{nombre} ya está registrado como fallecido"})
+            if registros:
+                self._publicar()
+                self._persistir(registros)
+        return resultados
+
+    def _agregar_fallecido(self, nombre: str) -> bool:
+        """Registrar un fallecido en memoria"""
+        clave = normalizar_nombre(nombre)
+        entrada = self.indice.get(clave)
+        if entrada is not None and entrada.estado == "fallecido":
             return False
+        # Trigramas antes de tocar ningún estado (un paciente trasladado ya está en el índice)
+        grams = trigramas(clave) if entrada is None else None
 
-        # Verificar si la persona está en algún hospital
-        for hospital, pacientes in self.pacientes_hospitales.items():
-            for i, paciente in enumerate(pacientes):
-                if paciente["nombre"] == nombre:
-                    # Eliminar de la lista de pacientes
-                    pacientes.pop(i)
-                    break
+        # Si la persona está en algún hospital, eliminarla de la lista de pacientes
+        if entrada is not None:
+            paciente = self._remover_paciente(entrada)
+            self._registrar_cambio("paciente_removido", paciente["nombre"], entrada.hospital, paciente.get("edad"))
 
         self.fallecidos.append(nombre)
-        self.save_data()
+        self._claves_fallecidos.append(clave)
+        self._lineas_fallecidos.append(f"- {nombre}\n")
+        self.indice[clave] = Entrada("fallecido", None, len(self.fallecidos) - 1)
+        self.trigramas.agregar(clave, grams)
+        self.estadisticas.agregar_fallecido()
+        self._registrar_cambio("fallecido_registrado", nombre)
         return True
 
     def check_paciente_exists(self, nombre: str) -> Dict:
         """Verificar si un paciente ya existe en algún hospital"""
-        for hospital, pacientes in self.pacientes_hospitales.items():
-            for paciente in pacientes:
-                if paciente["nombre"] == nombre:
-                    return {"exists": True, "hospital": hospital}
+        entrada = self.buscar(nombre)
+        if entrada is None:
+            return {"exists": False}
 
         # Verificar si está en la lista de fallecidos
-        if nombre in self.fallecidos:
+        if entrada.estado == "fallecido":
             return {"exists": True, "fallecido": True}
 
-        return {"exists": False}
+        return {"exists": True, "hospital": entrada.hospital}
 
     def add_paciente(self, nombre: str, hospital: str, edad: Optional[int] = None) -> Dict:
         """Añadir un nuevo paciente a un hospital"""
+        with self.lock, self.storage.transaccion() as pendientes:
+            self._aplicar_pendientes(pendientes)
+            motivo = self._rechazo_paciente(nombre)
+            if motivo is not None:
+                return {"success": False, "message": motivo}
+
+            self._agregar_paciente(nombre, hospital, edad)
+            self._publicar()
+            self._persistir([self._registro_paciente(nombre, hospital, edad)])
+        return {"success": True}
+
+    def add_pacientes(self, pacientes: List[Dict]) -> List[Dict]:
+        """Añadir varios pacientes ({"nombre", "hospital", "edad"}) con una sola escritura"""
+        resultados, registros = [], []
+        with self.lock, self.storage.transaccion() as pendientes:
+            self._aplicar_pendientes(pendientes)
+            for paciente in pacientes:
+                nombre, hospital, edad = paciente["nombre"], paciente["hospital"], paciente.get("edad")
+                motivo = self._rechazo_paciente(nombre)
+                if motivo is not None:
+                    resultados.append({"nombre": nombre, "success": False, "message": motivo})
+                    continue
+                self._agregar_paciente(nombre, hospital, edad)
+                registros.append(self._registro_paciente(nombre, hospital, edad))
+                resultados.append({"nombre": nombre, "success": True})
+            if registros:
+                self._publicar()
+                self._persistir(registros)
+        return resultados
+
+    def _rechazo_paciente(self, nombre: str) -> Optional[str]:
+        """Motivo por el que no se puede registrar al paciente, o None si se puede"""
         check = self.check_paciente_exists(nombre)
 
         if check.get("exists"):
             if check.get("fallecido"):
-                return {"success": False, "message": "La persona está en la lista de fallecidos"}
-            return {"success": False, "message": f"El paciente ya existe en {check.get('hospital')}"}
+                return "La persona está en la lista de fallecidos"
+            return f"El paciente ya existe en {check.get('hospital')}"
+        return None
+
+    @staticmethod
+    def _registro_paciente(nombre: str, hospital: str, edad: Optional[int]) -> Dict:
+        registro = {"op": "paciente", "nombre": nombre, "hospital": hospital}
+        if edad:
+            registro["edad"] = edad
+        return registro
+
+    def _agregar_paciente(self, nombre: str, hospital: str, edad: Optional[int] = None) -> bool:
+        """Registrar un paciente en memoria"""
+        clave = normalizar_nombre(nombre)
+        if clave in self.indice:
+            return False
+        # Trigramas antes de tocar ningún estado
+        grams = trigramas(clave)
 
         # Crear el nuevo paciente
         nuevo_paciente = {"nombre": nombre}
         if edad:
             nuevo_paciente["edad"] = edad
 
-        # Añadir el paciente al hospital
+        # Añadir el paciente al hospital (un solo objeto por nombre de hospital, aunque llegue de la bitácora)
+        hospital = sys.intern(hospital)
         if hospital not in self.pacientes_hospitales:
             self.pacientes_hospitales[hospital] = []
+            self._claves_hospitales[hospital] = []
 
+        orden = len(self.pacientes_hospitales[hospital]) + len(self._quitados_hospitales.get(hospital, ()))
         self.pacientes_hospitales[hospital].append(nuevo_paciente)
-        self.save_data()
-        return {"success": True}
+        self._claves_hospitales[hospital].append(clave)
+        self.indice[clave] = Entrada("paciente", hospital, orden)
+        self.trigramas.agregar(clave, grams)
+        self.estadisticas.agregar_paciente(hospital, nuevo_paciente.get("edad"))
+        self._registrar_cambio("paciente_registrado", nombre, hospital, nuevo_paciente.get("edad"))
+        return True
 
     def get_all_data(self) -> Dict:
-        """Obtener todos los datos"""
-        return {
-            "fallecidos": self.fallecidos,
-            "pacientes_hospitales": self.pacientes_hospitales
-        }
+        """Obtener todos los datos (de la instantánea vigente: no modificar)"""
+        return self._instantanea.como_dict()
+
+    def get_estadisticas(self) -> Dict:
+        """Resumen de totales y edades; se calcula de los contadores una vez por versión"""
+        version, resumen = self._resumen_estadisticas
+        if version == self.version:
+            return resumen
+        # Con el lock, para no leer los contadores a mitad de una escritura (p. ej. un traslado)
+        with self.lock:
+            resumen = self.estadisticas.resumen()
+            resumen["version"] = self.version
+            self._resumen_estadisticas = (self.version, resumen)
+        return resumen
 
     def get_data_for_model(self) -> str:
-        """Obtener datos formateados para enviar al modelo"""
-        data_text = "Lista de fallecidos confirmados:\n"
-        for fallecido in self.fallecidos:
-            data_text += f"- {fallecido}\n"
+        """Obtener datos formateados para enviar al modelo.
 
-        data_text += "\nPacientes en hospitales:\n"
-        for hospital, pacientes in self.pacientes_hospitales.items():
-            data_text += f"\n{hospital}:\n"
-            for paciente in pacientes:
-                if 'edad' in paciente:
-                    data_text += f"- {paciente['nombre']}, {paciente['edad']} años\n"
-                else:
-                    data_text += f"- {paciente['nombre']}\n"
+        El texto se guarda por versión: entre dos mutaciones no se vuelve a
+        formatear nada, y tras una mutación solo se rehace el fragmento del
+        hospital afectado.
+        """
+        instantanea = self._instantanea
+        version, texto = self._contexto_modelo
+        if version == instantanea.version:
+            return texto
+
+        partes = ["Lista de fallecidos confirmados:\n"]
+        # Las líneas solo se añaden al final: las primeras N corresponden a la instantánea
+        partes.extend(self._lineas_fallecidos[:len(instantanea.fallecidos)])
+        partes.append("\nPacientes en hospitales:\n")
+        for hospital, pacientes in instantanea.pacientes_hospitales.items():
+            guardado = self._fragmentos_hospital.get(hospital)
+            if guardado is None or guardado[0] is not pacientes:
+                guardado = (pacientes, self._formatear_hospital(hospital, pacientes))
+                self._fragmentos_hospital[hospital] = guardado
+            partes.append(guardado[1])
 
-        return data_text
\ No newline at end of file
+        texto = "".join(partes)
+        self._contexto_modelo = (instantanea.version, texto)
+        return texto
+
+    @staticmethod
+    def _formatear_hospital(hospital: str, pacientes: List[Dict]) -> str:
+        lineas = [f"\n{hospital}:\n"]
+        for paciente in pacientes:
+            if 'edad' in paciente:
+                lineas.append(f"- {paciente['nombre']}, {paciente['edad']} años\n")
+            else:
+                lineas.append(f"- {paciente['nombre']}\n")
+        return "".join(lineas)
\ No newline at end of file
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+from typing import Dict, Optional, Set
+
+# Marca que se encola cuando un suscriptor se quedó atrás y debe volver a sincronizar
+RESYNC = {"tipo": "resync"}
+
+
+class Suscriptor:
+    def __init__(self, max_cola: int):
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=max_cola)
+
+
+class CentroDifusion:
+    """Reparte cada cambio de DataManager a los suscriptores conectados.
+
+    Cada suscriptor tiene una cola acotada: si se llena (cliente lento), se
+    vacía, se le encola RESYNC y se le da de baja, en lugar de acumular memoria.
+    Los cambios pueden publicarse desde cualquier hilo.
+    """
+
+    def __init__(self, max_cola: int = 256):
+        self.max_cola = max_cola
+        self.descartados = 0
+        self._suscriptores: Set[Suscriptor] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._hilo_loop: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._suscriptores)
+
+    def iniciar(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._hilo_loop = threading.get_ident()
+
+    def suscribir(self) -> Suscriptor:
+        suscriptor = Suscriptor(self.max_cola)
+        self._suscriptores.add(suscriptor)
+        return suscriptor
+
+    def desuscribir(self, suscriptor: Suscriptor):
+        self._suscriptores.discard(suscriptor)
+
+    def publicar(self, cambio: Dict):
+        if self._loop is None or self._loop.is_closed():
+            return
+        if threading.get_ident() == self._hilo_loop:
+            self._difundir(cambio)
+        else:
+            self._loop.call_soon_threadsafe(self._difundir, cambio)
+
+    def _difundir(self, cambio: Dict):
+        for suscriptor in list(self._suscriptores):
+            try:
+                suscriptor.cola.put_nowait(cambio)
+            except asyncio.QueueFull:
+                self._descartar(suscriptor)
+
+    def _descartar(self, suscriptor: Suscriptor):
+        self._suscriptores.discard(suscriptor)
+        self.descartados += 1
+        while not suscriptor.cola.empty():
+            suscriptor.cola.get_nowait()
+        suscriptor.cola.put_nowait(RESYNC)
@@ -0,0 +1,117 @@
+from array import array
+from typing import Dict, Iterable, Optional
+
+# Edades de 0 a EDAD_MAXIMA años, una casilla por año (la última agrupa EDAD_MAXIMA o más)
+EDAD_MAXIMA = 110
+
+# Ancho de los rangos de edad que se muestran
+ANCHO_RANGO = 10
+
+
+def _casilla(edad) -> Optional[int]:
+    if not isinstance(edad, int) or isinstance(edad, bool):
+        return None
+    return min(max(edad, 0), EDAD_MAXIMA)
+
+
+class _Hospital:
+    """Contadores de un hospital: total, pacientes sin edad y pacientes por año de edad"""
+    __slots__ = ("pacientes", "sin_edad", "edades")
+
+    def __init__(self):
+        self.pacientes = 0
+        self.sin_edad = 0
+        self.edades = array("I", bytes(4 * (EDAD_MAXIMA + 1)))
+
+    def sumar(self, edad, cantidad: int):
+        self.pacientes += cantidad
+        casilla = _casilla(edad)
+        if casilla is None:
+            self.sin_edad += cantidad
+        else:
+            self.edades[casilla] += cantidad
+
+
+class Estadisticas:
+    """Totales y distribución de edades por hospital, mantenidos en cada mutación.
+
+    Cada hospital guarda un arreglo fijo de contadores por año de edad (444
+    bytes), así que la memoria no depende del número de personas y el resumen
+    nunca recorre el registro. No es thread-safe: se modifica con el lock de
+    escritura de DataManager tomado.
+    """
+
+    def __init__(self):
+        self.fallecidos = 0
+        self.hospitales: Dict[str, _Hospital] = {}
+
+    def reconstruir(self, fallecidos: Iterable[str], pacientes_hospitales: Dict[str, Iterable[Dict]]):
+        """Recalcular todo a partir de los datos completos (al cargar)"""
+        self.fallecidos = sum(1 for _ in fallecidos)
+        self.hospitales = {}
+        for hospital, pacientes in pacientes_hospitales.items():
+            contadores = self.hospitales[hospital] = _Hospital()
+            for paciente in pacientes:
+                contadores.sumar(paciente.get("edad"), 1)
+
+    def agregar_fallecido(self):
+        self.fallecidos += 1
+
+    def agregar_paciente(self, hospital: str, edad: Optional[int]):
+        contadores = self.hospitales.get(hospital)
+        if contadores is None:
+            contadores = self.hospitales[hospital] = _Hospital()
+        contadores.sumar(edad, 1)
+
+    def quitar_paciente(self, hospital: str, edad: Optional[int]):
+        self.hospitales[hospital].sumar(edad, -1)
+
+    def resumen(self) -> Dict:
+        """Totales, pacientes por hospital y distribución de edades (global y por hospital)"""
+        global_ = _Hospital()
+        hospitales = {}
+        for hospital, contadores in self.hospitales.items():
+            global_.pacientes += contadores.pacientes
+            global_.sin_edad += contadores.sin_edad
+            for casilla, cantidad in enumerate(contadores.edades):
+                if cantidad:
+                    global_.edades[casilla] += cantidad
+            hospitales[hospital] = _resumen_hospital(contadores)
+
+        return {
+            "fallecidos": self.fallecidos,
+            "pacientes": global_.pacientes,
+            "total": self.fallecidos + global_.pacientes,
+            "edades": _resumen_edades(global_),
+            "hospitales": hospitales,
+        }
+
+
+def _resumen_hospital(contadores: _Hospital) -> Dict:
+    return {"pacientes": contadores.pacientes, "edades": _resumen_edades(contadores)}
+
+
+def _resumen_edades(contadores: _Hospital) -> Dict:
+    """Rangos de ANCHO_RANGO años, promedio, mínimo, máximo y mediana a partir de los contadores por año"""
+    con_edad = contadores.pacientes - contadores.sin_edad
+    rangos = {}
+    for inicio in range(0, EDAD_MAXIMA + 1, ANCHO_RANGO):
+        fin = inicio + ANCHO_RANGO - 1
+        etiqueta = f"{inicio}-{fin}" if fin < EDAD_MAXIMA else f"{inicio}+"
+        rangos[etiqueta] = sum(contadores.edades[inicio:fin + 1])
+
+    resumen = {"con_edad": con_edad, "sin_edad": contadores.sin_edad, "rangos": rangos,
+               "promedio": None, "minima": None, "maxima": None, "mediana": None}
+    if con_edad:
+        presentes = [edad for edad, cantidad in enumerate(contadores.edades) if cantidad]
+        resumen["promedio"] = round(sum(edad * cantidad for edad, cantidad in enumerate(contadores.edades))
+                                    / con_edad, 1)
+        resumen["minima"] = presentes[0]
+        resumen["maxima"] = presentes[-1]
+        acumulado = 0
+        for edad in presentes:
+            acumulado += contadores.edades[edad]
+            if 2 * acumulado >= con_edad:
+                resumen["mediana"] = edad
+                break
+    return resumen
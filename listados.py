@@ -0,0 +1,160 @@
+import base64
+import json
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from busqueda import normalizar_nombre
+from data_manager import Instantanea
+
+CAMPOS_FALLECIDO = ("nombre",)
+CAMPOS_PACIENTE = ("nombre", "hospital", "edad")
+
+# Filas por fragmento al exportar en NDJSON
+FILAS_POR_FRAGMENTO = 1000
+
+Fila = Tuple[Dict, Dict]
+
+# json.dumps con argumentos crea un codificador por llamada; al exportar se reutiliza uno
+_CODIFICADOR = json.JSONEncoder(ensure_ascii=False)
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no es uno emitido por este listado"""
+
+
+def codificar_cursor(posicion: Dict) -> str:
+    datos = json.dumps(posicion, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(datos).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Dict:
+    try:
+        posicion = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise CursorInvalido("Cursor inválido")
+    if not isinstance(posicion, dict):
+        raise CursorInvalido("Cursor inválido")
+    # bool es subclase de int: {"p": true} no es una posición
+    p = posicion.get("p")
+    if not isinstance(p, int) or isinstance(p, bool) or p < 0:
+        raise CursorInvalido("Cursor inválido")
+    return posicion
+
+
+def campos_validos(campos: str, disponibles: Sequence[str]) -> Tuple[str, ...]:
+    """Campos pedidos en `campos` ("nombre,edad"), validados contra los disponibles"""
+    pedidos = tuple(dict.fromkeys(campo.strip() for campo in campos.split(",") if campo.strip()))
+    desconocidos = [campo for campo in pedidos if campo not in disponibles]
+    if desconocidos or not pedidos:
+        raise ValueError(f"Campos no válidos: {', '.join(desconocidos) or campos}. "
+                         f"Disponibles: {', '.join(disponibles)}")
+    return pedidos
+
+
+def filas_fallecidos(instantanea: Instantanea, cursor: Optional[Dict] = None,
+                     prefijo: Optional[str] = None) -> Iterator[Fila]:
+    """(cursor tras la fila, fila) de cada fallecido, en orden de registro.
+
+    La lista de fallecidos solo crece, así que la posición basta como cursor.
+    """
+    prefijo = normalizar_nombre(prefijo) if prefijo else None
+    fallecidos = instantanea.fallecidos
+    for i in range(cursor["p"] if cursor else 0, len(fallecidos)):
+        nombre = fallecidos[i]
+        if prefijo and not normalizar_nombre(nombre).startswith(prefijo):
+            continue
+        yield {"p": i + 1}, {"nombre": nombre}
+
+
+def _reanudar(pacientes: Sequence[Dict], posicion: int, nombre: str) -> int:
+    """Posición desde la que seguir un hospital tras el paciente `nombre`, que estaba en `posicion` - 1.
+
+    Desde que se emitió el cursor solo pudo haber altas al final y bajas
+    (traslados a fallecidos), que desplazan a los demás hacia el principio: el
+    último paciente devuelto está en su posición o antes. Si fue él el
+    trasladado, se sigue desde el lugar que ocupaba.
+    """
+    for i in range(min(posicion, len(pacientes)) - 1, -1, -1):
+        if pacientes[i]["nombre"] == nombre:
+            return i + 1
+    return max(0, min(posicion - 1, len(pacientes)))
+
+
+def filas_pacientes(instantanea: Instantanea, cursor: Optional[Dict] = None, prefijo: Optional[str] = None,
+                    hospital: Optional[str] = None, edad_min: Optional[int] = None,
+                    edad_max: Optional[int] = None) -> Iterator[Fila]:
+    """(cursor tras la fila, fila) de cada paciente, por hospital y en orden de registro.
+
+    Con un filtro de edad se omiten los pacientes sin edad registrada. El
+    cursor se valida aquí (no al recorrer) para poder rechazarlo antes de
+    empezar a responder.
+    """
+    hospitales = list(instantanea.pacientes_hospitales)
+    inicio = 0
+    if cursor:
+        # Comprobar los tipos antes de buscar el hospital: un "h" que no sea texto puede no ser hashable
+        if not isinstance(cursor.get("h"), str) or not isinstance(cursor.get("n"), str) \
+                or cursor["h"] not in instantanea.pacientes_hospitales:
+            raise CursorInvalido("Cursor inválido")
+        inicio = hospitales.index(cursor["h"])
+    return _recorrer_pacientes(instantanea, hospitales[inicio:], cursor, prefijo, hospital, edad_min, edad_max)
+
+
+def _recorrer_pacientes(instantanea: Instantanea, hospitales: List[str], cursor: Optional[Dict],
+                        prefijo: Optional[str], hospital: Optional[str], edad_min: Optional[int],
+                        edad_max: Optional[int]) -> Iterator[Fila]:
+    prefijo = normalizar_nombre(prefijo) if prefijo else None
+    buscado = normalizar_nombre(hospital) if hospital is not None else None
+    filtrar_edad = edad_min is not None or edad_max is not None
+
+    for nombre_hospital in hospitales:
+        if buscado is not None and normalizar_nombre(nombre_hospital) != buscado:
+            continue
+        pacientes = instantanea.pacientes_hospitales[nombre_hospital]
+        desde = 0
+        if cursor and nombre_hospital == cursor["h"]:
+            desde = _reanudar(pacientes, cursor["p"], cursor["n"])
+
+        for i in range(desde, len(pacientes)):
+            paciente = pacientes[i]
+            if filtrar_edad:
+                edad = paciente.get("edad")
+                if not isinstance(edad, int) or (edad_min is not None and edad < edad_min) \
+                        or (edad_max is not None and edad > edad_max):
+                    continue
+            if prefijo and not normalizar_nombre(paciente["nombre"]).startswith(prefijo):
+                continue
+            fila = {"nombre": paciente["nombre"], "hospital": nombre_hospital}
+            if "edad" in paciente:
+                fila["edad"] = paciente["edad"]
+            yield {"h": nombre_hospital, "p": i + 1, "n": paciente["nombre"]}, fila
+
+
+def proyectar(filas: Iterator[Fila], campos: Sequence[str]) -> Iterator[Fila]:
+    for cursor, fila in filas:
+        yield cursor, {campo: fila[campo] for campo in campos if campo in fila}
+
+
+def pagina(filas: Iterator[Fila], limite: int) -> Tuple[List[Dict], Optional[str]]:
+    """Las primeras `limite` filas y el cursor de la siguiente página (None si no quedan más)"""
+    resultados = []
+    ultimo = None
+    for cursor, fila in filas:
+        if len(resultados) == limite:
+            return resultados, codificar_cursor(ultimo)
+        resultados.append(fila)
+        ultimo = cursor
+    return resultados, None
+
+
+def exportar_ndjson(filas: Iterator[Fila], filas_por_fragmento: int = FILAS_POR_FRAGMENTO) -> Iterator[bytes]:
+    """Una línea JSON por fila, en fragmentos de `filas_por_fragmento` filas, sin materializar el listado"""
+    lineas = []
+    for _, fila in filas:
+        lineas.append(_CODIFICADOR.encode(fila))
+        if len(lineas) == filas_por_fragmento:
+            lineas.append("")
+            yield "\n".join(lineas).encode("utf-8")
+            lineas = []
+    if lineas:
+        lineas.append("")
+        yield "\n".join(lineas).encode("utf-8")
@@ -1,18 +1,48 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Optional, Union
-from pydantic import BaseModel
-import requests
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Optional, Tuple, Union
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+import asyncio
+import codecs
+import csv
+from email.utils import formatdate, parsedate_to_datetime
+import gzip
+import hashlib
+import json
+import logging
 import os
-from data_manager import DataManager
+import time
+from azure_client import AzureOpenAIClient, AzureOpenAIError, ClienteSaturadoError
+from cache_respuestas import CacheRespuestas
+from data_manager import DataManager, Instantanea
+from difusion import RESYNC, CentroDifusion
+from metricas import (CONTEXTO_MODELO_DURACION, LLM_DURACION, LLM_PRIMER_TOKEN, LLM_TOKENS, REGISTRO, Indicador,
+                      MiddlewareMetricas, cronometrar, logger)
+from listados import (CAMPOS_FALLECIDO, CAMPOS_PACIENTE, campos_validos, decodificar_cursor, exportar_ndjson,
+                      filas_fallecidos, filas_pacientes, pagina, proyectar)
+from recuperacion import contexto_candidatos, necesita_registro_completo, recuperar, respuesta_directa
+from storage import crear_storage
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    centro_difusion.iniciar(asyncio.get_running_loop())
+    yield
+    # Cerrar el pool de conexiones y compactar la bitácora al apagar
+    await azure_client.close()
+    data_manager.close()
+
 
 # Inicializar FastAPI
 app = FastAPI(
     title="API de Información sobre Víctimas",
     description="API para consultar y registrar información sobre fallecidos y rescatados en la tragedia de Jet Set",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -24,13 +54,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas en /metrics (METRICAS=0 deja de medir) y log de peticiones lentas y errores
+REGISTRO.activo = os.getenv("METRICAS", "1") != "0"
+app.add_middleware(MiddlewareMetricas, lenta=float(os.getenv("PETICION_LENTA", "2")))
+_manejador_log = logging.FileHandler(os.getenv("LOG_FILE", "search_assistant.log"), encoding="utf-8")
+_manejador_log.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+logger.addHandler(_manejador_log)
+logger.setLevel(logging.INFO)
+
 # Configuración de API Key
 API_KEY = "1901"
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
-# Inicializar gestor de datos
-data_manager = DataManager()
+# Inicializar gestor de datos ("json" reescribe el archivo completo, "journal" usa bitácora + snapshots,
+# "binario" igual pero con snapshots binarios que incluyen el índice de búsqueda (arranque rápido),
+# "sqlite" usa una base compartida que permite arrancar uvicorn con varios workers)
+STORAGE_MODE = os.getenv("STORAGE_MODE", "json")
+DATA_FILE = os.getenv("DATA_FILE", "disaster_data.json")
+SQLITE_FILE = os.getenv("SQLITE_FILE")
+data_manager = DataManager(DATA_FILE, storage=crear_storage(STORAGE_MODE, DATA_FILE, SQLITE_FILE),
+                           max_cambios=int(os.getenv("MAX_CAMBIOS", "10000")),
+                           intervalo_sincronizacion=float(os.getenv("INTERVALO_SINCRONIZACION", "0.25")))
+
+# Máximo de elementos aceptados en un registro por lote
+LOTE_MAX = int(os.getenv("LOTE_MAX", "5000"))
+
+# Longitud máxima de un nombre de persona o de hospital al registrar
+NOMBRE_MAX = int(os.getenv("NOMBRE_MAX", "200"))
+
+# Máximo de filas por página en /fallecidos y /pacientes (la exportación NDJSON no tiene límite)
+LISTADO_MAX = int(os.getenv("LISTADO_MAX", "1000"))
+
+# Difusión de cambios en vivo para /eventos
+EVENTOS_HEARTBEAT = float(os.getenv("EVENTOS_HEARTBEAT", "15"))
+centro_difusion = CentroDifusion(max_cola=int(os.getenv("EVENTOS_MAX_COLA", "256")))
+data_manager.oyentes.append(centro_difusion.publicar)
 
 # Azure OpenAI Configuration
 AZURE_API_KEY = os.getenv("AZURE_API_KEY",
@@ -39,10 +98,59 @@ AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT", "https://rag-codec-v1.openai.azure.
 AZURE_DEPLOYMENT = os.getenv("AZURE_DEPLOYMENT", "gpt-4o-mini-codec")
 AZURE_API_VERSION = os.getenv("AZURE_API_VERSION", "2024-02-15-preview")
 
+# Candidatos por nombre consultado que se envían al modelo
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+
+azure_client = AzureOpenAIClient(
+    AZURE_ENDPOINT, AZURE_DEPLOYMENT, AZURE_API_VERSION, AZURE_API_KEY,
+    connect_timeout=float(os.getenv("AZURE_CONNECT_TIMEOUT", "5")),
+    read_timeout=float(os.getenv("AZURE_READ_TIMEOUT", "60")),
+    max_concurrencia=int(os.getenv("AZURE_MAX_CONCURRENCIA", "16")),
+    max_en_cola=int(os.getenv("AZURE_MAX_EN_COLA", "64")),
+    max_reintentos=int(os.getenv("AZURE_MAX_REINTENTOS", "3")),
+)
+
+# Caché de respuestas de /chat (CACHE_CHAT_MAX_BYTES=0 la desactiva; las preguntas iguales
+# en curso se siguen agrupando en una sola llamada)
+cache_respuestas = CacheRespuestas(
+    data_manager,
+    max_bytes=int(os.getenv("CACHE_CHAT_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=float(os.getenv("CACHE_CHAT_TTL", "300")),
+)
+
+
+def _tamano_datos() -> Dict:
+    instantanea = data_manager.instantanea()
+    return {
+        ("fallecidos",): len(instantanea.fallecidos),
+        ("pacientes",): sum(len(pacientes) for pacientes in instantanea.pacientes_hospitales.values()),
+        ("hospitales",): len(instantanea.pacientes_hospitales),
+    }
+
+
+def _metricas_cache_chat() -> Dict:
+    metricas = cache_respuestas.metricas()
+    return {(evento,): metricas[evento]
+            for evento in ("aciertos", "fallos", "coalescidas", "expulsadas", "expiradas", "invalidadas")}
+
+
+Indicador("datos_registros", "Registros en memoria por tipo", _tamano_datos, ("tipo",))
+Indicador("datos_version", "Versión de los datos (secuencia del último cambio)", lambda: data_manager.version)
+Indicador("llm_consultas_en_espera", "Consultas esperando turno para Azure OpenAI", lambda: azure_client.en_espera)
+Indicador("cache_chat_bytes", "Bytes ocupados por la caché de respuestas de /chat",
+          lambda: cache_respuestas.metricas()["bytes"])
+Indicador("cache_chat_eventos_total", "Aciertos, fallos, agrupadas e invalidaciones de la caché de /chat",
+          _metricas_cache_chat, ("evento",), tipo="counter")
+Indicador("eventos_suscriptores", "Clientes conectados a /eventos", lambda: len(centro_difusion))
+Indicador("eventos_descartados_total", "Clientes de /eventos desconectados por no leer a tiempo",
+          lambda: centro_difusion.descartados, tipo="counter")
+
 
 # Modelos de datos
 class ChatRequest(BaseModel):
     message: str
+    # Respuesta en SSE a medida que llegan los tokens (también con Accept: text/event-stream)
+    stream: bool = False
 
 
 class ChatResponse(BaseModel):
@@ -50,12 +158,12 @@ class ChatResponse(BaseModel):
 
 
 class FallecidoRequest(BaseModel):
-    nombre: str
+    nombre: str = Field(max_length=NOMBRE_MAX)
 
 
 class PacienteRequest(BaseModel):
-    nombre: str
-    hospital: str
+    nombre: str = Field(max_length=NOMBRE_MAX)
+    hospital: str = Field(max_length=NOMBRE_MAX)
     edad: Optional[int] = None
 
 
@@ -76,14 +184,58 @@ async def get_api_key(api_key: str = Header(None, alias=API_KEY_NAME)):
 
 
 # Función para generar respuesta de Azure OpenAI
-def generate_azure_response(prompt: str) -> str:
-    headers = {
-        "Content-Type": "application/json",
-        "api-key": AZURE_API_KEY
-    }
+async def generate_azure_response(prompt: str) -> str:
+    # Preguntas repetidas se responden desde la caché mientras no cambien las personas mencionadas
+    return await cache_respuestas.obtener(prompt, lambda: _responder(prompt))
+
 
-    # Obtener todos los datos de víctimas formateados
-    data_text = data_manager.get_data_for_model()
+async def _responder(prompt: str) -> Tuple[str, bool]:
+    """Respuesta a la consulta e indicación de si puede guardarse en la caché"""
+    directa, messages = _preparar_consulta(prompt)
+    if directa is not None:
+        return directa, True
+
+    inicio = time.perf_counter()
+    try:
+        data = await azure_client.chat(messages, temperature=0.7)
+        _medir_llm("completo", "ok", inicio, data.get("usage"))
+        return data['choices'][0]['message']['content'].strip(), True
+    except ClienteSaturadoError:
+        _medir_llm("completo", "saturado", inicio)
+        raise HTTPException(status_code=503, detail="El asistente está saturado, intenta de nuevo en unos segundos")
+    except AzureOpenAIError as e:
+        _medir_llm("completo", "error", inicio)
+        logger.error("Azure OpenAI: %s", e)
+        return str(e), False
+    except Exception as e:
+        _medir_llm("completo", "error", inicio)
+        logger.exception("Error al conectar con Azure OpenAI")
+        return f"Error al conectar con Azure OpenAI: {str(e)}", False
+
+
+def _medir_llm(modo: str, resultado: str, inicio: float, uso: Optional[Dict] = None):
+    if not REGISTRO.activo:
+        return
+    LLM_DURACION.observe(time.perf_counter() - inicio, modo, resultado)
+    if uso:
+        LLM_TOKENS.inc(uso.get("prompt_tokens", 0), "prompt")
+        LLM_TOKENS.inc(uso.get("completion_tokens", 0), "completion")
+
+
+def _preparar_consulta(prompt: str) -> Tuple[Optional[str], List[Dict]]:
+    """Respuesta directa si no hace falta el modelo, o los mensajes que hay que enviarle"""
+    # Buscar en el registro solo las personas mencionadas en la consulta
+    recuperacion = recuperar(data_manager, prompt, limite=RETRIEVAL_TOP_K)
+    if recuperacion["exacto"] is not None:
+        # Coincidencia exacta con una sola persona: no hace falta el modelo
+        return respuesta_directa(recuperacion["exacto"]), []
+
+    if not necesita_registro_completo(recuperacion):
+        data_text = contexto_candidatos(data_manager, recuperacion)
+    else:
+        # Consulta general (p. ej. "¿Quiénes murieron?"): enviar todos los datos formateados
+        with cronometrar(CONTEXTO_MODELO_DURACION):
+            data_text = data_manager.get_data_for_model()
 
     # Construir el mensaje del sistema con los datos y las instrucciones
     system_message = (
@@ -98,32 +250,70 @@ def generate_azure_response(prompt: str) -> str:
         "5. Responde con empatía y precisión, esta información es muy sensible."
     )
 
-    payload = {
-        "messages": [
-            {
-                "role": "system",
-                "content": system_message
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.7,
-        "stream": False
-    }
-
-    url = f"{AZURE_ENDPOINT}/openai/deployments/{AZURE_DEPLOYMENT}/chat/completions?api-version={AZURE_API_VERSION}"
-
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        if response.status_code == 200:
-            data = response.json()
-            return data['choices'][0]['message']['content'].strip()
-        else:
-            return f"Error al obtener respuesta: {response.status_code}"
-    except Exception as e:
-        return f"Error al conectar con Azure OpenAI: {str(e)}"
+    messages = [
+        {
+            "role": "system",
+            "content": system_message
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    return None, messages
+
+
+async def _responder_en_streaming(prompt: str) -> StreamingResponse:
+    """Respuesta en SSE: un evento "token" por fragmento del modelo y un evento "fin" con el texto completo"""
+    version = data_manager.version
+    respuesta = cache_respuestas.consultar(prompt)
+    messages = []
+    if respuesta is None:
+        respuesta, messages = _preparar_consulta(prompt)
+        if respuesta is not None:
+            cache_respuestas.guardar(prompt, respuesta, version)
+
+    flujo = None
+    if respuesta is None:
+        try:
+            flujo = azure_client.chat_stream(messages, temperature=0.7)
+        except ClienteSaturadoError:
+            raise HTTPException(status_code=503,
+                                detail="El asistente está saturado, intenta de nuevo en unos segundos")
+
+    async def generar():
+        if flujo is None:
+            # Respuesta ya conocida (caché o coincidencia exacta): un solo fragmento
+            yield _evento_sse({"tipo": "token", "texto": respuesta})
+            yield _evento_sse({"tipo": "fin", "response": respuesta})
+            return
+
+        partes = []
+        inicio = time.perf_counter()
+        resultado = "cancelado"
+        try:
+            async for texto in flujo:
+                if not partes and REGISTRO.activo:
+                    LLM_PRIMER_TOKEN.observe(time.perf_counter() - inicio)
+                partes.append(texto)
+                yield _evento_sse({"tipo": "token", "texto": texto})
+            resultado = "ok"
+        except AzureOpenAIError as e:
+            resultado = "error"
+            logger.error("Azure OpenAI (streaming): %s", e)
+            yield _evento_sse({"tipo": "error", "detail": str(e)})
+            return
+        finally:
+            # Si el cliente se desconectó, cerrar el flujo corta la conexión con Azure
+            await flujo.aclose()
+            _medir_llm("streaming", resultado, inicio, {"completion_tokens": len(partes)})
+
+        completa = "".join(partes).strip()
+        cache_respuestas.guardar(prompt, completa, version)
+        yield _evento_sse({"tipo": "fin", "response": completa})
+
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # Endpoints
@@ -133,18 +323,34 @@ async def root():
 
 
 @app.post("/chat", response_model=ChatResponse, dependencies=[Depends(get_api_key)])
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
+    if request.stream or "text/event-stream" in http_request.headers.get("accept", ""):
+        return await _responder_en_streaming(request.message)
+
     # Enviar la consulta directamente a Azure OpenAI con todos los datos
-    response = generate_azure_response(request.message)
+    response = await generate_azure_response(request.message)
     return ChatResponse(response=response)
 
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(get_api_key)])
+async def metricas_prometheus():
+    # Formato de texto de Prometheus; el scraper envía X-API-Key (http_headers en scrape_config)
+    return Response(content=REGISTRO.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/chat/cache", dependencies=[Depends(get_api_key)])
+async def metricas_cache_chat():
+    # Aciertos, fallos, llamadas agrupadas, expulsiones por memoria, expiraciones e invalidaciones
+    return cache_respuestas.metricas()
+
+
 @app.post("/fallecidos/registrar", response_model=ApiResponse, dependencies=[Depends(get_api_key)])
 async def registrar_fallecido(request: FallecidoRequest):
     if not request.nombre or request.nombre.strip() == "":
         return ApiResponse(success=False, message="El nombre no puede estar vacío")
 
-    result = data_manager.add_fallecido(request.nombre)
+    # Las escrituras van a un hilo: la persistencia (fsync o reescritura) no frena el event loop
+    result = await run_in_threadpool(data_manager.add_fallecido, request.nombre)
     if result:
         return ApiResponse(success=True, message=f"{request.nombre} ha sido registrado como fallecido")
     else:
@@ -159,7 +365,7 @@ async def registrar_paciente(request: PacienteRequest):
     if not request.hospital or request.hospital.strip() == "":
         return ApiResponse(success=False, message="El hospital no puede estar vacío")
 
-    result = data_manager.add_paciente(request.nombre, request.hospital, request.edad)
+    result = await run_in_threadpool(data_manager.add_paciente, request.nombre, request.hospital, request.edad)
     if result["success"]:
         return ApiResponse(success=True,
                            message=f"{request.nombre} ha sido registrado como paciente en {request.hospital}")
@@ -167,9 +373,367 @@ async def registrar_paciente(request: PacienteRequest):
         return ApiResponse(success=False, message=result["message"])
 
 
+async def _lineas_del_cuerpo(request: Request):
+    """Recorrer el cuerpo de la petición línea a línea a medida que llegan los fragmentos"""
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    async for fragmento in request.stream():
+        texto = resto + decodificador.decode(fragmento)
+        *lineas, resto = texto.split("\n")
+        for linea in lineas:
+            yield linea.rstrip("\r")
+    resto += decodificador.decode(b"", final=True)
+    if resto.strip():
+        yield resto.rstrip("\r")
+
+
+async def _leer_lote(request: Request) -> List[Union[str, Dict]]:
+    """Leer un lote como arreglo JSON, NDJSON (una línea JSON por elemento) o CSV con encabezado"""
+    tipo = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    elementos = []
+
+    if tipo in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        async for linea in _lineas_del_cuerpo(request):
+            if not linea.strip():
+                continue
+            try:
+                elementos.append(json.loads(linea))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Línea NDJSON inválida: {linea[:80]}")
+            if len(elementos) > LOTE_MAX:
+                break
+    elif tipo == "text/csv":
+        encabezado = None
+        async for linea in _lineas_del_cuerpo(request):
+            if not linea.strip():
+                continue
+            fila = next(csv.reader([linea]))
+            if encabezado is None:
+                encabezado = [columna.strip().lower() for columna in fila]
+                if "nombre" not in encabezado:
+                    raise HTTPException(status_code=400, detail="El CSV debe tener una columna 'nombre'")
+                continue
+            elementos.append(dict(zip(encabezado, fila)))
+            if len(elementos) > LOTE_MAX:
+                break
+    else:
+        try:
+            elementos = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON")
+        if not isinstance(elementos, list):
+            raise HTTPException(status_code=400, detail="El cuerpo debe ser un arreglo JSON")
+
+    if len(elementos) > LOTE_MAX:
+        raise HTTPException(status_code=413, detail=f"El lote no puede tener más de {LOTE_MAX} elementos")
+    return elementos
+
+
+def _campo(elemento: Union[str, Dict], nombre: str) -> str:
+    if isinstance(elemento, str):
+        return elemento if nombre == "nombre" else ""
+    if isinstance(elemento, dict):
+        valor = elemento.get(nombre)
+        return str(valor) if valor is not None else ""
+    return ""
+
+
+def _error_nombre(valor: str, campo: str) -> Optional[str]:
+    if not valor:
+        return f"{campo} no puede estar vacío"
+    if len(valor) > NOMBRE_MAX:
+        return f"{campo} no puede tener más de {NOMBRE_MAX} caracteres"
+    return None
+
+
+def _respuesta_lote(resultados: List[Dict], descripcion: str) -> ApiResponse:
+    registrados = sum(1 for resultado in resultados if resultado["success"])
+    return ApiResponse(
+        success=registrados > 0,
+        message=f"{registrados} de {len(resultados)} {descripcion}",
+        data={"registrados": registrados, "rechazados": len(resultados) - registrados, "resultados": resultados},
+    )
+
+
+def _combinar_resultados(total: int, rechazos: Dict[int, Dict], validos: List[int],
+                         resultados_validos: List[Dict]) -> List[Dict]:
+    """Reordenar los resultados según la posición de cada elemento en el lote"""
+    resultados = [None] * total
+    for posicion, resultado in rechazos.items():
+        resultados[posicion] = resultado
+    for posicion, resultado in zip(validos, resultados_validos):
+        resultados[posicion] = resultado
+    return resultados
+
+
+@app.post("/fallecidos/registrar-lote", response_model=ApiResponse, dependencies=[Depends(get_api_key)])
+async def registrar_fallecidos_lote(request: Request):
+    elementos = await _leer_lote(request)
+    rechazos, validos, nombres = {}, [], []
+    for posicion, elemento in enumerate(elementos):
+        nombre = _campo(elemento, "nombre").strip()
+        error = _error_nombre(nombre, "El nombre")
+        if error:
+            rechazos[posicion] = {"nombre": nombre[:NOMBRE_MAX], "success": False, "message": error}
+            continue
+        validos.append(posicion)
+        nombres.append(nombre)
+
+    registrados = await run_in_threadpool(data_manager.add_fallecidos, nombres)
+    resultados = _combinar_resultados(len(elementos), rechazos, validos, registrados)
+    return _respuesta_lote(resultados, "personas registradas como fallecidas")
+
+
+@app.post("/pacientes/registrar-lote", response_model=ApiResponse, dependencies=[Depends(get_api_key)])
+async def registrar_pacientes_lote(request: Request):
+    elementos = await _leer_lote(request)
+    rechazos, validos, pacientes = {}, [], []
+    for posicion, elemento in enumerate(elementos):
+        nombre = _campo(elemento, "nombre").strip()
+        hospital = _campo(elemento, "hospital").strip()
+        edad = _campo(elemento, "edad").strip()
+        error = _error_nombre(nombre, "El nombre") or _error_nombre(hospital, "El hospital")
+        if error:
+            rechazos[posicion] = {"nombre": nombre[:NOMBRE_MAX], "success": False, "message": error}
+            continue
+        if edad and not edad.isdigit():
+            rechazos[posicion] = {"nombre": nombre, "success": False, "message": f"Edad inválida: {edad}"}
+            continue
+        validos.append(posicion)
+        pacientes.append({"nombre": nombre, "hospital": hospital, "edad": int(edad) if edad else None})
+
+    registrados = await run_in_threadpool(data_manager.add_pacientes, pacientes)
+    resultados = _combinar_resultados(len(elementos), rechazos, validos, registrados)
+    return _respuesta_lote(resultados, "pacientes registrados")
+
+
+# Cuerpo de /datos ya serializado para la versión actual de los datos
+_cache_datos = {"version": None}
+# Versión -> tarea que la está serializando (una sola por versión, aunque lleguen muchas peticiones)
+_codificando: Dict[int, asyncio.Future] = {}
+
+
+def _codificar_datos(instantanea: Instantanea) -> Dict:
+    """Serializar una instantánea (en un hilo: con muchos registros tarda más de un segundo)"""
+    cuerpo = json.dumps(instantanea.como_dict(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {
+        "version": instantanea.version,
+        "cuerpo": cuerpo,
+        "gzip": None,
+        "tarea_gzip": None,
+        # ETag fuerte derivado del contenido: igual entre reinicios y entre workers
+        "etag": f'"{hashlib.sha256(cuerpo).hexdigest()[:32]}"',
+        "last_modified": formatdate(instantanea.ultima_modificacion, usegmt=True),
+        "timestamp": int(instantanea.ultima_modificacion),
+    }
+
+
+async def _datos_codificados() -> Dict:
+    """Cuerpo de /datos de la instantánea vigente, serializado fuera del event loop"""
+    global _cache_datos
+    instantanea = data_manager.instantanea()
+    if _cache_datos["version"] == instantanea.version:
+        return _cache_datos
+
+    tarea = _codificando.get(instantanea.version)
+    if tarea is None:
+        tarea = asyncio.ensure_future(run_in_threadpool(_codificar_datos, instantanea))
+        _codificando[instantanea.version] = tarea
+        tarea.add_done_callback(lambda _, version=instantanea.version: _codificando.pop(version, None))
+    # shield: si el cliente que la inició se desconecta, la serialización sigue para los demás
+    cache = await asyncio.shield(tarea)
+    # Las versiones solo crecen: no reemplazar una más nueva que terminó antes
+    if _cache_datos["version"] is None or cache["version"] > _cache_datos["version"]:
+        _cache_datos = cache
+    return cache
+
+
+async def _datos_gzip(cache: Dict) -> bytes:
+    """Cuerpo comprimido (se calcula en un hilo la primera vez que un cliente lo pide)"""
+    if cache["gzip"] is None:
+        if cache["tarea_gzip"] is None:
+            cache["tarea_gzip"] = asyncio.ensure_future(
+                run_in_threadpool(gzip.compress, cache["cuerpo"], compresslevel=6))
+        cache["gzip"] = await asyncio.shield(cache["tarea_gzip"])
+    return cache["gzip"]
+
+
+def _no_modificado(request: Request, etags: List[str], timestamp: int) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etiquetas = {etiqueta.strip().removeprefix("W/") for etiqueta in if_none_match.split(",")}
+        return "*" in etiquetas or any(etag in etiquetas for etag in etags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return timestamp <= int(parsedate_to_datetime(if_modified_since).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def _sincronizar():
+    """Con varios workers, aplicar lo que otros hayan escrito antes de responder una lectura"""
+    if data_manager.storage.compartido:
+        await run_in_threadpool(data_manager.sincronizar)
+
+
 @app.get("/datos", dependencies=[Depends(get_api_key)])
-async def obtener_datos():
-    return data_manager.get_all_data()
+async def obtener_datos(request: Request):
+    await _sincronizar()
+    cache = await _datos_codificados()
+    usar_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    etag_gzip = cache["etag"][:-1] + '-gzip"'
+    etag = etag_gzip if usar_gzip else cache["etag"]
+    headers = {
+        "ETag": etag,
+        "Last-Modified": cache["last_modified"],
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        # Punto de partida para GET /cambios?desde=...
+        "X-Data-Version": str(cache["version"]),
+    }
+
+    # Ambas codificaciones tienen el mismo contenido: cualquiera de los dos ETag vale para el 304
+    if _no_modificado(request, [cache["etag"], etag_gzip], cache["timestamp"]):
+        return Response(status_code=304, headers=headers)
+
+    if usar_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=await _datos_gzip(cache), media_type="application/json", headers=headers)
+
+    return Response(content=cache["cuerpo"], media_type="application/json", headers=headers)
+
+
+@app.get("/cambios", dependencies=[Depends(get_api_key)])
+async def obtener_cambios(desde: int = Query(..., ge=0, description="Última versión conocida por el cliente")):
+    # Si "resync" es verdadero el cliente debe volver a descargar /datos
+    await _sincronizar()
+    return data_manager.get_cambios(desde)
+
+
+async def _listado(request: Request, crear_filas, campos: Optional[str], disponibles: Tuple[str, ...],
+                   limite: int, formato: Optional[str]) -> Response:
+    """Una página JSON con el cursor de la siguiente, o la exportación completa en NDJSON"""
+    await _sincronizar()
+    instantanea = data_manager.instantanea()
+    try:
+        filas = crear_filas(instantanea)
+        if campos:
+            filas = proyectar(filas, campos_validos(campos, disponibles))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Todas las filas salen de la misma instantánea, aunque haya escrituras mientras se exporta
+    headers = {"X-Data-Version": str(instantanea.version)}
+    if formato == "ndjson" or (formato is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        return StreamingResponse(exportar_ndjson(filas), media_type="application/x-ndjson", headers=headers)
+
+    # Con filtros poco selectivos una página puede recorrer muchas filas: fuera del event loop
+    resultados, siguiente = await run_in_threadpool(pagina, filas, limite)
+    return JSONResponse({"resultados": resultados, "siguiente": siguiente, "version": instantanea.version},
+                        headers=headers)
+
+
+@app.get("/fallecidos", dependencies=[Depends(get_api_key)])
+async def listar_fallecidos(request: Request,
+                            cursor: Optional[str] = Query(None,
+                                                          description="Valor de 'siguiente' de la página anterior"),
+                            limite: int = Query(100, ge=1, le=LISTADO_MAX),
+                            prefijo: Optional[str] = Query(None, description="Inicio del nombre"),
+                            campos: Optional[str] = Query(None, description="Campos separados por comas"),
+                            formato: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
+    def crear_filas(instantanea):
+        return filas_fallecidos(instantanea, decodificar_cursor(cursor) if cursor else None, prefijo)
+
+    return await _listado(request, crear_filas, campos, CAMPOS_FALLECIDO, limite, formato)
+
+
+@app.get("/pacientes", dependencies=[Depends(get_api_key)])
+async def listar_pacientes(request: Request,
+                           cursor: Optional[str] = Query(None,
+                                                         description="Valor de 'siguiente' de la página anterior"),
+                           limite: int = Query(100, ge=1, le=LISTADO_MAX),
+                           prefijo: Optional[str] = Query(None, description="Inicio del nombre"),
+                           hospital: Optional[str] = None,
+                           edad_min: Optional[int] = Query(None, ge=0),
+                           edad_max: Optional[int] = Query(None, ge=0),
+                           campos: Optional[str] = Query(None, description="Campos separados por comas"),
+                           formato: Optional[str] = Query(None, pattern="^(json|ndjson)$")):
+    def crear_filas(instantanea):
+        return filas_pacientes(instantanea, decodificar_cursor(cursor) if cursor else None, prefijo, hospital,
+                               edad_min, edad_max)
+
+    return await _listado(request, crear_filas, campos, CAMPOS_PACIENTE, limite, formato)
+
+
+@app.get("/estadisticas", dependencies=[Depends(get_api_key)])
+async def obtener_estadisticas():
+    # Totales de fallecidos y pacientes, pacientes por hospital y distribución de edades
+    await _sincronizar()
+    return data_manager.get_estadisticas()
+
+
+@app.get("/buscar", dependencies=[Depends(get_api_key)])
+async def buscar_personas(q: str = Query(..., min_length=1, max_length=200, description="Nombre completo o parcial"),
+                          limite: int = Query(10, ge=1, le=100)):
+    # Tolera errores de escritura, acentos y nombres incompletos ("Rubi Perez", "Jose Montilla")
+    await _sincronizar()
+    return {"consulta": q, "resultados": data_manager.buscar_parecidos(q, limite)}
+
+
+def _evento_sse(cambio: Dict) -> str:
+    datos = json.dumps(cambio, ensure_ascii=False)
+    if "seq" in cambio:
+        return f"id: {cambio['seq']}\nevent: {cambio['tipo']}\ndata: {datos}\n\n"
+    return f"event: {cambio['tipo']}\ndata: {datos}\n\n"
+
+
+@app.get("/eventos", dependencies=[Depends(get_api_key)])
+async def eventos(request: Request, desde: Optional[int] = Query(None, ge=0),
+                  last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")):
+    """Stream SSE con cada registro nuevo, reanudable desde una secuencia conocida"""
+    # Suscribirse antes de leer el anillo para no perder cambios entre ambos pasos
+    suscriptor = centro_difusion.suscribir()
+    desde = last_event_id if last_event_id is not None else desde
+    pendientes = data_manager.get_cambios(desde) if desde is not None else None
+    version_inicial = data_manager.version
+
+    async def generar():
+        try:
+            yield f"retry: 3000\nevent: conectado\ndata: {json.dumps({'version': version_inicial})}\n\n"
+            ultimo = desde if desde is not None else version_inicial
+            if pendientes is not None:
+                if pendientes["resync"]:
+                    yield _evento_sse({**RESYNC, "version": pendientes["version"]})
+                    return
+                for cambio in pendientes["cambios"]:
+                    yield _evento_sse(cambio)
+                    ultimo = cambio["seq"]
+
+            while True:
+                try:
+                    cambio = await asyncio.wait_for(suscriptor.cola.get(), timeout=EVENTOS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if cambio is RESYNC:
+                    # Cliente demasiado lento: se le pide recargar /datos y reconectar
+                    yield _evento_sse({**RESYNC, "version": data_manager.version})
+                    return
+                if cambio["seq"] <= ultimo:
+                    continue
+                ultimo = cambio["seq"]
+                yield _evento_sse(cambio)
+        finally:
+            centro_difusion.desuscribir(suscriptor)
+
+    return StreamingResponse(generar(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 # Manejo de errores
@@ -183,6 +747,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
+    logger.error("Error interno en %s %s", request.method, request.url.path, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={"success": False, "message": f"Error interno: {str(exc)}"},
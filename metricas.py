@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Límites (en segundos) de los histogramas de latencia
+CUBETAS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Etiquetas = Tuple[str, ...]
+
+# Peticiones lentas y errores (main configura adónde se escribe)
+logger = logging.getLogger("search_assistant")
+
+# Respuestas que duran lo que dure la conexión: no cuentan como lentas
+_TIPOS_STREAMING = (b"text/event-stream", b"application/x-ndjson")
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatear_etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    partes = [f'{nombre}="{_escapar(str(valor))}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), registro: "Registro" = None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        (registro if registro is not None else REGISTRO).registrar(self)
+
+    def exportar(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"] + self._muestras()
+
+    def _muestras(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    """Valor que solo crece, uno por combinación de etiquetas"""
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), registro: "Registro" = None):
+        super().__init__(nombre, ayuda, etiquetas, registro)
+        self._valores: Dict[Etiquetas, float] = {}
+
+    def inc(self, valor: float = 1, *etiquetas: str):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + valor
+
+    def valor(self, *etiquetas: str) -> float:
+        return self._valores.get(etiquetas, 0)
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+                for etiquetas, valor in valores]
+
+
+class Histograma(_Metrica):
+    """Conteo de observaciones por cubeta, más su suma y su cantidad.
+
+    Cada observación suma 1 a una sola cubeta; los acumulados que pide el
+    formato de Prometheus se calculan al exportar.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 cubetas: Sequence[float] = CUBETAS_LATENCIA, registro: "Registro" = None):
+        super().__init__(nombre, ayuda, etiquetas, registro)
+        self.cubetas = tuple(sorted(cubetas))
+        # Etiquetas -> [conteo por cubeta (la última es +Inf), suma]
+        self._series: Dict[Etiquetas, list] = {}
+
+    def observe(self, valor: float, *etiquetas: str):
+        indice = bisect_left(self.cubetas, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [[0] * (len(self.cubetas) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def cantidad(self, *etiquetas: str) -> int:
+        serie = self._series.get(etiquetas)
+        return sum(serie[0]) if serie else 0
+
+    def _muestras(self) -> List[str]:
+        with self._lock:
+            series = [(etiquetas, list(conteos), suma) for etiquetas, (conteos, suma) in self._series.items()]
+        lineas = []
+        for etiquetas, conteos, suma in series:
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas + (float("inf"),), conteos):
+                acumulado += conteo
+                etiqueta_le = f'le="{_numero(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_formatear_etiquetas(self.etiquetas, etiquetas, etiqueta_le)} "
+                              f"{acumulado}")
+            texto_etiquetas = _formatear_etiquetas(self.etiquetas, etiquetas)
+            lineas.append(f"{self.nombre}_sum{texto_etiquetas} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{texto_etiquetas} {acumulado}")
+        return lineas
+
+
+class Indicador(_Metrica):
+    """Valor que se lee al exportar, de una función que devuelve un número o {etiquetas: número}"""
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Callable[[], object], etiquetas: Sequence[str] = (),
+                 tipo: str = "gauge", registro: "Registro" = None):
+        super().__init__(nombre, ayuda, etiquetas, registro)
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def _muestras(self) -> List[str]:
+        valores = self.funcion()
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_numero(valor)}"
+                for etiquetas, valor in valores.items()]
+
+
+class Registro:
+    """Conjunto de métricas que se exportan juntas en /metrics"""
+
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        # Con activo=False el middleware y los cronómetros no miden nada (para comparar el costo)
+        self.activo = True
+
+    def registrar(self, metrica: _Metrica):
+        self._metricas[metrica.nombre] = metrica
+
+    def exportar(self) -> str:
+        lineas = []
+        for metrica in list(self._metricas.values()):
+            try:
+                lineas.extend(metrica.exportar())
+            except Exception:
+                logger.exception("Error al exportar la métrica %s", metrica.nombre)
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRO = Registro()
+
+# Métricas de la API; los indicadores que dependen de objetos de main se registran allí
+PETICIONES = Contador("api_peticiones_total", "Peticiones HTTP atendidas", ("metodo", "ruta", "estado"))
+DURACION_PETICION = Histograma("api_peticion_duracion_segundos",
+                               "Duración de las peticiones HTTP hasta enviar la respuesta completa",
+                               ("metodo", "ruta"))
+LLM_DURACION = Histograma("llm_duracion_segundos", "Duración de las llamadas a Azure OpenAI (con reintentos)",
+                          ("modo", "resultado"))
+LLM_PRIMER_TOKEN = Histograma("llm_primer_token_segundos",
+                              "Tiempo hasta el primer fragmento de Azure OpenAI en streaming")
+LLM_TOKENS = Contador("llm_tokens_total",
+                      "Tokens según el uso informado por Azure OpenAI (en streaming, fragmentos recibidos)",
+                      ("tipo",))
+LLM_REINTENTOS = Contador("llm_reintentos_total", "Reintentos de llamadas a Azure OpenAI", ("motivo",))
+CONTEXTO_MODELO_DURACION = Histograma("contexto_modelo_duracion_segundos",
+                                      "Duración de get_data_for_model (registro completo en texto)")
+PERSISTENCIA_DURACION = Histograma("persistencia_escritura_duracion_segundos",
+                                   "Duración de las escrituras al almacenamiento", ("backend", "operacion"))
+PERSISTENCIA_BYTES = Contador("persistencia_escritura_bytes_total", "Bytes escritos al almacenamiento",
+                              ("backend", "operacion"))
+
+
+@contextmanager
+def cronometrar(histograma: Histograma, *etiquetas: str) -> Iterator[None]:
+    """Observar en `histograma` la duración del bloque (también si termina con una excepción)"""
+    if not REGISTRO.activo:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        histograma.observe(time.perf_counter() - inicio, *etiquetas)
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mide cada petición HTTP por método, ruta (la plantilla, no la URL) y estado.
+
+    Es ASGI puro (no BaseHTTPMiddleware) para no cambiar cómo se envían las
+    respuestas en streaming. Las rutas que no existen se agrupan en una sola
+    etiqueta para no crear una serie por URL. Las peticiones que tardan más de
+    `lenta` segundos (salvo las respuestas en streaming) y los errores 5xx se
+    escriben además en el log.
+    """
+
+    def __init__(self, app, registro: Optional[Registro] = None, lenta: float = 2.0):
+        self.app = app
+        self.registro = registro if registro is not None else REGISTRO
+        self.lenta = lenta
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.registro.activo:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = 500
+        streaming = False
+
+        async def enviar(mensaje):
+            nonlocal estado, streaming
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                for clave, valor in mensaje.get("headers", ()):
+                    if clave == b"content-type" and valor.startswith(_TIPOS_STREAMING):
+                        streaming = True
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            ruta = scope.get("route")
+            plantilla = getattr(ruta, "path", None) or "(sin ruta)"
+            metodo = scope.get("method", "")
+            DURACION_PETICION.observe(duracion, metodo, plantilla)
+            PETICIONES.inc(1, metodo, plantilla, str(estado))
+            if estado >= 500 or (duracion >= self.lenta and not streaming):
+                logger.warning("%s %s -> %s en %.3fs", metodo, scope.get("path", ""), estado, duracion)
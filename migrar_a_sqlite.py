@@ -0,0 +1,32 @@
+"""Migrar disaster_data.json (y su bitácora del modo "journal", si la hay) a SQLite.
+
+Uso: python migrar_a_sqlite.py [--origen disaster_data.json] [--destino disaster_data.sqlite3]
+
+Después de migrar, arrancar la API con STORAGE_MODE=sqlite (y SQLITE_FILE si el
+destino no es el predeterminado).
+"""
+import argparse
+import os
+import sys
+
+from storage import migrar_a_sqlite
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--origen", default="disaster_data.json")
+    parser.add_argument("--destino", default=None, help="por defecto, el origen con extensión .sqlite3")
+    args = parser.parse_args()
+    destino = args.destino or f"{os.path.splitext(args.origen)[0]}.sqlite3"
+
+    try:
+        totales = migrar_a_sqlite(args.origen, destino)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error al migrar: {e}")
+        sys.exit(1)
+    print(f"Migrados a {destino}: {totales['fallecidos']} fallecidos, {totales['pacientes']} pacientes "
+          f"en {totales['hospitales']} hospitales")
+
+
+if __name__ == "__main__":
+    main()
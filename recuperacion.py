@@ -0,0 +1,163 @@
+import re
+from typing import Dict, Iterable, List, Set
+
+from data_manager import DataManager, normalizar_nombre
+
+# Palabras (ya normalizadas) que nunca forman parte de un nombre buscado
+PALABRAS_VACIAS = {
+    "a", "al", "algo", "alguien", "amiga", "amigo", "abuela", "abuelo", "anos", "busco", "buscando", "buscar",
+    "como", "con", "confirmada", "confirmado", "cual", "cuales", "cuantas", "cuantos", "decir", "dime",
+    "discoteca", "donde", "e", "edad", "el", "en", "encuentra", "encuentran", "es", "esa", "ese", "eso", "esposa",
+    "esposo", "esta", "estado", "estan", "este", "esto", "estoy", "familiar", "favor", "fallecida",
+    "fallecidas", "fallecido", "fallecidos", "fallecio", "fue", "gracias", "ha", "han", "hay", "herida",
+    "herido", "heridas", "heridos", "hermana", "hermano", "hija", "hijo", "hola", "hospital", "hospitales",
+    "info", "informacion", "ingresada", "ingresado", "internada", "internado", "jet", "la", "las", "le",
+    "lista", "listado", "llama", "llamada", "llamado", "lo", "los", "madre", "mama", "me", "mi", "mis",
+    "muerta", "muerto", "muertos", "murieron", "murio", "necesito", "no", "noticias", "nombre", "nombres", "o",
+    "padre", "papa", "para", "paciente", "pacientes", "persona", "personas", "por", "prima", "primo",
+    "puedes", "que", "quien", "quienes", "quiero", "rescatada", "rescatado", "salud", "saber", "sabes",
+    "se", "senor", "senora", "set", "si", "sigue", "siguen", "sobre", "son", "sr", "sra", "su", "sus",
+    "tia", "tiene", "tienen", "tio", "todos", "total", "tragedia", "tu", "u", "un", "una", "victima", "victimas",
+    "viva", "vivo", "y", "ya",
+}
+
+# Partículas que sí pueden ir dentro de un nombre ("Víctor de la Cruz")
+PARTICULAS = {"de", "del", "la", "las", "los"}
+
+# Puntaje a partir del cual otro nombre se considera confundible con una coincidencia exacta
+UMBRAL_AMBIGUEDAD = 0.75
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def extraer_hospitales(mensaje: str, hospitales: Iterable[str]) -> List[str]:
+    """Hospitales del registro mencionados en el mensaje.
+
+    Un hospital cuenta como mencionado si aparecen en el mensaje al menos dos de
+    las palabras propias de su nombre ("Ney Arias Lora", "el Moscoso Puello"), o
+    la única que tenga.
+    """
+    tokens = set(_TOKEN.findall(normalizar_nombre(mensaje)))
+    mencionados = []
+    for hospital in hospitales:
+        propias = _palabras_propias(hospital)
+        if propias and len(propias & tokens) >= min(2, len(propias)):
+            mencionados.append(hospital)
+    return mencionados
+
+
+def _palabras_propias(hospital: str) -> Set[str]:
+    return {token for token in _TOKEN.findall(normalizar_nombre(hospital))
+            if len(token) > 1 and token not in PALABRAS_VACIAS and token not in PARTICULAS}
+
+
+def extraer_nombres(mensaje: str, excluir: Iterable[str] = ()) -> List[str]:
+    """Extraer del mensaje los tramos que parecen nombres de personas (normalizados).
+
+    Las palabras de `excluir` (p. ej. las de un hospital mencionado) cortan los tramos como las palabras vacías.
+    """
+    excluir = set(excluir)
+    nombres = []
+    tramo, pendientes = [], []
+    for token in _TOKEN.findall(normalizar_nombre(mensaje)):
+        if token in PARTICULAS and tramo:
+            pendientes.append(token)
+        elif (token in PALABRAS_VACIAS or token in PARTICULAS or token in excluir or token.isdigit()
+              or len(token) < 2):
+            if tramo:
+                nombres.append(" ".join(tramo))
+            tramo, pendientes = [], []
+        else:
+            tramo.extend(pendientes)
+            tramo.append(token)
+            pendientes = []
+    if tramo:
+        nombres.append(" ".join(tramo))
+    return nombres
+
+
+def recuperar(data_manager: DataManager, mensaje: str, limite: int = 5) -> Dict:
+    """Buscar en el registro las personas y hospitales mencionados en el mensaje.
+
+    Devuelve los nombres detectados, los que se parecen a alguna persona
+    registrada ("encontrados", con puntaje de al menos PUNTAJE_MINIMO), los
+    candidatos (hasta `limite` por nombre), los hospitales mencionados y, si el
+    mensaje menciona un único nombre que coincide exactamente con una persona
+    registrada sin que otro nombre se le parezca demasiado, esa persona en
+    "exacto". Si no se detecta ningún nombre ni se menciona ningún hospital,
+    el mensaje es una consulta general y necesita el registro completo.
+    """
+    hospitales = extraer_hospitales(mensaje, data_manager.instantanea().pacientes_hospitales)
+    nombres = extraer_nombres(mensaje, excluir=set().union(*map(_palabras_propias, hospitales)))
+    puntajes: Dict[str, float] = {}
+    encontrados, exactos = [], []
+    for consulta in nombres:
+        parecidos = data_manager.trigramas.buscar(consulta, limite=limite)
+        if consulta in data_manager.indice:
+            puntajes[consulta] = 1.0
+            if not any(clave != consulta and puntaje >= UMBRAL_AMBIGUEDAD for clave, puntaje in parecidos):
+                exactos.append(consulta)
+        if parecidos or consulta in data_manager.indice:
+            encontrados.append(consulta)
+        for clave, puntaje in parecidos:
+            puntajes[clave] = max(puntaje, puntajes.get(clave, 0.0))
+
+    claves = sorted(puntajes, key=lambda clave: -puntajes[clave])[:limite * max(1, len(encontrados))]
+    candidatos = [persona for persona in map(data_manager.obtener_persona, claves) if persona is not None]
+    exacto = None
+    if len(nombres) == 1 and exactos and not hospitales:
+        exacto = data_manager.obtener_persona(exactos[0])
+    return {"nombres": nombres, "encontrados": encontrados, "candidatos": candidatos, "hospitales": hospitales,
+            "exacto": exacto}
+
+
+def necesita_registro_completo(recuperacion: Dict) -> bool:
+    """Si el mensaje no nombra a nadie ni menciona ningún hospital (p. ej. "¿Quiénes murieron?").
+
+    Un nombre sin parecidos en el registro no hace falta enviarlo con todos los
+    datos: el contexto compacto ya le dice al modelo que no está registrado.
+    """
+    return not recuperacion["nombres"] and not recuperacion["hospitales"]
+
+
+def formatear_persona(persona: Dict) -> str:
+    if persona["estado"] == "fallecido":
+        return f"- {persona['nombre']} (fallecido)"
+    if "edad" in persona:
+        return f"- {persona['nombre']}, {persona['edad']} años (paciente en {persona['hospital']})"
+    return f"- {persona['nombre']} (paciente en {persona['hospital']})"
+
+
+def contexto_candidatos(data_manager: DataManager, recuperacion: Dict) -> str:
+    """Texto compacto para el modelo con las personas candidatas y los pacientes de los hospitales mencionados"""
+    instantanea = data_manager.instantanea()
+    total_pacientes = sum(len(pacientes) for pacientes in instantanea.pacientes_hospitales.values())
+    lineas = [
+        f"Registro total: {len(instantanea.fallecidos)} fallecidos confirmados y {total_pacientes} "
+        f"pacientes en {len(instantanea.pacientes_hospitales)} hospitales.",
+    ]
+    if recuperacion["nombres"]:
+        lineas.append(f"Nombres consultados: {', '.join(recuperacion['nombres'])}")
+        if recuperacion["candidatos"]:
+            lineas.append("Personas del registro cuyo nombre se parece al consultado "
+                          "(cualquier otra persona no aparece en el registro):")
+            lineas.extend(formatear_persona(persona) for persona in recuperacion["candidatos"])
+        else:
+            lineas.append("Ninguna persona del registro tiene un nombre parecido al consultado.")
+    for hospital in recuperacion["hospitales"]:
+        pacientes = instantanea.pacientes_hospitales.get(hospital, ())
+        lineas.append(f"Pacientes en {hospital} ({len(pacientes)}):")
+        lineas.extend(f"- {paciente['nombre']}, {paciente['edad']} años" if "edad" in paciente
+                      else f"- {paciente['nombre']}" for paciente in pacientes)
+    return "\n".join(lineas)
+
+
+def respuesta_directa(persona: Dict) -> str:
+    """Respuesta sin pasar por el modelo para una coincidencia exacta"""
+    if persona["estado"] == "fallecido":
+        return (f"Lamentamos profundamente informarte que {persona['nombre']} aparece en la lista de "
+                "fallecidos confirmados. Enviamos nuestras más sinceras condolencias a sus familiares y "
+                "seres queridos.")
+    edad = f" ({persona['edad']} años)" if "edad" in persona else ""
+    return (f"{persona['nombre']}{edad} se encuentra registrado como paciente en {persona['hospital']}. "
+            "Te recomendamos comunicarte con el hospital para obtener información sobre su estado.")
@@ -0,0 +1,176 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+from itertools import accumulate, chain
+from typing import Dict, List, Sequence, Tuple
+
+from busqueda import IndiceTrigramas
+
+# Identifica el formato; cambiarla si cambia la disposición del archivo
+MAGIA = b"AFJSBIN2"
+
+# Formatos anteriores que todavía se leen (AFJSBIN1 guardaba los tamaños en 16 bits; el siguiente
+# snapshot se escribe ya con MAGIA)
+MAGIAS_LEGIBLES = (MAGIA, b"AFJSBIN1")
+
+# Edad guardada para los pacientes sin edad
+SIN_EDAD = -2 ** 31
+
+# Cada sección empieza en un múltiplo de 8 bytes para poder verla como arreglo sin copiarla
+_ALINEACION = 8
+
+
+def _textos(textos: Sequence[str]) -> Tuple[bytes, array]:
+    """Textos concatenados en UTF-8 y el fin (en caracteres) de cada uno"""
+    return "".join(textos).encode("utf-8"), array("I", accumulate(map(len, textos)))
+
+
+def _separar(texto: str, fines: Sequence[int]) -> List[str]:
+    return [texto[inicio:fin] for inicio, fin in zip(chain((0,), fines), fines)]
+
+
+def _edad_simple(paciente: Dict) -> bool:
+    """Si el paciente cabe en las columnas: solo nombre y, si la tiene, una edad entera de 32 bits"""
+    if "edad" not in paciente:
+        return len(paciente) == 1
+    edad = paciente["edad"]
+    return len(paciente) == 2 and type(edad) is int and SIN_EDAD < edad < 2 ** 31
+
+
+def escribir(ruta: str, datos: Dict) -> int:
+    """Escribir en `ruta` los datos con sus claves e índice de trigramas (ver Storage.con_indice).
+
+    El archivo guarda los registros en columnas (nombres en un solo texto UTF-8
+    con el fin de cada uno, edades en un arreglo), la clave normalizada de cada
+    registro como número del índice y las listas del índice tal como están en
+    memoria. Devuelve los bytes escritos.
+    """
+    trigramas = datos["trigramas"]
+    claves_indice = list(trigramas["claves"])
+    tamanos = array("I", trigramas["tamanos"])
+    quitados = [numero for numero, clave in enumerate(claves_indice) if clave is None]
+    numeros = {clave: numero for numero, clave in enumerate(claves_indice) if clave is not None}
+
+    def numero_de(clave: str) -> int:
+        numero = numeros.get(clave)
+        if numero is None:
+            # No debería pasar: se guarda como quitada y DataManager la vuelve a indexar al cargar
+            numero = numeros[clave] = len(claves_indice)
+            claves_indice.append(clave)
+            tamanos.append(0)
+            quitados.append(numero)
+        return numero
+
+    fallecidos = datos["fallecidos"]
+    nombres = list(fallecidos)
+    edades = array("i")
+    extras = {}
+    hospitales = []
+    for hospital, pacientes in datos["pacientes_hospitales"].items():
+        hospitales.append([hospital, len(pacientes)])
+        for paciente in pacientes:
+            nombres.append(paciente["nombre"])
+            if _edad_simple(paciente):
+                edades.append(paciente.get("edad", SIN_EDAD))
+            else:
+                extras[len(edades)] = paciente
+                edades.append(SIN_EDAD)
+    registros = array("I", map(numero_de, chain(datos["claves_fallecidos"], *datos["claves_hospitales"].values())))
+
+    grams = {}
+    particiones = array("I")
+    listas = []
+    total = 0
+    for gram, por_tamano in trigramas["grams"]:
+        grams[gram] = [len(particiones) // 3, len(particiones) // 3 + len(por_tamano)]
+        for tamano, contenido in por_tamano:
+            cantidad = len(contenido) // 4
+            particiones.extend((tamano, total, total + cantidad))
+            listas.append(contenido)
+            total += cantidad
+
+    texto_nombres, fines_nombres = _textos(nombres)
+    texto_claves, fines_claves = _textos(["" if clave is None else clave for clave in claves_indice])
+    secciones = [
+        ("nombres", "B", texto_nombres), ("nombres_fin", "I", fines_nombres), ("edades", "i", edades),
+        ("registros", "I", registros), ("claves", "B", texto_claves), ("claves_fin", "I", fines_claves),
+        ("tamanos", "I", tamanos), ("particiones", "I", particiones), ("numeros", "I", b"".join(listas)),
+    ]
+
+    with open(ruta, "wb") as archivo:
+        # Al final va un directorio JSON; su posición se escribe tras la firma al terminar
+        archivo.write(MAGIA + bytes(8))
+        ubicaciones = {}
+        for nombre, formato, contenido in secciones:
+            archivo.write(bytes(-archivo.tell() % _ALINEACION))
+            inicio = archivo.tell()
+            archivo.write(contenido)
+            ubicaciones[nombre] = [inicio, archivo.tell() - inicio, formato]
+        directorio = {
+            "orden_bytes": sys.byteorder,
+            "fallecidos": len(fallecidos),
+            "hospitales": hospitales,
+            "extras": extras,
+            "quitados": quitados,
+            "grams": grams,
+            "secciones": ubicaciones,
+        }
+        posicion = archivo.tell()
+        archivo.write(json.dumps(directorio, ensure_ascii=False).encode("utf-8"))
+        tamano = archivo.tell()
+        archivo.seek(len(MAGIA))
+        archivo.write(posicion.to_bytes(8, "little"))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    return tamano
+
+
+def leer(ruta: str) -> Dict:
+    """Datos de un snapshot escrito con escribir(), con "claves_fallecidos", "claves_hospitales" y "trigramas".
+
+    El archivo se mapea en memoria: nombres, edades y claves se decodifican al
+    cargar, pero las listas del índice de trigramas se quedan en el archivo y
+    se decodifican por trigrama a medida que las búsquedas las usan.
+    """
+    with open(ruta, "rb") as archivo:
+        mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+    vista = memoryview(mapa)
+    if bytes(vista[:len(MAGIA)]) not in MAGIAS_LEGIBLES:
+        raise ValueError(f"{ruta} no es un snapshot binario")
+    posicion = int.from_bytes(vista[len(MAGIA):len(MAGIA) + 8], "little")
+    directorio = json.loads(str(vista[posicion:], "utf-8"))
+    if directorio["orden_bytes"] != sys.byteorder:
+        raise ValueError(f"{ruta} se escribió en una máquina con otro orden de bytes")
+
+    def seccion(nombre: str) -> memoryview:
+        inicio, longitud, formato = directorio["secciones"][nombre]
+        return vista[inicio:inicio + longitud].cast(formato)
+
+    nombres = _separar(str(seccion("nombres"), "utf-8"), seccion("nombres_fin"))
+    claves_indice = _separar(str(seccion("claves"), "utf-8"), seccion("claves_fin"))
+    claves = list(map(claves_indice.__getitem__, seccion("registros")))
+
+    cantidad_fallecidos = directorio["fallecidos"]
+    pacientes = [{"nombre": nombre} if edad == SIN_EDAD else {"nombre": nombre, "edad": edad}
+                 for nombre, edad in zip(nombres[cantidad_fallecidos:], seccion("edades"))]
+    for posicion, paciente in directorio["extras"].items():
+        pacientes[int(posicion)] = paciente
+
+    pacientes_hospitales, claves_hospitales = {}, {}
+    inicio = 0
+    for hospital, cantidad in directorio["hospitales"]:
+        pacientes_hospitales[hospital] = pacientes[inicio:inicio + cantidad]
+        claves_hospitales[hospital] = claves[cantidad_fallecidos + inicio:cantidad_fallecidos + inicio + cantidad]
+        inicio += cantidad
+
+    return {
+        "fallecidos": nombres[:cantidad_fallecidos],
+        "pacientes_hospitales": pacientes_hospitales,
+        "claves_fallecidos": claves[:cantidad_fallecidos],
+        "claves_hospitales": claves_hospitales,
+        "trigramas": IndiceTrigramas.desde_snapshot(claves_indice, directorio["quitados"], seccion("tamanos"),
+                                                    directorio["grams"], seccion("particiones"),
+                                                    seccion("numeros")),
+    }
@@ -0,0 +1,564 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import snapshot_binario
+from busqueda import normalizar_nombre
+from metricas import PERSISTENCIA_BYTES, PERSISTENCIA_DURACION, cronometrar, logger
+
+
+class Storage:
+    """Interfaz de persistencia usada por DataManager"""
+
+    # Un almacenamiento compartido puede recibir escrituras de otros procesos (varios workers)
+    compartido = False
+    # Con con_indice, DataManager agrega a los datos que guarda las claves normalizadas y el índice de
+    # trigramas ("claves_fallecidos", "claves_hospitales", "trigramas"), y load puede devolverlos
+    con_indice = False
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        """Devolver (datos base o None si no hay nada guardado, registros pendientes de aplicar)"""
+        raise NotImplementedError
+
+    def save(self, datos: Dict, version: Optional[int] = None):
+        """Guardar una copia completa de los datos (`version` es la de DataManager, si la conoce)"""
+        raise NotImplementedError
+
+    def record(self, registros: List[Dict], obtener_datos: Callable[[], Dict], version: Optional[int] = None):
+        """Persistir una o varias mutaciones ya aplicadas en memoria (`version` es la resultante)"""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaccion(self) -> Iterator[Optional[List[Tuple[int, List[Dict]]]]]:
+        """Bloque de escritura exclusivo; entrega las mutaciones de otros procesos aún no aplicadas.
+
+        Entrega una lista de (versión, registros), o None si hay que recargar todo.
+        """
+        yield []
+
+    def hay_cambios(self) -> bool:
+        """Indicar (sin bloquear) si otro proceso escribió desde la última lectura"""
+        return False
+
+    def pendientes(self) -> Optional[List[Tuple[int, List[Dict]]]]:
+        """Mutaciones de otros procesos aún no aplicadas, o None si hay que recargar todo"""
+        return []
+
+    def version_guardada(self) -> Optional[int]:
+        """Versión de los datos guardada por el backend, si la lleva"""
+        return None
+
+    def start(self, obtener_datos: Callable[[], Dict]):
+        """Arrancar tareas de fondo (si el backend las necesita)"""
+
+    def close(self):
+        """Liberar recursos del backend"""
+
+
+class JsonStorage(Storage):
+    """Reescribe el archivo JSON completo en cada mutación"""
+
+    def __init__(self, data_file: str = "disaster_data.json"):
+        self.data_file = data_file
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        if not os.path.exists(self.data_file):
+            return None, []
+        with open(self.data_file, 'r', encoding='utf-8') as file:
+            return json.load(file), []
+
+    def save(self, datos: Dict, version: Optional[int] = None):
+        with cronometrar(PERSISTENCIA_DURACION, "json", "completa"):
+            with open(self.data_file, 'w', encoding='utf-8') as file:
+                json.dump(datos, file, ensure_ascii=False, indent=2)
+                PERSISTENCIA_BYTES.inc(file.tell(), "json", "completa")
+
+    def record(self, registros: List[Dict], obtener_datos: Callable[[], Dict], version: Optional[int] = None):
+        self.save(obtener_datos())
+
+
+class JournalStorage(Storage):
+    """Snapshot JSON + bitácora de mutaciones (una línea JSON por mutación).
+
+    Cada mutación se añade al final de la bitácora y se sincroniza con fsync,
+    por lo que el costo de escritura no depende del tamaño del registro. Un hilo
+    de fondo compacta periódicamente (o en cuanto la bitácora llega a
+    max_registros) escribiendo un snapshot atómico (archivo temporal + rename):
+    aparta la bitácora, que el snapshot va a contener, y las escrituras siguen
+    en una nueva sin esperar a que el snapshot termine.
+    """
+
+    # Etiqueta del backend en las métricas de persistencia
+    _backend = "journal"
+
+    def __init__(self, data_file: str = "disaster_data.json", intervalo_compactacion: float = 30.0,
+                 max_registros: int = 10000):
+        self.data_file = data_file
+        self.log_file = f"{data_file}.log"
+        self.intervalo_compactacion = intervalo_compactacion
+        self.max_registros = max_registros
+        self._lock = threading.Lock()
+        self._log = None
+        self._pendientes = 0
+        # Una compactación a la vez; _lock solo se retiene para tomar los datos y apartar la bitácora
+        self._compactando = threading.Lock()
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+        self._hilo = None
+        self._obtener_datos = None
+
+    @property
+    def bitacora_anterior(self) -> str:
+        """Bitácora apartada por la compactación en curso (o por una que falló)"""
+        return f"{self.log_file}.anterior"
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        datos = None
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r', encoding='utf-8') as file:
+                datos = json.load(file)
+
+        registros = self._leer_bitacoras(self.log_file)
+        self._pendientes = len(registros)
+        return datos, registros
+
+    def save(self, datos: Dict, version: Optional[int] = None):
+        with self._compactando, self._lock:
+            self._escribir_snapshot(datos)
+            self._reiniciar_bitacora()
+
+    def record(self, registros: List[Dict], obtener_datos: Callable[[], Dict], version: Optional[int] = None):
+        lineas = "".join(json.dumps(registro, ensure_ascii=False) + "\n" for registro in registros)
+        with self._lock, cronometrar(PERSISTENCIA_DURACION, self._backend, "bitacora"):
+            if self._log is None:
+                self._log = open(self.log_file, 'a', encoding='utf-8')
+            self._log.write(lineas)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._pendientes += len(registros)
+            compactar = self._pendientes >= self.max_registros
+        PERSISTENCIA_BYTES.inc(len(lineas.encode("utf-8")), self._backend, "bitacora")
+
+        if compactar:
+            if self._hilo is not None:
+                # El escritor (que retiene el lock de DataManager) no espera el snapshot
+                self._despertar.set()
+            else:
+                self.compact(obtener_datos)
+
+    def compact(self, obtener_datos: Optional[Callable[[], Dict]] = None):
+        """Escribir un snapshot con el estado actual y vaciar la bitácora"""
+        obtener_datos = obtener_datos or self._obtener_datos
+        if obtener_datos is None:
+            return
+        with self._compactando:
+            with self._lock:
+                if self._pendientes == 0:
+                    return
+                # DataManager publica antes de registrar: los datos contienen todo lo que hay en la
+                # bitácora apartada. Si una mutación queda en el snapshot y también en la bitácora
+                # nueva, volver a aplicarla al cargar no tiene efecto (las altas son idempotentes)
+                datos = obtener_datos()
+                self._apartar_bitacora()
+            self._escribir_snapshot(datos)
+            os.remove(self.bitacora_anterior)
+
+    def start(self, obtener_datos: Callable[[], Dict]):
+        self._obtener_datos = obtener_datos
+        if self._hilo is None and self.intervalo_compactacion > 0:
+            self._hilo = threading.Thread(target=self._compactar_periodicamente, name="compactador", daemon=True)
+            self._hilo.start()
+
+    def close(self):
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.compact()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _compactar_periodicamente(self):
+        while not self._detener.is_set():
+            # Cada intervalo_compactacion, o antes si record avisa que la bitácora está llena
+            self._despertar.wait(self.intervalo_compactacion)
+            self._despertar.clear()
+            if self._detener.is_set():
+                break
+            try:
+                self.compact()
+            except Exception:
+                logger.exception("Error al compactar datos")
+
+    @classmethod
+    def _leer_bitacoras(cls, log_file: str) -> List[Dict]:
+        """Mutaciones de la bitácora apartada (si una compactación no terminó) y de la actual"""
+        return cls._leer_bitacora(f"{log_file}.anterior") + cls._leer_bitacora(log_file)
+
+    @staticmethod
+    def _leer_bitacora(ruta: str) -> List[Dict]:
+        registros = []
+        if os.path.exists(ruta):
+            with open(ruta, 'rb') as file:
+                valido = 0
+                for linea in file:
+                    try:
+                        registros.append(json.loads(linea))
+                    except ValueError:
+                        # Última línea truncada por una caída a mitad de escritura: descartarla
+                        # para que las próximas mutaciones no se peguen a ella
+                        file.close()
+                        os.truncate(ruta, valido)
+                        break
+                    valido += len(linea)
+        return registros
+
+    def _escribir_snapshot(self, datos: Dict):
+        temporal = f"{self.data_file}.tmp"
+        with cronometrar(PERSISTENCIA_DURACION, self._backend, "snapshot"):
+            with open(temporal, 'w', encoding='utf-8') as file:
+                json.dump(datos, file, ensure_ascii=False)
+                file.flush()
+                os.fsync(file.fileno())
+                PERSISTENCIA_BYTES.inc(file.tell(), self._backend, "snapshot")
+            os.replace(temporal, self.data_file)
+
+    def _reiniciar_bitacora(self):
+        """El snapshot ya contiene todo lo registrado: la bitácora empieza de cero"""
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_file, 'w', encoding='utf-8')
+        self._pendientes = 0
+        if os.path.exists(self.bitacora_anterior):
+            os.remove(self.bitacora_anterior)
+
+    def _apartar_bitacora(self):
+        """Mover la bitácora a bitacora_anterior y seguir escribiendo en una vacía"""
+        if self._log is not None:
+            self._log.close()
+        if os.path.exists(self.bitacora_anterior):
+            # Una compactación anterior falló: la bitácora apartada sigue sin estar en ningún snapshot
+            with open(self.bitacora_anterior, 'ab') as destino, open(self.log_file, 'rb') as origen:
+                shutil.copyfileobj(origen, destino)
+                destino.flush()
+                os.fsync(destino.fileno())
+        elif os.path.exists(self.log_file):
+            os.replace(self.log_file, self.bitacora_anterior)
+        else:
+            open(self.bitacora_anterior, 'w').close()
+        self._log = open(self.log_file, 'w', encoding='utf-8')
+        self._pendientes = 0
+
+
+class BinarioStorage(JournalStorage):
+    """Bitácora como JournalStorage, con snapshots binarios (ver snapshot_binario) en lugar de JSON.
+
+    El snapshot guarda también la clave normalizada de cada registro y el índice
+    de trigramas, así que al arrancar no se normalizan nombres ni se calculan
+    trigramas, y las listas del índice se leen del archivo mapeado en memoria a
+    medida que las búsquedas las usan. Si todavía no hay snapshot binario, se
+    arranca del JSON (y de su bitácora, si venía del modo journal) y el primer
+    snapshot binario se escribe al arrancar; desde entonces el JSON ya no se
+    actualiza.
+    """
+
+    con_indice = True
+    _backend = "binario"
+
+    def __init__(self, data_file: str = "disaster_data.json", intervalo_compactacion: float = 30.0,
+                 max_registros: int = 10000):
+        super().__init__(data_file, intervalo_compactacion, max_registros)
+        self.snapshot_file = f"{os.path.splitext(data_file)[0]}.snap"
+        self.log_file = f"{self.snapshot_file}.log"
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        if os.path.exists(self.snapshot_file):
+            datos = snapshot_binario.leer(self.snapshot_file)
+            registros = self._leer_bitacoras(self.log_file)
+        else:
+            datos, registros = super().load()
+            registros = self._leer_bitacoras(f"{self.data_file}.log") + registros
+        self._pendientes = len(registros)
+        return datos, registros
+
+    def start(self, obtener_datos: Callable[[], Dict]):
+        if not os.path.exists(self.snapshot_file):
+            with self._lock:
+                self._escribir_snapshot(obtener_datos())
+                self._reiniciar_bitacora()
+        super().start(obtener_datos)
+
+    def _escribir_snapshot(self, datos: Dict):
+        temporal = f"{self.snapshot_file}.tmp"
+        with cronometrar(PERSISTENCIA_DURACION, self._backend, "snapshot"):
+            tamano = snapshot_binario.escribir(temporal, datos)
+            os.replace(temporal, self.snapshot_file)
+        PERSISTENCIA_BYTES.inc(tamano, self._backend, "snapshot")
+
+
+class SQLiteStorage(Storage):
+    """Base SQLite en modo WAL, compartida por varios procesos (p. ej. workers de uvicorn).
+
+    El registro se guarda en tablas con índices por nombre normalizado y por
+    hospital; cada escritura añade además una fila a `cambios` con los
+    registros aplicados y la versión resultante. Cada proceso mantiene sus
+    datos en memoria y, antes de escribir (dentro de la misma transacción
+    exclusiva) o cuando detecta escrituras ajenas, aplica las filas de
+    `cambios` que aún no vio; así todos los procesos recorren la misma
+    secuencia de mutaciones y versiones.
+    """
+
+    compartido = True
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            clave TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS hospitales (
+            nombre TEXT PRIMARY KEY,
+            orden INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS victimas (
+            nombre_normalizado TEXT PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            estado TEXT NOT NULL CHECK (estado IN ('fallecido', 'paciente')),
+            hospital TEXT REFERENCES hospitales (nombre),
+            edad INTEGER,
+            orden INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS victimas_estado_orden ON victimas (estado, orden);
+        CREATE INDEX IF NOT EXISTS victimas_hospital ON victimas (hospital, orden);
+        CREATE TABLE IF NOT EXISTS cambios (
+            version INTEGER PRIMARY KEY,
+            registros TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, sqlite_file: str = "disaster_data.sqlite3", max_cambios: int = 10000,
+                 synchronous: str = "FULL", busy_timeout: float = 30.0):
+        self.sqlite_file = sqlite_file
+        # Filas de `cambios` que se conservan para los procesos que van atrasados
+        self.max_cambios = max_cambios
+        self._lock = threading.RLock()
+        self._en_transaccion = False
+        self._escrituras_sin_podar = 0
+        # Última versión de la base ya aplicada en la memoria de este proceso
+        self._conocida = None
+        self._data_version = None
+        self._conexion = sqlite3.connect(sqlite_file, timeout=busy_timeout, isolation_level=None,
+                                         check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        # FULL sincroniza el WAL en cada commit, como la bitácora del modo "journal"
+        self._conexion.execute(f"PRAGMA synchronous={synchronous}")
+        self._conexion.executescript(self.ESQUEMA)
+
+    def load(self) -> Tuple[Optional[Dict], List[Dict]]:
+        with self._lock:
+            self._data_version = self._leer_data_version()
+            # Una transacción de lectura para que las tablas y la versión sean coherentes
+            propia = not self._conexion.in_transaction
+            if propia:
+                self._conexion.execute("BEGIN")
+            try:
+                version = self._meta("version")
+                return (None, []) if version is None else (self._leer_datos(version), [])
+            finally:
+                if propia:
+                    self._conexion.execute("COMMIT")
+
+    def _leer_datos(self, version: int) -> Dict:
+        fallecidos = [nombre for (nombre,) in self._conexion.execute(
+            "SELECT nombre FROM victimas WHERE estado = 'fallecido' ORDER BY orden")]
+        pacientes_hospitales = {hospital: [] for (hospital,) in self._conexion.execute(
+            "SELECT nombre FROM hospitales ORDER BY orden")}
+        for nombre, hospital, edad in self._conexion.execute(
+                "SELECT nombre, hospital, edad FROM victimas WHERE estado = 'paciente' ORDER BY orden"):
+            paciente = {"nombre": nombre}
+            if edad is not None:
+                paciente["edad"] = edad
+            pacientes_hospitales[hospital].append(paciente)
+        self._conocida = version
+        return {"fallecidos": fallecidos, "pacientes_hospitales": pacientes_hospitales}
+
+    def save(self, datos: Dict, version: Optional[int] = None):
+        """Combinar una copia completa con lo ya guardado (las altas existentes se conservan).
+
+        En una base vacía guarda `version` (la que DataManager ya publicó) como versión inicial: las
+        filas de `cambios` que escriba después deben quedar por encima de ella.
+        """
+        registros = [{"op": "paciente", "nombre": paciente["nombre"], "hospital": hospital,
+                      "edad": paciente.get("edad")}
+                     for hospital, pacientes in datos.get("pacientes_hospitales", {}).items()
+                     for paciente in pacientes]
+        registros.extend({"op": "fallecido", "nombre": nombre} for nombre in datos.get("fallecidos", []))
+        with self.transaccion(), cronometrar(PERSISTENCIA_DURACION, "sqlite", "completa"):
+            for hospital in datos.get("pacientes_hospitales", {}):
+                self._guardar_hospital(hospital)
+            self._aplicar_registros(registros)
+            if self._meta("version") is None:
+                if version is None:
+                    version = time.time_ns() // 1_000_000
+                self._guardar_meta("version", version)
+                self._conocida = version
+
+    def record(self, registros: List[Dict], obtener_datos: Callable[[], Dict], version: Optional[int] = None):
+        cambio = json.dumps(registros, ensure_ascii=False)
+        with self.transaccion(), cronometrar(PERSISTENCIA_DURACION, "sqlite", "registro"):
+            anterior = self._meta("version") or 0
+            version = version if version is not None else anterior + len(registros)
+            self._aplicar_registros(registros)
+            self._conexion.execute("INSERT INTO cambios (version, registros) VALUES (?, ?)",
+                                   (version, cambio))
+            self._guardar_meta("version", version)
+            # Si este proceso estaba al día, la fila recién escrita ya está aplicada en su memoria
+            if self._conocida == anterior:
+                self._conocida = version
+
+            self._escrituras_sin_podar += 1
+            if self._escrituras_sin_podar >= 1000:
+                self._podar_cambios()
+        # Bytes del cambio registrado (las filas de víctimas se escriben además en sus tablas)
+        PERSISTENCIA_BYTES.inc(len(cambio.encode("utf-8")), "sqlite", "registro")
+
+    @contextmanager
+    def transaccion(self) -> Iterator[Optional[List[Tuple[int, List[Dict]]]]]:
+        with self._lock:
+            if self._en_transaccion:
+                yield []
+                return
+            # BEGIN IMMEDIATE toma el lock de escritura de la base: las escrituras de todos
+            # los procesos quedan serializadas y cada una parte de los datos más recientes
+            self._conexion.execute("BEGIN IMMEDIATE")
+            self._en_transaccion = True
+            try:
+                yield self._leer_pendientes()
+            except BaseException:
+                self._en_transaccion = False
+                self._conexion.execute("ROLLBACK")
+                raise
+            self._en_transaccion = False
+            # El fsync ocurre aquí, al final de la transacción que abrió DataManager
+            with cronometrar(PERSISTENCIA_DURACION, "sqlite", "commit"):
+                self._conexion.execute("COMMIT")
+            self._data_version = self._leer_data_version()
+
+    def hay_cambios(self) -> bool:
+        with self._lock:
+            return self._conocida is None or self._leer_data_version() != self._data_version
+
+    def pendientes(self) -> Optional[List[Tuple[int, List[Dict]]]]:
+        with self._lock:
+            self._data_version = self._leer_data_version()
+            return self._leer_pendientes()
+
+    def version_guardada(self) -> Optional[int]:
+        with self._lock:
+            return self._meta("version")
+
+    def close(self):
+        with self._lock:
+            self._conexion.close()
+
+    def _leer_pendientes(self) -> Optional[List[Tuple[int, List[Dict]]]]:
+        if self._conocida is None:
+            return None
+        # Las filas que necesitamos ya se podaron: hay que recargar todo
+        if self._conocida < (self._meta("podado") or 0):
+            return None
+        filas = self._conexion.execute("SELECT version, registros FROM cambios WHERE version > ? ORDER BY version",
+                                       (self._conocida,)).fetchall()
+        if filas:
+            self._conocida = filas[-1][0]
+        return [(version, json.loads(registros)) for version, registros in filas]
+
+    def _aplicar_registros(self, registros: List[Dict]):
+        orden = self._meta("orden") or 0
+        for registro in registros:
+            clave = normalizar_nombre(registro["nombre"])
+            orden += 1
+            if registro["op"] == "fallecido":
+                # Un paciente que fallece pasa a la lista de fallecidos (al final)
+                self._conexion.execute(
+                    "INSERT INTO victimas (nombre_normalizado, nombre, estado, hospital, edad, orden) "
+                    "VALUES (?, ?, 'fallecido', NULL, NULL, ?) "
+                    "ON CONFLICT (nombre_normalizado) DO UPDATE SET nombre = excluded.nombre, "
+                    "estado = 'fallecido', hospital = NULL, edad = NULL, orden = excluded.orden "
+                    "WHERE victimas.estado <> 'fallecido'",
+                    (clave, registro["nombre"], orden))
+            elif registro["op"] == "paciente":
+                self._guardar_hospital(registro["hospital"])
+                self._conexion.execute(
+                    "INSERT OR IGNORE INTO victimas (nombre_normalizado, nombre, estado, hospital, edad, orden) "
+                    "VALUES (?, ?, 'paciente', ?, ?, ?)",
+                    (clave, registro["nombre"], registro["hospital"], registro.get("edad") or None, orden))
+        self._guardar_meta("orden", orden)
+
+    def _guardar_hospital(self, hospital: str):
+        self._conexion.execute(
+            "INSERT OR IGNORE INTO hospitales (nombre, orden) "
+            "VALUES (?, (SELECT COALESCE(MAX(orden), 0) + 1 FROM hospitales))", (hospital,))
+
+    def _podar_cambios(self):
+        self._escrituras_sin_podar = 0
+        fila = self._conexion.execute("SELECT version FROM cambios ORDER BY version DESC LIMIT 1 OFFSET ?",
+                                      (self.max_cambios,)).fetchone()
+        if fila is not None:
+            self._conexion.execute("DELETE FROM cambios WHERE version <= ?", fila)
+            self._guardar_meta("podado", fila[0])
+
+    def _meta(self, clave: str) -> Optional[int]:
+        fila = self._conexion.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+        return fila[0] if fila else None
+
+    def _guardar_meta(self, clave: str, valor: int):
+        self._conexion.execute("INSERT INTO meta (clave, valor) VALUES (?, ?) "
+                               "ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor", (clave, valor))
+
+    def _leer_data_version(self) -> int:
+        # Cambia cuando otra conexión confirma una escritura; consultarlo no lee tablas
+        return self._conexion.execute("PRAGMA data_version").fetchone()[0]
+
+
+def migrar_a_sqlite(data_file: str = "disaster_data.json", sqlite_file: str = "disaster_data.sqlite3") -> Dict:
+    """Copiar el archivo JSON (y su bitácora, si la hay) a una base SQLite vacía"""
+    if not os.path.exists(data_file):
+        raise FileNotFoundError(f"No existe {data_file}")
+    datos, registros = JournalStorage(data_file, intervalo_compactacion=0).load()
+    destino = SQLiteStorage(sqlite_file)
+    try:
+        if destino.version_guardada() is not None:
+            raise ValueError(f"{sqlite_file} ya contiene datos")
+        destino.save(datos or {})
+        if registros:
+            destino.record(registros, lambda: {})
+        datos, _ = destino.load()
+    finally:
+        destino.close()
+    return {
+        "fallecidos": len(datos["fallecidos"]),
+        "pacientes": sum(len(pacientes) for pacientes in datos["pacientes_hospitales"].values()),
+        "hospitales": len(datos["pacientes_hospitales"]),
+    }
+
+
+def crear_storage(modo: str = "json", data_file: str = "disaster_data.json",
+                  sqlite_file: Optional[str] = None) -> Storage:
+    """Crear el backend de persistencia a partir de su nombre"""
+    if modo == "json":
+        return JsonStorage(data_file)
+    if modo == "journal":
+        return JournalStorage(data_file)
+    if modo == "binario":
+        return BinarioStorage(data_file)
+    if modo == "sqlite":
+        return SQLiteStorage(sqlite_file or f"{os.path.splitext(data_file)[0]}.sqlite3")
+    raise ValueError(f"Modo de almacenamiento desconocido: {modo}")